@@ -0,0 +1 @@
+"""Performance benchmarks for the musique-solver hot paths."""
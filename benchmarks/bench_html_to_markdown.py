@@ -0,0 +1,55 @@
+"""Compare html2text and the lxml fast path on Wikipedia-shaped parser output.
+
+    python -m benchmarks.bench_html_to_markdown
+    python -m benchmarks.bench_html_to_markdown --html-file saved_section.html --repeat 50
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.fixtures import wikipedia_lead_html, wikipedia_section_html
+from src.html_markdown import CONVERTERS, convert_html
+
+
+def time_converter(html: str, converter: str, repeat: int) -> float:
+    """Best-of-``repeat`` wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        convert_html(html, converter)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--html-file", action="append", default=None,
+                        help="Saved action=parse HTML to benchmark instead of the synthetic fixtures")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.html_file:
+        pages = {Path(p).name: Path(p).read_text(encoding="utf-8") for p in args.html_file}
+    else:
+        pages = {
+            "lead+infobox": wikipedia_lead_html(),
+            "section (60 paragraphs)": wikipedia_section_html(60),
+            "section (300 paragraphs)": wikipedia_section_html(300),
+        }
+
+    print(f"{'page':<28}{'html KB':>9}" + "".join(f"{c + ' ms':>14}{c + ' chars':>16}" for c in CONVERTERS) + f"{'speedup':>10}")
+    for name, html in pages.items():
+        timings = {c: time_converter(html, c, args.repeat) for c in CONVERTERS}
+        sizes = {c: len(convert_html(html, c)) for c in CONVERTERS}
+        row = f"{name:<28}{len(html) / 1024:>9.1f}"
+        row += "".join(f"{timings[c]:>14.2f}{sizes[c]:>16}" for c in CONVERTERS)
+        row += f"{timings['html2text'] / timings['lxml']:>9.1f}x"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
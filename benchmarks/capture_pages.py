@@ -0,0 +1,58 @@
+"""Download real ``action=parse`` HTML for the benchmarks' HTML and retrieval cases.
+
+    python -m benchmarks.capture_pages                      # default pages
+    python -m benchmarks.capture_pages --title "Ada Lovelace" --title "Sony Music"
+
+Pages are written to ``benchmarks/pages/<Title>.html`` with the revision ids in
+``manifest.json``; commit them together with a re-saved baseline
+(``python -m benchmarks.run_benchmarks --save-baseline``). Needs network access.
+"""
+
+import sys
+import json
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.fixtures import PAGES_DIR
+from src.http_transport import HttpTransport
+
+API_URL = "https://en.wikipedia.org/w/api.php"
+# Long, table- and reference-heavy articles of the kind the agent reads for MuSiQue
+DEFAULT_TITLES = ("Sony Music", "Santa Monica, California", "Ada Lovelace", "Inception")
+
+
+def capture(title: str, transport: HttpTransport) -> dict:
+    params = {"action": "parse", "page": title, "prop": "text|revid", "format": "json",
+              "formatversion": 2, "redirects": 1}
+    response = transport.get(API_URL, params=params)
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        raise RuntimeError(f"{title}: {data['error'].get('info', data['error'])}")
+    return data["parse"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--title", action="append", default=None, help="Article to capture (repeatable)")
+    parser.add_argument("--out", type=str, default=str(PAGES_DIR))
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    manifest_path = out / "manifest.json"
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+    transport = HttpTransport()
+    for title in args.title or DEFAULT_TITLES:
+        page = capture(title, transport)
+        path = out / f"{page['title'].replace(' ', '_').replace('/', '_')}.html"
+        path.write_text(page["text"], encoding="utf-8")
+        manifest[page["title"]] = {"file": path.name, "revid": page["revid"]}
+        print(f"{page['title']} (rev {page['revid']}): {len(page['text']) / 1024:.0f} KB -> {path}")
+    manifest_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
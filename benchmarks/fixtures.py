@@ -0,0 +1,181 @@
+"""Deterministic fixtures shaped like MediaWiki ``action=parse`` output.
+
+The benchmarks run offline, so instead of downloading pages we generate markup with
+the same structure Wikipedia returns: edit links, reference superscripts, hatnotes,
+infobox and wikitable tables, nested lists, reference lists and navboxes.
+Real pages saved by ``benchmarks.capture_pages`` under ``benchmarks/pages/`` are used
+for the HTML and retrieval cases when present; ``--html-file`` overrides both.
+"""
+
+from __future__ import annotations
+
+import random
+from pathlib import Path
+from typing import List
+
+PAGES_DIR = Path(__file__).parent / "pages"
+
+WORDS = (
+    "album band record label released studio tour chart single producer composer film "
+    "director premiered university born married city river company founded headquarters "
+    "population district government election season league championship award history "
+    "soundtrack novel published television series station railway province empire"
+).split()
+
+
+def _sentence(rng: random.Random, ref_id: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(12, 28))]
+    words[0] = words[0].capitalize()
+    link = rng.choice(WORDS)
+    return (
+        " ".join(words[:6])
+        + f' <a href="/wiki/{link.capitalize()}" title="{link.capitalize()}">{link}</a> '
+        + " ".join(words[6:])
+        + f'.<sup id="cite_ref-{ref_id}" class="reference"><a href="#cite_note-{ref_id}">'
+        f'<span class="cite-bracket">[</span>{ref_id}<span class="cite-bracket">]</span></a></sup>'
+    )
+
+
+def captured_pages() -> List[str]:
+    """HTML of the real pages captured into ``PAGES_DIR``, in file-name order (empty if none)."""
+    return [p.read_text(encoding="utf-8") for p in sorted(PAGES_DIR.glob("*.html"))]
+
+
+def wikipedia_section_html(paragraphs: int = 60, seed: int = 7) -> str:
+    """A long 'History'-style section (with subsections) of roughly 10 KB per 10 paragraphs."""
+    rng = random.Random(seed)
+    parts: List[str] = ['<div class="mw-content-ltr mw-parser-output" lang="en" dir="ltr">']
+    parts.append(
+        '<div class="mw-heading mw-heading2"><h2 id="History">History</h2>'
+        '<span class="mw-editsection"><span class="mw-editsection-bracket">[</span>'
+        '<a href="/w/index.php?title=X&amp;action=edit&amp;section=1">edit</a>'
+        '<span class="mw-editsection-bracket">]</span></span></div>'
+    )
+    parts.append(
+        '<div role="note" class="hatnote navigation-not-searchable">Main article: '
+        '<a href="/wiki/History_of_X">History of X</a></div>'
+    )
+    ref_id = 1
+    for i in range(paragraphs):
+        if i and i % 15 == 0:
+            parts.append(
+                f'<div class="mw-heading mw-heading3"><h3 id="Period_{i}">Period {i}</h3>'
+                '<span class="mw-editsection">[<a href="#">edit</a>]</span></div>'
+            )
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            sentences.append(_sentence(rng, ref_id))
+            ref_id += 1
+        parts.append("<p>" + " ".join(sentences) + "</p>")
+        if i % 20 == 10:
+            items = "".join(
+                f"<li>{rng.choice(WORDS)} {rng.randint(1900, 2020)}<ul><li>{rng.choice(WORDS)}</li></ul></li>"
+                for _ in range(6)
+            )
+            parts.append(f"<ul>{items}</ul>")
+        if i % 25 == 5:
+            rows = "".join(
+                f"<tr><td>{rng.randint(1950, 2020)}</td><td><i>{rng.choice(WORDS)}</i></td>"
+                f"<td>{rng.choice(WORDS)}</td></tr>"
+                for _ in range(12)
+            )
+            parts.append(
+                '<table class="wikitable sortable"><tbody><tr><th>Year</th><th>Title</th><th>Role</th></tr>'
+                f"{rows}</tbody></table>"
+            )
+    notes = "".join(
+        f'<li id="cite_note-{n}"><span class="reference-text"><cite class="citation web">'
+        f'"{rng.choice(WORDS)} {rng.choice(WORDS)}". Retrieved {rng.randint(2001, 2024)}.</cite></span></li>'
+        for n in range(1, ref_id)
+    )
+    parts.append(f'<div class="reflist"><div class="mw-references-wrap"><ol class="references">{notes}</ol></div></div>')
+    nav = "".join(f'<li><a href="/wiki/{w}">{w}</a></li>' for w in WORDS)
+    parts.append(
+        '<div role="navigation" class="navbox"><table class="nowraplinks navbox-inner"><tbody>'
+        f'<tr><th class="navbox-title">Related</th></tr><tr><td class="navbox-list"><ul>{nav}</ul></td></tr>'
+        "</tbody></table></div>"
+    )
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def wikipedia_lead_html(seed: int = 3) -> str:
+    """A lead section with a short description, hatnote, infobox and two paragraphs."""
+    rng = random.Random(seed)
+    infobox_rows = "".join(
+        f'<tr><th scope="row" class="infobox-label">{label}</th>'
+        f'<td class="infobox-data">{value}</td></tr>'
+        for label, value in (
+            ("Born", 'Jane Doe<br />12 March 1970<br /><a href="/wiki/Santa_Monica">Santa Monica</a>, California'),
+            ("Occupation", "Singer, songwriter"),
+            ("Years active", "1988–present"),
+            ("Labels", '<a href="/wiki/Sony_Music">Sony Music</a>, <a href="/wiki/Epic_Records">Epic</a>'),
+            ("Spouse(s)", "John Smith (m. 1999)"),
+        )
+    )
+    return (
+        '<div class="mw-content-ltr mw-parser-output" lang="en" dir="ltr">'
+        '<div class="shortdescription nomobile noexcerpt noprint searchaux" style="display:none">American singer</div>'
+        '<div role="note" class="hatnote navigation-not-searchable">For other people named Jane Doe, see '
+        '<a href="/wiki/Jane_Doe_(disambiguation)">Jane Doe (disambiguation)</a>.</div>'
+        '<table class="infobox biography vcard"><tbody>'
+        '<tr><th colspan="2" class="infobox-above"><div class="fn">Jane Doe</div></th></tr>'
+        f"{infobox_rows}</tbody></table>"
+        f"<p>{_sentence(rng, 1)} {_sentence(rng, 2)}</p><p>{_sentence(rng, 3)}</p>"
+        "</div>"
+    )
+
+
+def research_tree(nodes: int = 300, seed: int = 11):
+    """A knowledge tree with ``nodes`` facts spread over a few levels."""
+    from src.research_tree import ResearchTree
+
+    rng = random.Random(seed)
+    tree = ResearchTree()
+    ids = ["root"]
+    for i in range(nodes):
+        parent = rng.choice(ids[: max(1, len(ids) // 2 + 1)])
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))
+        ids.append(tree.add_node(parent, f"{rng.choice(WORDS).capitalize()} fact {i}", content,
+                                 f"https://en.wikipedia.org/wiki/Page_{i}"))
+    return tree
+
+
+def todo_manager(tasks: int = 100, seed: int = 13):
+    """A plan with ``tasks`` tasks, about half of them completed."""
+    from src.todo_manager import ResearchTodoManager
+
+    rng = random.Random(seed)
+    todo = ResearchTodoManager()
+    for i in range(tasks):
+        tid = todo.add_task(" ".join(rng.choice(WORDS) for _ in range(12)), priority=rng.randint(1, 10))
+        if i % 2:
+            todo.complete_task(tid, "done")
+    return todo
+
+
+def reasoning_history(steps: int = 15, seed: int = 17) -> List[dict]:
+    """Trace entries shaped like ReasoningEngine.solve's, with long observations."""
+    rng = random.Random(seed)
+    tools = ("search_google", "inspect_article_structure", "read_section", "add_to_memory")
+    history = []
+    for step in range(1, steps + 1):
+        tool = tools[step % len(tools)]
+        history.append({
+            "step": step,
+            "thought": " ".join(rng.choice(WORDS) for _ in range(30)),
+            "tool": tool,
+            "args": {"query": " ".join(rng.choice(WORDS) for _ in range(5)), "content": "x" * 200},
+            "result": " ".join(rng.choice(WORDS) for _ in range(rng.randint(100, 600))),
+        })
+    return history
+
+
+MESSY_LLM_OUTPUTS = [
+    '```json\n{"thought": "Search first", "tool": "search_google", "args": {"query": "Hamlet author"}}\n```',
+    'Sure! Here is my next action:\n{"thought": "Read the lead", "tool": "read_section", '
+    '"args": {"section_name": "lead"}}\nLet me know if you need anything else.',
+    '{"thought": "Answer", "tool": "answer_question", "args": {"answer": "William Shakespeare"}}',
+    'I think we should search. {"thought": "broken", "tool": "search_google", "args": {"query": "x"',
+    "No JSON at all, just prose about the question " * 20,
+]
@@ -0,0 +1,203 @@
+"""Micro-benchmarks of the engine's pure-Python hot paths, with stored baselines.
+
+    python -m benchmarks.run_benchmarks                   # run and compare to baselines.json
+    python -m benchmarks.run_benchmarks --save-baseline   # record new baselines
+    python -m benchmarks.run_benchmarks --check --threshold 1.25   # exit 1 on regressions
+    python -m benchmarks.run_benchmarks --html-file saved_section.html   # real page for the HTML cases
+
+Timings are normalised by a fixed pure-Python calibration loop, run before every timing round,
+so baselines recorded on one machine stay roughly comparable on another. Compare like with like (same Python version).
+Each case reports the median of ``--repeat`` rounds and its noise (median absolute deviation
+relative to the median); a case only counts as a regression when its slowdown exceeds both
+``--threshold`` and three times the noise of the run or the baseline.
+"""
+
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks import fixtures
+from src.passage_retrieval import PassageRetriever
+from src.reasoning_engine import ReasoningEngine
+from src.utils import chunk_text
+from src.web_search import WikipediaSearchClient
+from src.wiki_fetcher import WikipediaArticleFetcher
+
+BASELINE_FILE = Path(__file__).parent / "baselines.json"
+
+
+def _calibration() -> None:
+    total = 0
+    for i in range(200_000):
+        total += i % 7
+    "".join(str(i) for i in range(20_000))
+
+
+def build_cases(html_pages: Optional[List[str]] = None) -> Dict[str, Callable[[], object]]:
+    """Name -> zero-argument callable. All fixtures are built here, outside the timed region."""
+    tree = fixtures.research_tree(300)
+    todo = fixtures.todo_manager(100)
+    history = fixtures.reasoning_history(15)
+    engine = ReasoningEngine(llm=None, searcher=None, fetcher=None)
+    tree_view = tree.get_tree_view(include_content=True)
+    plan_view = todo.get_plan_view()
+    searcher = WikipediaSearchClient()
+    snippets = [fixtures.wikipedia_lead_html(seed)[:2000] for seed in range(20)]
+    pages = html_pages or fixtures.captured_pages()
+    html = "".join(pages) if pages else fixtures.wikipedia_section_html(60)
+    html2text_fetcher = WikipediaArticleFetcher(converter="html2text")
+    lxml_fetcher = WikipediaArticleFetcher(converter="lxml")
+    long_text = fixtures.wikipedia_section_html(150)
+    section_markdown = lxml_fetcher._html_to_markdown(pages[0] if pages else fixtures.wikipedia_section_html(60))
+    retriever = PassageRetriever()
+
+    return {
+        "calibration": _calibration,
+        "tree_view_300_nodes": lambda: tree.get_tree_view(include_content=True),
+        "tree_to_json_300_nodes": tree.to_json,
+        "plan_view_100_tasks": todo.get_plan_view,
+        "build_step_prompt_15_steps": lambda: engine._build_step_prompt(
+            "Who founded the label that released the album?", tree_view, plan_view, history
+        ),
+        "build_step_messages_15_steps": lambda: engine._build_step_messages(
+            "Who founded the label that released the album?", tree_view, plan_view, history
+        ),
+        "parse_json_messy_outputs": lambda: [engine._parse_json_response(t) for t in fixtures.MESSY_LLM_OUTPUTS],
+        "format_snippet_x20": lambda: [searcher._format_snippet(s) for s in snippets],
+        "html_to_markdown_html2text": lambda: html2text_fetcher._html_to_markdown(html),
+        "html_to_markdown_lxml": lambda: lxml_fetcher._html_to_markdown(html),
+        "chunk_text_400kb": lambda: chunk_text(long_text, chunk_size=4000, overlap=200),
+        "passage_retrieval_section": lambda: retriever.retrieve(
+            section_markdown, "Who founded the label that released the album in 1998?"
+        ),
+    }
+
+
+def html_source(html_pages: Optional[List[str]] = None) -> str:
+    """Which HTML the page-based cases ran on; baselines only compare within one source."""
+    if html_pages:
+        return "html-file"
+    return "captured" if fixtures.captured_pages() else "synthetic"
+
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float = 0.1) -> List[Tuple[float, float]]:
+    """
+    ``(per-call seconds, calibration seconds)`` for each of ``repeat`` rounds of an auto-sized loop.
+
+    The calibration loop runs right before every round, so each time is normalised by the
+    speed the machine had at that moment rather than at the start of the run.
+    """
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= min_time or number >= 1_000_000:
+            break
+        number *= 2
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _calibration()
+        calibration = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append(((time.perf_counter() - started) / number, calibration))
+    return rounds
+
+
+def summarize(rounds: List[Tuple[float, float]]) -> Dict[str, float]:
+    """Median time, median calibration-normalised time and its relative noise (MAD / median)."""
+    ratios = [seconds / calibration for seconds, calibration in rounds]
+    normalized = statistics.median(ratios)
+    mad = statistics.median(abs(r - normalized) for r in ratios)
+    return {
+        "seconds": statistics.median(seconds for seconds, _ in rounds),
+        "normalized": normalized,
+        "noise": mad / normalized if normalized else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--filter", type=str, default=None, help="Only run cases whose name contains this")
+    parser.add_argument("--html-file", action="append", default=None,
+                        help="Saved action=parse HTML used by the html_to_markdown cases")
+    parser.add_argument("--baseline", type=str, default=str(BASELINE_FILE))
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if any case regressed")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Regression if the normalised median exceeds baseline by this factor "
+                             "and by more than the noise (default: 1.25)")
+    args = parser.parse_args()
+
+    html_pages = [Path(p).read_text(encoding="utf-8") for p in args.html_file] if args.html_file else None
+    cases = build_cases(html_pages)
+    names = [n for n in cases if n == "calibration" or not args.filter or args.filter in n]
+
+    samples = {name: measure(cases[name], args.repeat) for name in names}
+    results = {name: summarize(rounds) for name, rounds in samples.items()}
+
+    baseline_path = Path(args.baseline)
+    baseline_data = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    baseline = baseline_data.get("cases", {})
+    source = html_source(html_pages)
+    if baseline and baseline_data.get("html_source", "synthetic") != source:
+        print(f"Baseline was recorded on {baseline_data.get('html_source', 'synthetic')} HTML, this run uses "
+              f"{source} HTML: the HTML and retrieval cases are not comparable")
+
+    def limit(name: str) -> float:
+        """Slowdown factor above which ``name`` counts as a regression."""
+        noise = max(results[name]["noise"], baseline[name].get("noise", 0.0))
+        return max(args.threshold, 1.0 + 3.0 * noise)
+
+    # Re-measure suspected regressions so one noisy run does not fail a check
+    for name in results:
+        for _ in range(2):
+            if name == "calibration" or name not in baseline:
+                break
+            if results[name]["normalized"] / baseline[name]["normalized"] <= limit(name):
+                break
+            samples[name] += measure(cases[name], args.repeat)
+            results[name] = summarize(samples[name])
+
+    regressions = []
+    print(f"{'case':<32}{'time':>12}{'noise':>8}{'normalized':>12}{'baseline':>12}{'ratio':>8}")
+    for name, result in results.items():
+        row = f"{name:<32}{result['seconds'] * 1e6:>10.1f}us{result['noise']:>7.1%}{result['normalized']:>12.4f}"
+        if name in baseline and name != "calibration":
+            ratio = result["normalized"] / baseline[name]["normalized"]
+            flag = "  REGRESSION" if ratio > limit(name) else ""
+            if flag:
+                regressions.append(name)
+            row += f"{baseline[name]['normalized']:>12.4f}{ratio:>7.2f}x{flag}"
+        print(row)
+
+    if args.save_baseline:
+        data = {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "html_source": source,
+            "cases": {n: {k: round(v, 9) for k, v in r.items()} for n, r in results.items()},
+        }
+        baseline_path.write_text(json.dumps(data, indent=2) + "\n")
+        print(f"Baseline saved to {baseline_path}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold}x and the measured noise: "
+              f"{', '.join(regressions)}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
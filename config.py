@@ -24,27 +24,74 @@ class Settings:
     openai_model: str = os.getenv("OPENAI_MODEL", "deepseek-v3.1")
     temperature: float = float(os.getenv("TEMPERATURE", "0.0"))
     streaming: bool = os.getenv("STREAMING", "true").lower() == "true"
+    stream_usage: bool = os.getenv("STREAM_USAGE", "true").lower() == "true"  # send stream_options.include_usage
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    llm_cache_enabled: bool = os.getenv("LLM_CACHE", "false").lower() == "true"
+    llm_cache_max_mb: int = int(os.getenv("LLM_CACHE_MAX_MB", "512"))
 
     # Search
     google_api_key: str = os.getenv("GOOGLE_API_KEY", "")
     google_cse_id: str = os.getenv("GOOGLE_CSE_ID", "")
     serpapi_key: str = os.getenv("SERPAPI_KEY", "")
     search_delay: float = float(os.getenv("SEARCH_DELAY", "2.0"))
+    http_pool_size: int = int(os.getenv("HTTP_POOL_SIZE", "64"))
+    http_max_attempts: int = int(os.getenv("HTTP_MAX_ATTEMPTS", "4"))
+    rate_limits: str = os.getenv("RATE_LIMITS", "")  # e.g. "wikipedia_rest=5:10,fetcher=20:40"
+    rate_limit_state_dir: str = os.getenv("RATE_LIMIT_STATE_DIR", "")  # share buckets across processes
     max_search_results: int = int(os.getenv("MAX_SEARCH_RESULTS", "5"))
+    local_index_enabled: bool = os.getenv("LOCAL_INDEX", "false").lower() == "true"
+    search_offline: bool = os.getenv("SEARCH_OFFLINE", "false").lower() == "true"
+    search_hedge_delay: float = float(os.getenv("SEARCH_HEDGE_DELAY", "0"))  # seconds, 0 = sequential backends
+    search_deadline: float = float(os.getenv("SEARCH_DEADLINE", "0"))  # seconds per search call, 0 = none
+    search_cache_enabled: bool = os.getenv("SEARCH_CACHE", "true").lower() == "true"
+    search_cache_disk: bool = os.getenv("SEARCH_CACHE_DISK", "false").lower() == "true"
+    search_cache_ttl_hours: float = float(os.getenv("SEARCH_CACHE_TTL_HOURS", "24"))
+
+    # Article fetching
+    fetch_mode: str = os.getenv("FETCH_MODE", "section")  # "section" or "full"
+    html_converter: str = os.getenv("HTML_CONVERTER", "html2text")  # "html2text" or "lxml"
+    html_conversion_processes: int = int(os.getenv("HTML_CONVERSION_PROCESSES", "0"))  # 0 = convert inline
+    prefetch_top_k: int = int(os.getenv("PREFETCH_TOP_K", "2"))  # 0 disables prefetching
+    prefetch_max_wasted: int = int(os.getenv("PREFETCH_MAX_WASTED", "10"))
+    article_cache_disk: bool = os.getenv("ARTICLE_CACHE_DISK", "true").lower() == "true"
+    article_cache_memory_mb: int = int(os.getenv("ARTICLE_CACHE_MEMORY_MB", "64"))
+    article_cache_max_mb: int = int(os.getenv("ARTICLE_CACHE_MAX_MB", "1024"))
+    article_cache_ttl_hours: float = float(os.getenv("ARTICLE_CACHE_TTL_HOURS", "168"))  # 0 = pin revisions forever
 
     # Agent behaviour
     max_hops: int = int(os.getenv("MAX_HOPS", "6"))
+    max_steps: int = int(os.getenv("MAX_STEPS", "40"))
+    max_question_tokens: int = int(os.getenv("MAX_QUESTION_TOKENS", "0"))  # 0 = no token budget
+    max_question_seconds: float = float(os.getenv("MAX_QUESTION_SECONDS", "0"))  # 0 = no time budget
+    prompt_layout: str = os.getenv("PROMPT_LAYOUT", "classic")  # "classic" or "prefix_stable"
+    history_recent_steps: int = int(os.getenv("HISTORY_RECENT_STEPS", "6"))  # 0 = fixed 15-step window
+    context_token_budget: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))  # 0 = character limits only
+    context_tokenizer: str = os.getenv("CONTEXT_TOKENIZER", "heuristic")  # "heuristic" or "tiktoken"
+    context_observation_tokens: int = int(os.getenv("CONTEXT_OBSERVATION_TOKENS", "300"))
+    memoize_tools: bool = os.getenv("MEMOIZE_TOOLS", "true").lower() == "true"
+    toc_max_level: int = int(os.getenv("TOC_MAX_LEVEL", "2"))  # 0 = show every level
+    toc_max_entries: int = int(os.getenv("TOC_MAX_ENTRIES", "60"))  # 0 = no limit
+    passage_retrieval: bool = os.getenv("PASSAGE_RETRIEVAL", "false").lower() == "true"
+    passage_top_k: int = int(os.getenv("PASSAGE_TOP_K", "3"))
+    passage_chunk_chars: int = int(os.getenv("PASSAGE_CHUNK_CHARS", "800"))
+    passage_overlap_chars: int = int(os.getenv("PASSAGE_OVERLAP_CHARS", "100"))
     max_retries: int = int(os.getenv("MAX_RETRIES", "3"))
 
     # Evaluation defaults
     random_seed: int = int(os.getenv("RANDOM_SEED", "42"))
     sample_size: int = int(os.getenv("SAMPLE_SIZE", "10"))
+    eval_workers: int = int(os.getenv("EVAL_WORKERS", "1"))
+    question_timeout: float = float(os.getenv("QUESTION_TIMEOUT", "0"))  # seconds, 0 = no limit
 
     # Paths
     benchmark_file: Path = BASE_DIR / "musique_4hop_all_questions.json"
     results_dir: Path = BASE_DIR / "evaluation" / "results"
     prompts_dir: Path = BASE_DIR / "prompts"
     memory_store_path: Path = BASE_DIR / "data" / "memory_store.json"
+    llm_cache_path: Path = BASE_DIR / "data" / "llm_cache.sqlite"
+    article_cache_path: Path = BASE_DIR / "data" / "article_cache.sqlite"
+    search_cache_path: Path = BASE_DIR / "data" / "search_cache.sqlite"
+    local_index_path: Path = BASE_DIR / "data" / "local_index.sqlite"
 
 
 settings = Settings()
@@ -54,21 +101,67 @@ OPENAI_API_KEY = settings.openai_api_key
 OPENAI_API_BASE = settings.openai_api_base
 OPENAI_MODEL = settings.openai_model
 TEMPERATURE = settings.temperature
+LLM_MAX_CONCURRENCY = settings.llm_max_concurrency
+LLM_CACHE_ENABLED = settings.llm_cache_enabled
+LLM_CACHE_MAX_MB = settings.llm_cache_max_mb
 
 GOOGLE_API_KEY = settings.google_api_key
 GOOGLE_CSE_ID = settings.google_cse_id
 SERPAPI_KEY = settings.serpapi_key
 SEARCH_DELAY = settings.search_delay
+HTTP_POOL_SIZE = settings.http_pool_size
+HTTP_MAX_ATTEMPTS = settings.http_max_attempts
+RATE_LIMITS = settings.rate_limits
+RATE_LIMIT_STATE_DIR = settings.rate_limit_state_dir
 MAX_SEARCH_RESULTS = settings.max_search_results
+LOCAL_INDEX_ENABLED = settings.local_index_enabled
+SEARCH_OFFLINE = settings.search_offline
+SEARCH_HEDGE_DELAY = settings.search_hedge_delay
+SEARCH_DEADLINE = settings.search_deadline
+SEARCH_CACHE_ENABLED = settings.search_cache_enabled
+SEARCH_CACHE_DISK = settings.search_cache_disk
+SEARCH_CACHE_TTL_HOURS = settings.search_cache_ttl_hours
+
+FETCH_MODE = settings.fetch_mode
+HTML_CONVERTER = settings.html_converter
+HTML_CONVERSION_PROCESSES = settings.html_conversion_processes
+PREFETCH_TOP_K = settings.prefetch_top_k
+PREFETCH_MAX_WASTED = settings.prefetch_max_wasted
+ARTICLE_CACHE_DISK = settings.article_cache_disk
+ARTICLE_CACHE_MEMORY_MB = settings.article_cache_memory_mb
+ARTICLE_CACHE_MAX_MB = settings.article_cache_max_mb
+ARTICLE_CACHE_TTL_HOURS = settings.article_cache_ttl_hours
 
 MAX_HOPS = settings.max_hops
+MAX_STEPS = settings.max_steps
+MAX_QUESTION_TOKENS = settings.max_question_tokens
+MAX_QUESTION_SECONDS = settings.max_question_seconds
+PROMPT_LAYOUT = settings.prompt_layout
+HISTORY_RECENT_STEPS = settings.history_recent_steps
+CONTEXT_TOKEN_BUDGET = settings.context_token_budget
+CONTEXT_TOKENIZER = settings.context_tokenizer
+CONTEXT_OBSERVATION_TOKENS = settings.context_observation_tokens
+MEMOIZE_TOOLS = settings.memoize_tools
+TOC_MAX_LEVEL = settings.toc_max_level
+TOC_MAX_ENTRIES = settings.toc_max_entries
+PASSAGE_RETRIEVAL = settings.passage_retrieval
+PASSAGE_TOP_K = settings.passage_top_k
+PASSAGE_CHUNK_CHARS = settings.passage_chunk_chars
+PASSAGE_OVERLAP_CHARS = settings.passage_overlap_chars
 MAX_RETRIES = settings.max_retries
 
 RANDOM_SEED = settings.random_seed
 SAMPLE_SIZE = settings.sample_size
+EVAL_WORKERS = settings.eval_workers
+QUESTION_TIMEOUT = settings.question_timeout
 
 BENCHMARK_FILE = settings.benchmark_file
 RESULTS_DIR = settings.results_dir
 PROMPTS_DIR = settings.prompts_dir
 MEMORY_STORE_PATH = settings.memory_store_path
+LLM_CACHE_PATH = settings.llm_cache_path
+ARTICLE_CACHE_PATH = settings.article_cache_path
+SEARCH_CACHE_PATH = settings.search_cache_path
+LOCAL_INDEX_PATH = settings.local_index_path
 STREAMING = settings.streaming
+STREAM_USAGE = settings.stream_usage
@@ -0,0 +1,31 @@
+"""Build the offline FTS5 search index from MuSiQue paragraphs (and optionally an abstract dump)."""
+
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+# Add parent directory to path to find 'src'
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import config
+from src.local_index import build_local_index
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--benchmark", action="append", default=None,
+                        help="MuSiQue JSON file(s) whose paragraphs are indexed (default: BENCHMARK_FILE)")
+    parser.add_argument("--abstracts", type=str, default=None,
+                        help="Optional Wikipedia abstract dump (enwiki-latest-abstract.xml)")
+    parser.add_argument("--output", type=str, default=str(config.LOCAL_INDEX_PATH))
+    args = parser.parse_args()
+
+    benchmark_files = args.benchmark or [str(config.BENCHMARK_FILE)]
+    count = build_local_index(args.output, benchmark_files, abstract_dump=args.abstracts)
+    logger.info(f"Done: {count} passages in {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
 """Main evaluation script for the MuSiQue solver."""
 
 import sys
+import time
 import logging
 import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 # Add parent directory to path to find 'src'
 sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -14,8 +17,16 @@ import config
 from src.web_search import WikipediaSearchClient
 from src.wiki_fetcher import WikipediaArticleFetcher
 from src.llm_client import LLMClient
+from src.cache import DiskCache, LRUCache, TieredCache
 from src.reasoning_engine import ReasoningEngine
-from src.utils import ensure_directory, save_json, get_timestamp
+from src.prefetcher import SearchPrefetcher
+from src.passage_retrieval import PassageRetriever
+from src.context_builder import ContextBuilder, get_tokenizer
+from src.local_index import LocalArticleFetcher, LocalIndexSearch
+from src.rate_limiter import RateLimiter
+from src.http_transport import HttpTransport
+from src.cassette import Cassette, CassetteMiss
+from src.utils import ensure_directory, save_json, get_timestamp, render_prompt
 from evaluation.random_sampler import sample_questions
 
 # Setup logging
@@ -34,11 +45,32 @@ def load_system_prompt() -> str:
     if not prompt_path.exists():
         raise FileNotFoundError(f"System prompt not found at {prompt_path}")
     with open(prompt_path, 'r', encoding='utf-8') as f:
-        return f.read()
+        return render_prompt(
+            f.read(),
+            passage_retrieval=config.PASSAGE_RETRIEVAL,
+            toc_max_level=config.TOC_MAX_LEVEL,
+            toc_max_entries=config.TOC_MAX_ENTRIES,
+        )
 
-def initialize_components() -> ReasoningEngine:
-    """Initialize the Agent Stack."""
+def initialize_clients(
+    use_llm_cache: bool = config.LLM_CACHE_ENABLED,
+    cassette: Optional[Cassette] = None,
+    workers: int = 1,
+) -> Tuple[LLMClient, WikipediaSearchClient, WikipediaArticleFetcher]:
+    """Initialize the clients shared by every engine session of a run.
+
+    With a cassette, persistent caches are bypassed so that every LLM and HTTP
+    exchange is recorded (or replayed) instead of being served from disk.
+    ``workers`` sizes the shared hedged-search pool for that many concurrent searches.
+    """
     system_prompt = load_system_prompt()
+    if cassette is not None:
+        use_llm_cache = False
+        logger.info(f"Cassette {cassette.mode} mode: {cassette.path} (persistent caches disabled)")
+    llm_cache = None
+    if use_llm_cache:
+        llm_cache = DiskCache(config.LLM_CACHE_PATH, max_bytes=config.LLM_CACHE_MAX_MB * 1024 * 1024)
+        logger.info(f"LLM response cache enabled at {config.LLM_CACHE_PATH}")
     llm_client = LLMClient(
         api_key=config.OPENAI_API_KEY,
         model=config.OPENAI_MODEL,
@@ -46,27 +78,138 @@ def initialize_components() -> ReasoningEngine:
         temperature=0.0,
         system_prompt=system_prompt,
         streaming=config.STREAMING,
+        stream_usage=config.STREAM_USAGE,
+        max_concurrency=config.LLM_MAX_CONCURRENCY,
+        cache=llm_cache,
+        cassette=cassette,
     )
     
+    local_index = None
+    if config.LOCAL_INDEX_ENABLED or config.SEARCH_OFFLINE:
+        local_index = LocalIndexSearch(config.LOCAL_INDEX_PATH)
+        logger.info(f"Local search index enabled at {config.LOCAL_INDEX_PATH}")
+    
+    rate_limiter = build_rate_limiter(unlimited=cassette is not None and cassette.replaying)
+    transport = HttpTransport(pool_maxsize=config.HTTP_POOL_SIZE, max_attempts=config.HTTP_MAX_ATTEMPTS,
+                              cassette=cassette)
+    
+    search_cache = None
+    if config.SEARCH_CACHE_ENABLED:
+        disk = DiskCache(config.SEARCH_CACHE_PATH) if config.SEARCH_CACHE_DISK and cassette is None else None
+        search_cache = TieredCache(LRUCache(max_bytes=16 * 1024 * 1024), disk)
+    
     search_client = WikipediaSearchClient(
         api_key=config.GOOGLE_API_KEY,
         cse_id=config.GOOGLE_CSE_ID,
         serpapi_key=config.SERPAPI_KEY,
         rate_limit=config.SEARCH_DELAY,
+        local_index=local_index,
+        offline=config.SEARCH_OFFLINE,
+        cache=search_cache,
+        rate_limiter=rate_limiter,
+        cache_ttl=config.SEARCH_CACHE_TTL_HOURS * 3600 if config.SEARCH_CACHE_TTL_HOURS > 0 else None,
+        hedge_delay=config.SEARCH_HEDGE_DELAY if config.SEARCH_HEDGE_DELAY > 0 else None,
+        search_deadline=config.SEARCH_DEADLINE if config.SEARCH_DEADLINE > 0 else None,
+        transport=transport,
+        hedge_workers=8 * workers,
     )
     
-    fetcher = WikipediaArticleFetcher()
+    if config.SEARCH_OFFLINE:
+        fetcher = LocalArticleFetcher(local_index)
+    else:
+        fetcher = build_fetcher(rate_limiter, transport, use_disk_cache=cassette is None)
     
-    engine = ReasoningEngine(
+    return llm_client, search_client, fetcher
+
+def build_rate_limiter(unlimited: bool = False) -> RateLimiter:
+    """One limiter shared by search and fetch so all workers stay within each backend's quota.
+
+    ``unlimited`` is used when replaying a cassette: no request reaches a real backend.
+    """
+    if unlimited:
+        return RateLimiter({name: (1e6, 1000) for name in RateLimiter.DEFAULT_RATES}, default=(1e6, 1000))
+    rates = RateLimiter.parse_spec(config.RATE_LIMITS)
+    if config.SEARCH_DELAY > 0:
+        rates.setdefault("google_html", (1.0 / config.SEARCH_DELAY, 1))
+    return RateLimiter(rates=rates, state_dir=config.RATE_LIMIT_STATE_DIR or None)
+
+def build_fetcher(
+    rate_limiter: Optional[RateLimiter] = None,
+    transport: Optional[HttpTransport] = None,
+    use_disk_cache: bool = True,
+) -> WikipediaArticleFetcher:
+    """Article fetcher backed by the shared memory LRU and (optionally) the on-disk article cache."""
+    disk = None
+    if config.ARTICLE_CACHE_DISK and use_disk_cache:
+        disk = DiskCache(config.ARTICLE_CACHE_PATH, max_bytes=config.ARTICLE_CACHE_MAX_MB * 1024 * 1024)
+    cache = TieredCache(LRUCache(max_bytes=config.ARTICLE_CACHE_MEMORY_MB * 1024 * 1024), disk)
+    ttl = config.ARTICLE_CACHE_TTL_HOURS * 3600 if config.ARTICLE_CACHE_TTL_HOURS > 0 else None
+    pool = ProcessPoolExecutor(config.HTML_CONVERSION_PROCESSES) if config.HTML_CONVERSION_PROCESSES > 0 else None
+    return WikipediaArticleFetcher(cache=cache, cache_ttl=ttl, fetch_mode=config.FETCH_MODE,
+                                   rate_limiter=rate_limiter, transport=transport,
+                                   converter=config.HTML_CONVERTER, conversion_pool=pool)
+
+def build_engine(
+    llm_client: LLMClient,
+    search_client: WikipediaSearchClient,
+    fetcher: WikipediaArticleFetcher,
+) -> ReasoningEngine:
+    """Create one engine session over shared clients."""
+    prefetcher = None
+    if config.PREFETCH_TOP_K > 0:
+        prefetcher = SearchPrefetcher(fetcher, top_k=config.PREFETCH_TOP_K, max_wasted=config.PREFETCH_MAX_WASTED)
+    context_builder = None
+    if config.CONTEXT_TOKEN_BUDGET > 0:
+        context_builder = ContextBuilder(
+            budget_tokens=config.CONTEXT_TOKEN_BUDGET,
+            tokenizer=get_tokenizer(config.CONTEXT_TOKENIZER),
+            observation_tokens=config.CONTEXT_OBSERVATION_TOKENS,
+        )
+    passage_retriever = None
+    if config.PASSAGE_RETRIEVAL:
+        passage_retriever = PassageRetriever(
+            chunk_size=config.PASSAGE_CHUNK_CHARS,
+            overlap=config.PASSAGE_OVERLAP_CHARS,
+            top_k=config.PASSAGE_TOP_K,
+        )
+    return ReasoningEngine(
         llm=llm_client,
         searcher=search_client,
-        fetcher=fetcher
+        fetcher=fetcher,
+        prefetcher=prefetcher,
+        prompt_layout=config.PROMPT_LAYOUT,
+        context_builder=context_builder,
+        max_steps=config.MAX_STEPS,
+        max_tokens=config.MAX_QUESTION_TOKENS,
+        max_seconds=config.MAX_QUESTION_SECONDS,
+        memoize_tools=config.MEMOIZE_TOOLS,
+        passage_retriever=passage_retriever,
+        toc_max_level=config.TOC_MAX_LEVEL,
+        toc_max_entries=config.TOC_MAX_ENTRIES,
+        history_recent_steps=config.HISTORY_RECENT_STEPS,
     )
+
+def initialize_components(
+    use_llm_cache: bool = config.LLM_CACHE_ENABLED,
+    cassette: Optional[Cassette] = None,
+) -> ReasoningEngine:
+    """Initialize the Agent Stack."""
+    llm_client, search_client, fetcher = initialize_clients(use_llm_cache, cassette)
     
-    return engine
+    return build_engine(llm_client, search_client, fetcher)
+
+def evaluate_question(
+    engine: ReasoningEngine,
+    question_data: dict,
+    timeout: Optional[float] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> dict:
+    """Evaluate a single question.
 
-def evaluate_question(engine: ReasoningEngine, question_data: dict) -> dict:
-    """Evaluate a single question."""
+    If ``timeout`` is given, the engine is cancelled once that many wall-clock seconds
+    have passed since the question started. Cancellation is cooperative (checked
+    between steps), so the record is still produced from the partial trace.
+    """
     question_id = question_data['id']
     question_text = question_data['question']
     ground_truth = question_data['answer']
@@ -74,8 +217,20 @@ def evaluate_question(engine: ReasoningEngine, question_data: dict) -> dict:
     logger.info(f"Evaluating QID: {question_id}")
     logger.info(f"Question: {question_text}")
     
+    cancel_event = cancel_event or threading.Event()
+    timed_out = threading.Event()
+    timer = None
+    if timeout:
+        def _expire():
+            timed_out.set()
+            cancel_event.set()
+        timer = threading.Timer(timeout, _expire)
+        timer.daemon = True
+        timer.start()
+    started = time.monotonic()
+    
     try:
-        result_data = engine.solve(question_text)
+        result_data = engine.solve(question_text, cancel_event=cancel_event)
         
         final_answer = result_data.get("final_answer")
         trace = result_data.get("trace", [])
@@ -87,15 +242,36 @@ def evaluate_question(engine: ReasoningEngine, question_data: dict) -> dict:
             "ground_truth": ground_truth,
             "agent_answer": final_answer,
             "trace_summary": f"Used {len(trace)} steps.",
+            "stop_reason": result_data.get("stop_reason"),
             "full_trace": trace,
             "knowledge_tree": tree_state,
             "success": True
         }
+        if "prefetch_stats" in result_data:
+            record["prefetch_stats"] = result_data["prefetch_stats"]
+        if "llm_usage" in result_data:
+            record["llm_usage"] = result_data["llm_usage"]
+        if "timing_summary" in result_data:
+            record["timing_summary"] = result_data["timing_summary"]
+        if "memo_stats" in result_data:
+            record["memo_stats"] = result_data["memo_stats"]
+        if "history_digest" in result_data:
+            record["history_digest"] = result_data["history_digest"]
+        if result_data.get("cancelled"):
+            record["cancelled"] = True
+            record["timed_out"] = timed_out.is_set()
         
         logger.info(f"Agent Answer: {final_answer}")
         logger.info(f"Steps Taken: {len(trace)}")
+        for kind, timing in result_data.get("timing_summary", {}).items():
+            logger.info(f"  {kind}: {timing['count']} calls, {timing['seconds']:.2f}s")
+        memo = result_data.get("memo_stats") or {}
+        if memo.get("hits"):
+            logger.info(f"Repeated tool calls served from memo: {memo['hits']} {memo['saved_calls']}")
         logger.info("---")
         
+    except CassetteMiss:
+        raise  # the whole run is replaying a stale cassette, not just this question
     except Exception as e:
         logger.error(f"Error evaluating question {question_id}: {e}", exc_info=True)
         record = {
@@ -106,14 +282,144 @@ def evaluate_question(engine: ReasoningEngine, question_data: dict) -> dict:
             "error": str(e),
             "success": False
         }
+    finally:
+        if timer is not None:
+            timer.cancel()
     
+    record["elapsed_seconds"] = round(time.monotonic() - started, 2)
     return record
 
+def run_sequential(
+    questions: List[Dict],
+    results_file: Path,
+    timeout: Optional[float],
+    use_llm_cache: bool = False,
+    cassette: Optional[Cassette] = None,
+) -> List[Dict[str, Any]]:
+    """Solve questions one at a time with a single shared engine."""
+    engine = initialize_components(use_llm_cache, cassette)
+    # Type hint explicitly to fix "append" errors
+    results: List[Dict[str, Any]] = []
+    
+    try:
+        for i, q in enumerate(questions, 1):
+            logger.info(f"Processing {i}/{len(questions)}...")
+            res = evaluate_question(engine, q, timeout=timeout)
+            results.append(res)
+            
+            # Save incrementally (always cast path to string)
+            save_json(results, str(results_file))
+    finally:
+        if engine.prefetcher is not None:
+            engine.prefetcher.shutdown()
+        engine.fetcher.close()
+        engine.searcher.close()
+    
+    log_run_stats(engine.llm, engine.searcher, engine.fetcher)
+    return results
+
+def run_parallel(
+    questions: List[Dict],
+    results_file: Path,
+    workers: int,
+    timeout: Optional[float],
+    use_llm_cache: bool = False,
+    cassette: Optional[Cassette] = None,
+) -> List[Dict[str, Any]]:
+    """Solve questions concurrently, one fresh engine session per question.
+
+    The LLM, search and fetch clients are shared across sessions; each question gets
+    its own ReasoningEngine so the per-question state (tree, plan, trace) never mixes.
+    Results are always written in sample order, whatever order they complete in.
+    """
+    llm_client, search_client, fetcher = initialize_clients(use_llm_cache, cassette, workers)
+    slots: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+    cancel_events = [threading.Event() for _ in questions]
+
+    def _solve(index: int) -> Dict[str, Any]:
+        engine = build_engine(llm_client, search_client, fetcher)
+        try:
+            return evaluate_question(engine, questions[index], timeout=timeout, cancel_event=cancel_events[index])
+        finally:
+            if engine.prefetcher is not None:
+                engine.prefetcher.shutdown()
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="eval")
+    try:
+        futures = {executor.submit(_solve, i): i for i in range(len(questions))}
+        done = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            slots[index] = future.result()
+            done += 1
+            logger.info(f"Completed {done}/{len(questions)} (QID: {questions[index]['id']})")
+            save_json([r for r in slots if r is not None], str(results_file))
+    except KeyboardInterrupt:
+        logger.warning("Interrupted: cancelling in-flight questions...")
+        raise
+    finally:
+        # Whatever ended the loop, stop queued and in-flight questions before returning
+        for event in cancel_events:
+            event.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        fetcher.close()
+        search_client.close()
+
+    log_run_stats(llm_client, search_client, fetcher)
+    return [r for r in slots if r is not None]
+
+def log_run_stats(
+    llm_client: LLMClient,
+    search_client: WikipediaSearchClient,
+    fetcher: WikipediaArticleFetcher,
+) -> None:
+    stats = llm_client.cache_stats()
+    if stats:
+        logger.info(f"LLM cache: {stats['hits']} hits / {stats['misses']} misses, {stats['entries']} entries")
+    if llm_client.cassette is not None:
+        counts = llm_client.cassette.stats()
+        logger.info(
+            f"Cassette ({llm_client.cassette.mode}): {counts['recorded']} recorded, "
+            f"{counts['replayed']} replayed, {counts['misses']} misses"
+        )
+    usage = llm_client.usage_stats()
+    if usage["requests"]:
+        logger.info(
+            f"LLM tokens: {usage['prompt_tokens']} prompt ({usage['cached_prompt_tokens']} served from the "
+            f"server prompt cache, {usage['cached_prompt_ratio']:.0%}), {usage['completion_tokens']} completion"
+        )
+    memory = fetcher.cache_stats().get("memory")
+    if memory:
+        logger.info(f"Article cache (memory): {memory['hits']} hits / {memory['misses']} misses")
+    for host, counters in search_client.transport.stats().items():
+        logger.info(
+            f"HTTP {host}: {counters['requests']} requests, {counters['retries']} retries, "
+            f"{counters['errors']} errors, avg {counters['avg_latency']}s, {counters['bytes']} bytes"
+        )
+    for name, backend in search_client.backend_stats().items():
+        logger.info(
+            f"Search backend {name}: {backend['calls']} calls, {backend['failures']} failures, "
+            f"latency~{backend['latency_ewma']}s, circuit {'OPEN' if backend['circuit_open'] else 'closed'}"
+        )
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--sample-size", type=int, default=config.SAMPLE_SIZE)
     parser.add_argument("--seed", type=int, default=config.RANDOM_SEED)
     parser.add_argument("--run-name", type=str, default=None)
+    parser.add_argument("--workers", type=int, default=config.EVAL_WORKERS,
+                        help="Number of questions solved concurrently (1 = sequential)")
+    parser.add_argument("--question-timeout", type=float, default=config.QUESTION_TIMEOUT,
+                        help="Per-question wall-clock limit in seconds (0 = no limit)")
+    parser.add_argument("--llm-cache", action="store_true", default=config.LLM_CACHE_ENABLED,
+                        help="Serve repeated temperature-0 LLM calls from the on-disk response cache")
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument("--record", type=str, default=None, metavar="CASSETTE",
+                                help="Record every LLM and HTTP exchange of this run to a cassette file")
+    cassette_group.add_argument("--replay", type=str, default=None, metavar="CASSETTE",
+                                help="Serve LLM and HTTP exchanges from a recorded cassette (no network)")
+    parser.add_argument("--replay-latency", type=float, default=0.0,
+                        help="When replaying, sleep this multiple of each recorded latency (0 = none, 1 = as recorded)")
     args = parser.parse_args()
     
     # 1. Load Questions
@@ -125,15 +431,7 @@ def main():
         logger.error(f"Failed to load benchmark file: {e}")
         return
 
-    # 2. Init Engine
-    logger.info("Initializing Agent Engine...")
-    try:
-        engine = initialize_components()
-    except Exception as e:
-        logger.error(f"Failed to initialize components: {e}")
-        return
-    
-    # 3. Setup Paths
+    # 2. Setup Paths
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     run_name_str = args.run_name if args.run_name else f"run_{timestamp}"
     
@@ -147,17 +445,36 @@ def main():
     # Save Questions
     save_json(questions, str(results_path_obj / "questions.json"))
     
-    # 4. Main Loop
-    # Type hint explicitly to fix "append" errors
-    results: List[Dict[str, Any]] = []
-    
-    for i, q in enumerate(questions, 1):
-        logger.info(f"Processing {i}/{len(questions)}...")
-        res = evaluate_question(engine, q)
-        results.append(res)
-        
-        # Save incrementally (always cast path to string)
-        save_json(results, str(results_path_obj / "responses.json"))
+    # 3. Init Engine(s) and run
+    logger.info("Initializing Agent Engine...")
+    results_file = results_path_obj / "responses.json"
+    timeout = args.question_timeout if args.question_timeout > 0 else None
+    cassette = None
+    if args.record:
+        cassette = Cassette(args.record, mode="record")
+    elif args.replay:
+        cassette = Cassette(args.replay, mode="replay", latency_scale=args.replay_latency)
+    started = time.monotonic()
+    try:
+        if args.workers > 1:
+            logger.info(f"Running {len(questions)} questions with {args.workers} workers")
+            run_parallel(questions, results_file, args.workers, timeout, args.llm_cache, cassette)
+        else:
+            run_sequential(questions, results_file, timeout, args.llm_cache, cassette)
+    except CassetteMiss as e:
+        logger.error(
+            f"Cassette {cassette.path} is out of date: {e}. The prompts or code changed since it was "
+            f"recorded; re-record it with --record {cassette.path}."
+        )
+        return
+    except Exception as e:
+        logger.error(f"Evaluation run failed: {e}")
+        return
+    finally:
+        if cassette is not None:
+            cassette.close()
+    elapsed = time.monotonic() - started
+    logger.info(f"Solved {len(questions)} questions in {elapsed:.1f}s ({len(questions) / elapsed:.2f} questions/s)")
     
     logger.info(f"Run complete. Saved to {results_dir_str}")
 
@@ -13,13 +13,20 @@ from src.web_search import WikipediaSearchClient
 from src.wiki_fetcher import WikipediaArticleFetcher
 from src.llm_client import LLMClient
 from src.reasoning_engine import ReasoningEngine
+from src.utils import render_prompt
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def load_system_prompt() -> str:
     path = Path(config.PROMPTS_DIR) / "agent_system_prompt.txt"
-    with open(path, 'r', encoding='utf-8') as f: return f.read()
+    with open(path, 'r', encoding='utf-8') as f:
+        return render_prompt(
+            f.read(),
+            passage_retrieval=False,
+            toc_max_level=config.TOC_MAX_LEVEL,
+            toc_max_entries=config.TOC_MAX_ENTRIES,
+        )
 
 def main():
     parser = argparse.ArgumentParser()
@@ -41,7 +48,10 @@ def main():
     fetcher = WikipediaArticleFetcher()
     
     # Engine now manages its own memory per solve() call
-    engine = ReasoningEngine(llm, searcher, fetcher)
+    engine = ReasoningEngine(
+        llm, searcher, fetcher,
+        toc_max_level=config.TOC_MAX_LEVEL, toc_max_entries=config.TOC_MAX_ENTRIES,
+    )
     
     print(f"\nThinking about: {question}...\n")
     
@@ -1,6 +1,6 @@
 """Core package for the musique-solver project."""
 
-from .web_search import WikipediaSearchClient, SearchResult
+from .web_search import WikipediaSearchClient, SearchResult, PageMetadata
 from .wiki_fetcher import WikipediaArticleFetcher, ArticleStructure
 from .reasoning_engine import ReasoningEngine
 from .research_tree import ResearchTree, KnowledgeNode
@@ -11,6 +11,7 @@ from .utils import ensure_directory, chunk_text, save_json, load_json, get_times
 __all__ = [
     "WikipediaSearchClient",
     "SearchResult",
+    "PageMetadata",
     "WikipediaArticleFetcher",
     "ArticleStructure",
     "ReasoningEngine",
@@ -0,0 +1,104 @@
+"""Live health statistics and circuit breaking for search backends."""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class BackendStats:
+    name: str
+    calls: int = 0
+    failures: int = 0
+    empty: int = 0
+    latency_ewma: Optional[float] = None  # seconds
+    error_rate: float = 0.0  # EWMA of the failure indicator
+    consecutive_failures: int = 0
+    open_until: float = 0.0  # circuit open (backend skipped) until this timestamp
+
+    def score(self, prior_latency: float) -> float:
+        """Expected cost of trying this backend; unmeasured backends are assumed to take ``prior_latency``."""
+        latency = prior_latency if self.latency_ewma is None else self.latency_ewma
+        return latency * (1.0 + 4.0 * self.error_rate)
+
+
+class BackendHealthTracker:
+    """
+    Tracks latency/error EWMAs per backend and opens a circuit after repeated failures.
+
+    A backend whose circuit is open is skipped until ``cooldown`` seconds have passed;
+    it is then tried again (half-open) and one more failure re-opens the circuit.
+    Backends are ordered by expected cost, with unmeasured ones assumed to take
+    ``prior_latency`` seconds (so a slow or failing backend ranks behind an untried
+    one), ties keep their configured order, and unreliable ones (error rate >= 50%)
+    go last.
+    """
+
+    def __init__(
+        self,
+        alpha: float = 0.3,
+        failure_threshold: int = 3,
+        cooldown: float = 120.0,
+        prior_latency: float = 1.0,
+    ) -> None:
+        self.alpha = alpha
+        self.prior_latency = prior_latency
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._stats: Dict[str, BackendStats] = {}
+
+    def record(self, name: str, latency: float, ok: bool, empty: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(name, BackendStats(name))
+            stats.calls += 1
+            failed = 0.0 if ok else 1.0
+            stats.error_rate = self.alpha * failed + (1 - self.alpha) * stats.error_rate
+            if stats.latency_ewma is None:
+                stats.latency_ewma = latency
+            else:
+                stats.latency_ewma = self.alpha * latency + (1 - self.alpha) * stats.latency_ewma
+            if ok:
+                stats.consecutive_failures = 0
+                stats.open_until = 0.0
+                if empty:
+                    stats.empty += 1
+            else:
+                stats.failures += 1
+                stats.consecutive_failures += 1
+                if stats.consecutive_failures >= self.failure_threshold:
+                    stats.open_until = time.time() + self.cooldown
+
+    def is_available(self, name: str) -> bool:
+        with self._lock:
+            stats = self._stats.get(name)
+            return stats is None or stats.open_until <= time.time()
+
+    def order(self, names: List[str]) -> List[str]:
+        """Available backends in preferred order; all of them if every circuit is open."""
+        with self._lock:
+            now = time.time()
+            position = {name: i for i, name in enumerate(names)}
+            stats = {name: self._stats.get(name, BackendStats(name)) for name in names}
+        available = [n for n in names if stats[n].open_until <= now] or list(names)
+        return sorted(
+            available,
+            key=lambda n: (stats[n].error_rate >= 0.5, stats[n].score(self.prior_latency), position[n]),
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-backend statistics for monitoring."""
+        with self._lock:
+            now = time.time()
+            result = {}
+            for name, stats in self._stats.items():
+                data = asdict(stats)
+                data["circuit_open"] = stats.open_until > now
+                if data["latency_ewma"] is not None:
+                    data["latency_ewma"] = round(data["latency_ewma"], 3)
+                data["error_rate"] = round(data["error_rate"], 3)
+                result[name] = data
+            return result
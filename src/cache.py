@@ -0,0 +1,306 @@
+"""Persistent key-value caches shared by the LLM, search and fetch layers."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from .utils import ensure_directory
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(payload: Any) -> str:
+    """Return a stable content hash for any JSON-serialisable payload."""
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    SQLite-backed cache with size-based eviction and hit/miss counters.
+
+    Values are stored as JSON. When the total stored size exceeds ``max_bytes``
+    the least recently accessed entries are evicted until the cache is back under
+    90% of the limit. One connection is shared by all threads behind a lock; WAL
+    mode lets several processes on the same host use the file concurrently.
+
+    The total size lives in the database and is updated in the same transaction as
+    each write, so the limit holds when several processes share one file. Access
+    times of hits are buffered in memory and written with the next write (or every
+    ``access_flush_every`` hits), so reads do not commit.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_bytes: int = 512 * 1024 * 1024,
+        access_flush_every: int = 256,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.access_flush_every = access_flush_every
+        ensure_directory(self.path.parent)
+
+        self._lock = threading.Lock()
+        self._pending_access: Dict[str, float] = {}
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        # Files created before the size was tracked get it computed once
+        self._conn.execute(
+            "INSERT OR IGNORE INTO meta (name, value) SELECT 'total_bytes', COALESCE(SUM(size), 0) FROM entries"
+        )
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        """Return the cached value, or None if missing or older than ``max_age`` seconds."""
+        entry = self.get_entry(key, max_age=max_age)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: str, max_age: Optional[float] = None) -> Optional[tuple]:
+        """Like :meth:`get` but returns ``(value, created_timestamp)``."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (max_age is not None and now - row[1] > max_age):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._pending_access[key] = now
+            if len(self._pending_access) >= self.access_flush_every:
+                self._flush_access()
+                self._conn.commit()
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any) -> None:
+        """Store a value, evicting old entries if the size limit is exceeded."""
+        blob = json.dumps(value, ensure_ascii=False)
+        size = len(blob.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            # Write lock up front: the size delta must match what this transaction replaces
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._flush_access()
+                old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, size, now, now),
+                )
+                total = self._add_bytes(size - (old[0] if old else 0))
+                if total > self.max_bytes:
+                    self._evict(total, int(self.max_bytes * 0.9))
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+                if old:
+                    self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                    self._add_bytes(-old[0])
+                self._pending_access.pop(key, None)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.execute("UPDATE meta SET value = 0 WHERE name = 'total_bytes'")
+            self._pending_access.clear()
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            total = self._total_bytes()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+            self._conn.close()
+
+    def _total_bytes(self) -> int:
+        row = self._conn.execute("SELECT value FROM meta WHERE name = 'total_bytes'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _add_bytes(self, delta: int) -> int:
+        """Adjust the shared size counter and return the new total (lock and transaction held)."""
+        self._conn.execute("UPDATE meta SET value = value + ? WHERE name = 'total_bytes'", (delta,))
+        return self._total_bytes()
+
+    def _flush_access(self) -> None:
+        """Write buffered access times (lock held; caller commits)."""
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE entries SET accessed = ? WHERE key = ?",
+                [(t, k) for k, t in self._pending_access.items()],
+            )
+            self._pending_access.clear()
+
+    def _evict(self, total: int, target_bytes: int) -> None:
+        """Drop least recently accessed entries until total size <= target_bytes (lock and transaction held)."""
+        rows = self._conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall()
+        doomed = []
+        freed = 0
+        for key, size in rows:
+            if total - freed <= target_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        self._add_bytes(-freed)
+        self.evictions += len(doomed)
+        logger.debug(f"Evicted {len(doomed)} cache entries from {self.path}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __repr__(self) -> str:
+        return f"DiskCache(path={self.path})"
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU bounded by the approximate JSON size of its values."""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, size, created)
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (max_age is not None and time.time() - entry[2] > max_age):
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any, created: Optional[float] = None) -> None:
+        size = len(json.dumps(value, ensure_ascii=False))
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+            self._data[key] = (value, size, created if created is not None else time.time())
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and len(self._data) > 1:
+                _, (_, evicted_size, _) = self._data.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._total_bytes -= old[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._data),
+            "bytes": self._total_bytes,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    Memory LRU in front of an optional persistent DiskCache.
+
+    Reads check memory first, then disk (promoting hits into memory); writes go to
+    both tiers. ``max_age`` is honoured by both tiers so TTL policies stay consistent.
+    """
+
+    def __init__(self, memory: Optional[LRUCache] = None, disk: Optional[DiskCache] = None) -> None:
+        self.memory = memory or LRUCache()
+        self.disk = disk
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[Any]:
+        value = self.memory.get(key, max_age=max_age)
+        if value is not None or self.disk is None:
+            return value
+        entry = self.disk.get_entry(key, max_age=max_age)
+        if entry is None:
+            return None
+        # Keep the original creation time so TTLs are not extended by promotion
+        self.memory.set(key, entry[0], created=entry[1])
+        return entry[0]
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
@@ -0,0 +1,156 @@
+"""Record/replay of LLM and HTTP exchanges for reproducible, offline runs."""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .cache import make_cache_key
+from .utils import ensure_directory
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("record", "replay")
+# Response headers worth keeping; callers only look at these
+KEPT_HEADERS = ("Content-Type", "Retry-After")
+
+
+class CassetteMiss(LookupError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+class Cassette:
+    """
+    A JSON Lines file of ``{kind, key, latency, response}`` entries.
+
+    In ``record`` mode every exchange is appended as it completes (thread-safe, so
+    parallel runs can share one cassette). In ``replay`` mode entries are served by
+    request key: repeated identical requests get their recorded responses in order,
+    and the last one is reused once they run out. Replayed calls sleep for
+    ``latency_scale`` times the recorded latency (0 = as fast as possible).
+    """
+
+    def __init__(self, path: Union[str, Path], mode: str = "replay", latency_scale: float = 0.0) -> None:
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"mode must be one of {CASSETTE_MODES}, got {mode!r}")
+        self.path = Path(path)
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._served: Dict[str, int] = defaultdict(int)
+        self._counts = {"recorded": 0, "replayed": 0, "misses": 0}
+        self._file = None
+
+        if mode == "replay":
+            if not self.path.exists():
+                raise FileNotFoundError(f"Cassette not found at {self.path}")
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[f"{entry['kind']}:{entry['key']}"].append(entry)
+        else:
+            ensure_directory(self.path.parent)
+            self._file = open(self.path, "w", encoding="utf-8")
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    # ------------------------------------------------------------------
+    # Generic entries
+    # ------------------------------------------------------------------
+    def record(self, kind: str, key: str, response: Dict[str, Any], latency: float) -> None:
+        line = json.dumps({"kind": kind, "key": key, "latency": round(latency, 4), "response": response},
+                          ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._counts["recorded"] += 1
+
+    def replay(self, kind: str, key: str) -> Dict[str, Any]:
+        entry = self._next_entry(kind, key)
+        if self.latency_scale > 0:
+            time.sleep(entry["latency"] * self.latency_scale)
+        return entry["response"]
+
+    async def areplay(self, kind: str, key: str) -> Dict[str, Any]:
+        entry = self._next_entry(kind, key)
+        if self.latency_scale > 0:
+            await asyncio.sleep(entry["latency"] * self.latency_scale)
+        return entry["response"]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _next_entry(self, kind: str, key: str) -> Dict[str, Any]:
+        full_key = f"{kind}:{key}"
+        with self._lock:
+            entries = self._entries.get(full_key)
+            if not entries:
+                self._counts["misses"] += 1
+                raise CassetteMiss(f"No recorded {kind} exchange for key {key}")
+            index = min(self._served[full_key], len(entries) - 1)
+            self._served[full_key] += 1
+            self._counts["replayed"] += 1
+            return entries[index]
+
+    # ------------------------------------------------------------------
+    # Request keys and HTTP response (de)serialisation
+    # ------------------------------------------------------------------
+    @staticmethod
+    def llm_key(model: str, system: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+        return make_cache_key({
+            "model": model,
+            "system": system,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        })
+
+    @staticmethod
+    def http_key(url: str, params: Optional[Dict[str, Any]]) -> str:
+        return make_cache_key({"url": url, "params": {k: str(v) for k, v in (params or {}).items()}})
+
+    @staticmethod
+    def dump_response(response: requests.Response) -> Dict[str, Any]:
+        try:
+            body, encoding = response.content.decode("utf-8"), "utf-8"
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(response.content).decode("ascii"), "base64"
+        return {
+            "status_code": response.status_code,
+            "headers": {h: response.headers[h] for h in KEPT_HEADERS if h in response.headers},
+            "body": body,
+            "body_encoding": encoding,
+            "url": response.url,
+        }
+
+    @staticmethod
+    def load_response(data: Dict[str, Any]) -> requests.Response:
+        response = requests.Response()
+        response.status_code = data["status_code"]
+        response.headers = CaseInsensitiveDict(data.get("headers") or {})
+        body = data["body"]
+        response._content = base64.b64decode(body) if data.get("body_encoding") == "base64" else body.encode("utf-8")
+        response.encoding = "utf-8"
+        response.url = data.get("url") or ""
+        return response
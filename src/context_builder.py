@@ -0,0 +1,219 @@
+"""Token-budgeted selection of plan, knowledge-tree nodes and history for each step prompt."""
+
+from __future__ import annotations
+
+import logging
+import math
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from .research_tree import ResearchTree
+from .utils import content_terms
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+TOKENIZERS = ("heuristic", "tiktoken")
+PLAN_TRUNCATED = "\n... [plan truncated]"
+OBSERVATION_TRUNCATED = "... [truncated to fit context budget]"
+
+
+class HeuristicTokenizer:
+    """Approximate count of ``chars_per_token`` characters per token; no dependencies."""
+
+    name = "heuristic"
+
+    def __init__(self, chars_per_token: float = 4.0) -> None:
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return text[:max(0, int(max_tokens * self.chars_per_token))]
+
+
+class TiktokenTokenizer:
+    """Exact BPE token counts via ``tiktoken`` (``pip install tiktoken``)."""
+
+    name = "tiktoken"
+
+    def __init__(self, encoding: str = "cl100k_base") -> None:
+        if tiktoken is None:
+            raise ImportError("tiktoken package is required. Install with `pip install tiktoken`.")
+        self.encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=())) if text else 0
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokens = self.encoding.encode(text, disallowed_special=())
+        return self.encoding.decode(tokens[:max(0, max_tokens)])
+
+
+def get_tokenizer(name: str = "heuristic"):
+    """Tokenizer by name; falls back to the heuristic when tiktoken is not installed."""
+    if name not in TOKENIZERS:
+        raise ValueError(f"tokenizer must be one of {TOKENIZERS}, got {name!r}")
+    if name == "tiktoken":
+        if tiktoken is not None:
+            return TiktokenTokenizer()
+        logger.warning("tiktoken is not installed; falling back to the heuristic tokenizer")
+    return HeuristicTokenizer()
+
+
+@dataclass
+class StepContext:
+    """What goes into one step prompt, plus how the token budget was spent."""
+
+    plan: str
+    tree: str
+    history: List[Dict[str, Any]]
+    report: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class BudgetReport:
+    budget: int
+    overhead: int = 0  # goal, instructions and prompt scaffolding
+    plan: int = 0
+    tree: int = 0
+    history: int = 0
+    tree_nodes: int = 0
+    tree_nodes_total: int = 0
+    history_steps: int = 0
+    history_steps_total: int = 0
+    truncated_observations: int = 0
+
+    @property
+    def used(self) -> int:
+        return self.overhead + self.plan + self.tree + self.history
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["used"] = self.used
+        return data
+
+
+class ContextBuilder:
+    """
+    Fits each step prompt into ``budget_tokens`` by filling sections in priority order:
+    goal and instructions (always), the plan, the knowledge-tree nodes most relevant to
+    the question and pending tasks, then as many recent observations as still fit.
+
+    Observations are capped at ``observation_tokens`` each; the most recent step is always
+    kept, trimmed further if needed, so the agent sees the result of its last action.
+    History steps are measured as the caller renders them (``render_step``), so the
+    budget holds for whichever prompt layout is in use.
+    """
+
+    def __init__(self, budget_tokens: int = 6000, tokenizer=None, observation_tokens: int = 300) -> None:
+        self.budget_tokens = budget_tokens
+        self.tokenizer = tokenizer or HeuristicTokenizer()
+        self.observation_tokens = observation_tokens
+
+    def build(
+        self,
+        question: str,
+        plan: str,
+        tree: ResearchTree,
+        history: List[Dict[str, Any]],
+        overhead_tokens: int = 0,
+        pending_tasks: Optional[List[str]] = None,
+        render_step: Optional[Callable[[Dict[str, Any]], str]] = None,
+    ) -> StepContext:
+        report = BudgetReport(budget=self.budget_tokens, overhead=overhead_tokens)
+        render_step = render_step or self._render_step
+        remaining = self.budget_tokens - overhead_tokens
+
+        # 1. Plan
+        report.plan = self.tokenizer.count(plan)
+        if report.plan > remaining:
+            plan = self._truncate(plan, remaining, PLAN_TRUNCATED)
+            report.plan = self.tokenizer.count(plan)
+        remaining -= report.plan
+
+        # 2. Relevant tree nodes, reserving room for the latest observation
+        reserve = min(self.observation_tokens, max(0, remaining // 2)) if history else 0
+        node_ids = self._select_tree_nodes(question, tree, pending_tasks or [], remaining - reserve)
+        tree_view = tree.get_tree_view(include_content=True, node_ids=node_ids)
+        report.tree = self.tokenizer.count(tree_view)
+        report.tree_nodes = len(node_ids) - 1  # root is always shown
+        report.tree_nodes_total = len(tree.node_map) - 1
+        remaining -= report.tree
+
+        # 3. Most recent observations
+        selected: List[Dict[str, Any]] = []
+        for i, step in enumerate(reversed(history)):
+            result = str(step.get("result", ""))
+            header_cost = self.tokenizer.count(render_step({**step, "result": ""}))
+            cap = self.observation_tokens
+            if i == 0:
+                # The latest observation is always kept, trimmed to whatever room is left
+                cap = max(0, min(cap, remaining - header_cost))
+            if self.tokenizer.count(result) > cap:
+                result = self._truncate(result, cap, OBSERVATION_TRUNCATED)
+                report.truncated_observations += 1
+            cost = self.tokenizer.count(render_step({**step, "result": result}))
+            if i and cost > remaining:
+                break
+            selected.append({**step, "result": result})
+            remaining -= cost
+            report.history += cost
+        selected.reverse()
+        report.history_steps = len(selected)
+        report.history_steps_total = len(history)
+
+        data = report.to_dict()
+        logger.debug(
+            f"Context budget: {report.used}/{report.budget} tokens "
+            f"(overhead {report.overhead}, plan {report.plan}, "
+            f"tree {report.tree} [{report.tree_nodes}/{report.tree_nodes_total} nodes], "
+            f"history {report.history} [{report.history_steps}/{report.history_steps_total} steps, "
+            f"{report.truncated_observations} truncated])"
+        )
+        return StepContext(plan=plan, tree=tree_view, history=selected, report=data)
+
+    def _select_tree_nodes(
+        self, question: str, tree: ResearchTree, pending_tasks: List[str], budget: int
+    ) -> Set[str]:
+        """Root plus the best-scoring nodes (and their ancestors) that fit in ``budget``."""
+        selected = {"root"}
+        budget -= self.tokenizer.count(tree.get_tree_view(include_content=True, node_ids=selected))
+        terms = self._terms(" ".join([question] + pending_tasks))
+        nodes = [node for node_id, node in tree.node_map.items() if node_id != "root"]
+        # Most overlapping terms first; ties go to the most recently added node
+        ranked = sorted(
+            enumerate(nodes),
+            key=lambda item: (-len(terms & self._terms(f"{item[1].topic} {item[1].content}")), -item[0]),
+        )
+        for _, node in ranked:
+            chain = []
+            current = node
+            while current is not None and current.id not in selected:
+                chain.append(current)
+                current = tree.node_map.get(current.parent_id) if current.parent_id else None
+            cost = sum(self.tokenizer.count(tree.get_node_line(n, include_content=True)) + 1 for n in chain)
+            if cost > budget:
+                continue
+            selected.update(n.id for n in chain)
+            budget -= cost
+        return selected
+
+    def _truncate(self, text: str, max_tokens: int, suffix: str) -> str:
+        """Cut ``text`` so that it fits ``max_tokens`` together with the ``suffix`` marking the cut."""
+        return self.tokenizer.truncate(text, max(0, max_tokens - self.tokenizer.count(suffix))) + suffix
+
+    def _render_step(self, step: Dict[str, Any]) -> str:
+        """Classic prompt rendering of a history step, for callers that do not pass their own."""
+        args = step.get("args") or {}
+        args_str = ", ".join(f"{k}='{v}'" for k, v in args.items() if k != "content")
+        return (f"Step {step.get('step')}: {step.get('thought', '')}\nAction: {step.get('tool')}({args_str})\n"
+                f"Observation: {step.get('result', '')}")
+
+    def _terms(self, text: str) -> Set[str]:
+        return set(content_terms(text))
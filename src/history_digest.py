@@ -0,0 +1,123 @@
+"""Rolling digest of older reasoning steps: queries tried, articles visited, dead ends."""
+
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Optional
+
+_RESULT_TITLE_RE = re.compile(r"^\[\d+\] Title: (.+)$", re.MULTILINE)
+_ARTICLE_RE = re.compile(r"^📄 ARTICLE: (.+)$", re.MULTILINE)
+
+
+class HistoryDigest:
+    """
+    Compact navigational memory for steps that no longer appear in the prompt.
+
+    Steps are folded in one at a time with :meth:`add`, which only updates small
+    per-query / per-article records, so the cost of a fold does not grow with the
+    number of steps already folded. :meth:`render` shows the ``max_items`` most recent
+    entries of each list, which keeps the digest bounded for any run length.
+    """
+
+    def __init__(self, max_items: int = 12) -> None:
+        self.max_items = max_items
+        self.first_step: Optional[int] = None
+        self.last_step: Optional[int] = None
+        self.steps = 0
+        self.facts_stored = 0
+        self.queries: Dict[str, Dict[str, Any]] = {}  # query (case-folded) -> {query, results, top}
+        self.articles: Dict[str, Dict[str, Any]] = {}  # title -> {url, sections}
+        self.dead_ends: List[str] = []
+        self._current_article: Optional[str] = None
+        self._rendered: Optional[str] = None
+
+    def add(self, step: Dict[str, Any]) -> None:
+        """Fold one trace record into the digest."""
+        tool = step.get("tool")
+        args = step.get("args") or {}
+        result = str(step.get("result", ""))
+        number = step.get("step")
+        self.first_step = number if self.first_step is None else self.first_step
+        self.last_step = number
+        self.steps += 1
+        self._rendered = None
+
+        if result.startswith("♻️ REPEATED ACTION"):
+            self.dead_ends.append(f"step {number}: repeated {tool}({self._args_text(args)})")
+            return
+        if result.startswith("❌") or result.startswith("SYSTEM ERROR"):
+            first_line = result.split("\n", 1)[0][:120]
+            self.dead_ends.append(f"step {number}: {tool}({self._args_text(args)}) -> {first_line}")
+            return
+
+        if tool == "search_google":
+            query = str(args.get("query", "")).strip()
+            titles = _RESULT_TITLE_RE.findall(result)
+            entry = self.queries.pop(query.casefold(), None) or {"query": query}
+            entry.update(results=len(titles), top=titles[:2])
+            self.queries[query.casefold()] = entry  # re-insert: most recent last
+            if not titles:
+                self.dead_ends.append(f"step {number}: search '{query}' returned no results")
+        elif tool == "inspect_article_structure":
+            match = _ARTICLE_RE.search(result)
+            if match:
+                title = match.group(1).strip()
+                entry = self.articles.pop(title, None) or {"url": args.get("url", ""), "sections": []}
+                self.articles[title] = entry
+                self._current_article = title
+        elif tool == "read_section":
+            title = self._current_article
+            if args.get("url"):
+                title = next((t for t, a in self.articles.items() if a["url"] == args["url"]), args["url"])
+            if title is not None:
+                entry = self.articles.setdefault(title, {"url": args.get("url", ""), "sections": []})
+                section = str(args.get("section_name") or "lead")
+                if section not in entry["sections"]:
+                    entry["sections"].append(section)
+        elif tool == "add_to_memory":
+            self.facts_stored += 1
+
+    def render(self) -> str:
+        """Text block for the prompt; cached until the next :meth:`add`."""
+        if self._rendered is not None:
+            return self._rendered
+        if not self.steps:
+            self._rendered = ""
+            return self._rendered
+        lines = [f"Steps {self.first_step}-{self.last_step} ({self.steps} steps, {self.facts_stored} facts stored in the tree):"]
+
+        queries = list(self.queries.values())
+        lines.append("Queries tried:" + self._more(len(queries)))
+        for q in queries[-self.max_items:]:
+            top = f": {'; '.join(q['top'])}" if q["top"] else ""
+            lines.append(f"  - '{q['query']}' ({q['results']} results){top}")
+
+        articles = list(self.articles.items())
+        lines.append("Articles visited:" + self._more(len(articles)))
+        for title, a in articles[-self.max_items:]:
+            sections = f" - read: {', '.join(a['sections'])}" if a["sections"] else " - inspected only"
+            lines.append(f"  - {title}{sections}")
+
+        lines.append("Dead ends (do not repeat):" + self._more(len(self.dead_ends)))
+        for d in self.dead_ends[-self.max_items:]:
+            lines.append(f"  - {d}")
+        self._rendered = "\n".join(lines)
+        return self._rendered
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "steps": self.steps,
+            "queries": list(self.queries.values()),
+            "articles": self.articles,
+            "dead_ends": self.dead_ends,
+        }
+
+    def _more(self, count: int) -> str:
+        if count == 0:
+            return " none"
+        if count > self.max_items:
+            return f" ({count - self.max_items} earlier not shown)"
+        return ""
+
+    def _args_text(self, args: Dict[str, Any]) -> str:
+        return ", ".join(f"{k}='{v}'" for k, v in args.items() if k != "content")[:120]
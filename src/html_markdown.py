@@ -0,0 +1,225 @@
+"""HTML to Markdown conversion for MediaWiki parser output."""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, List
+
+import html2text
+import lxml.html
+
+# Wikipedia chrome that costs prompt tokens without carrying facts
+BOILERPLATE_CLASSES = (
+    "mw-editsection", "reference", "reflist", "references", "mw-references-wrap",
+    "navbox", "navbox-styles", "vertical-navbox", "sidebar", "hatnote", "dablink",
+    "shortdescription", "metadata", "ambox", "mbox-small", "noprint", "sistersitebox",
+    "portalbox", "side-box", "authority-control", "toc", "mw-jump-link", "mw-empty-elt",
+    "printfooter", "catlinks", "cite-bracket",
+)
+DROP_TAGS = ("style", "script", "noscript", "link", "meta", "img", "figure", "audio", "video")
+CONVERTERS = ("html2text", "lxml")
+
+_BOILERPLATE = frozenset(BOILERPLATE_CLASSES)
+_BLOCK_TAGS = {"p", "div", "section", "center", "blockquote", "ul", "ol", "dl", "table", "pre"}
+_HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+
+def convert_html(html: str, converter: str = "html2text") -> str:
+    """Module-level entry point (picklable, so it can run in a process pool)."""
+    if converter == "lxml":
+        return html_to_markdown_fast(html)
+    return html_to_markdown_html2text(html)
+
+
+def html_to_markdown_html2text(html: str) -> str:
+    """Reference conversion: the whole parser output through html2text."""
+    if not html:
+        return ""
+    h = html2text.HTML2Text()
+    h.ignore_links = False
+    h.ignore_images = True
+    h.body_width = 0
+    h.unicode_snob = True
+    h.decode_errors = 'ignore'
+    result = h.handle(html).strip()
+
+    # Remove excessive newlines
+    return re.sub(r'\n{3,}', '\n\n', result)
+
+
+def html_to_markdown_fast(html: str) -> str:
+    """
+    lxml-based conversion that first drops Wikipedia boilerplate (references, navboxes,
+    hatnotes, edit links, ...) and renders links as plain text.
+
+    Output keeps headings, paragraphs, lists and tables (one ``|``-separated row per
+    line), which is all the agent needs to read facts.
+    """
+    if not html or not html.strip():
+        return ""
+    root = lxml.html.fragment_fromstring(html, create_parent="div")
+    # One pass over the tree; collect first so removal does not disturb iteration
+    doomed = [
+        el for el in root.iter()
+        if el.tag in DROP_TAGS or not _BOILERPLATE.isdisjoint((el.get("class") or "").split())
+    ]
+    for el in doomed:
+        if el.getparent() is not None:
+            _drop(el)
+
+    blocks: List[str] = []
+    _render_block(root, blocks, depth=0)
+    text = "\n\n".join(b for b in blocks if b)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def extract_infobox(html: str, max_value_chars: int = 300) -> Dict[str, str]:
+    """
+    Label -> value pairs from the first infobox in ``html`` (usually the lead section).
+
+    Multi-line values (``<br>`` and list items) are joined with ``"; "``; references,
+    hidden spans and images are dropped. Returns an empty dict when there is no infobox.
+    """
+    if not html or "infobox" not in html:
+        return {}
+    root = lxml.html.fragment_fromstring(html, create_parent="div")
+    table = next(
+        (el for el in root.iter("table") if "infobox" in (el.get("class") or "").split()), None
+    )
+    if table is None:
+        return {}
+    doomed = [
+        el for el in table.iter()
+        if el.tag in DROP_TAGS
+        or not _BOILERPLATE.isdisjoint((el.get("class") or "").split())
+        or "display:none" in (el.get("style") or "").replace(" ", "")
+    ]
+    for el in doomed:
+        if el.getparent() is not None:
+            _drop(el)
+
+    facts: Dict[str, str] = {}
+    for tr in table.iter("tr"):
+        cells = [cell for cell in tr if cell.tag in ("th", "td")]
+        if len(cells) != 2:
+            continue  # title, image and header rows span both columns
+        label = _clean(_inline_text(cells[0])).replace("\n", " ")
+        for item in cells[1].iter("li", "p", "div"):
+            item.tail = "\n" + (item.tail or "")
+        value = "; ".join(line for line in _clean(_inline_text(cells[1])).split("\n") if line)
+        if not label or not value:
+            continue
+        if len(value) > max_value_chars:
+            value = value[:max_value_chars].rstrip() + "..."
+        facts[label] = f"{facts[label]}; {value}" if label in facts else value
+    return facts
+
+
+def _drop(el) -> None:
+    """Remove an element but keep its tail text attached to the previous node."""
+    parent = el.getparent()
+    if parent is None:
+        return
+    tail = el.tail
+    previous = el.getprevious()
+    parent.remove(el)
+    if tail:
+        if previous is not None:
+            previous.tail = (previous.tail or "") + tail
+        else:
+            parent.text = (parent.text or "") + tail
+
+
+def _inline_text(el) -> str:
+    """Flatten an element to a single line of text."""
+    parts = [el.text or ""]
+    for child in el:
+        if not isinstance(child.tag, str):  # comments / processing instructions
+            parts.append(child.tail or "")
+            continue
+        parts.append("\n" if child.tag == "br" else _inline_text(child))
+        parts.append(child.tail or "")
+    return re.sub(r"[ \t\r\f\v]+", " ", "".join(parts))
+
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s*\n\s*", "\n", text).strip()
+
+
+def _render_block(el, blocks: List[str], depth: int) -> None:
+    inline: List[str] = [el.text or ""]
+
+    def flush() -> None:
+        text = _clean(re.sub(r"[ \t\r\f\v]+", " ", "".join(inline)))
+        if text:
+            blocks.append(text)
+        inline.clear()
+
+    for child in el:
+        tag = child.tag if isinstance(child.tag, str) else None
+        if tag in _HEADINGS:
+            flush()
+            blocks.append("#" * _HEADINGS[tag] + " " + _clean(_inline_text(child)))
+        elif tag in ("ul", "ol"):
+            flush()
+            blocks.append(_render_list(child, depth))
+        elif tag == "dl":
+            flush()
+            blocks.append(_render_definition_list(child))
+        elif tag == "table":
+            flush()
+            blocks.append(_render_table(child))
+        elif tag == "blockquote":
+            flush()
+            quoted: List[str] = []
+            _render_block(child, quoted, depth)
+            blocks.append("\n".join("> " + line for b in quoted for line in b.splitlines()))
+        elif tag in _BLOCK_TAGS:
+            flush()
+            _render_block(child, blocks, depth)
+        elif tag == "br":
+            inline.append("\n")
+        elif tag is not None:
+            inline.append(_inline_text(child))
+        inline.append(child.tail or "")
+    flush()
+
+
+def _render_list(el, depth: int) -> str:
+    lines: List[str] = []
+    ordered = el.tag == "ol"
+    indent = "  " * depth
+    for i, item in enumerate(el.iterchildren("li"), 1):
+        nested = [child for child in item if child.tag in ("ul", "ol")]
+        for child in nested:
+            item.remove(child)
+        marker = f"{i}." if ordered else "-"
+        text = _clean(_inline_text(item)).replace("\n", " ")
+        if text:
+            lines.append(f"{indent}{marker} {text}")
+        for child in nested:
+            lines.append(_render_list(child, depth + 1))
+    return "\n".join(line for line in lines if line)
+
+
+def _render_definition_list(el) -> str:
+    lines: List[str] = []
+    for child in el:
+        text = _clean(_inline_text(child)).replace("\n", " ")
+        if not text:
+            continue
+        lines.append(f"**{text}**" if child.tag == "dt" else f": {text}")
+    return "\n".join(lines)
+
+
+def _render_table(el) -> str:
+    rows: List[str] = []
+    caption = el.find("caption")
+    if caption is not None:
+        rows.append(_clean(_inline_text(caption)))
+    for tr in el.iter("tr"):
+        cells = [_clean(_inline_text(cell)).replace("\n", "; ") for cell in tr if cell.tag in ("th", "td")]
+        cells = [c for c in cells if c]
+        if cells:
+            rows.append("| " + " | ".join(cells) + " |")
+    return "\n".join(rows)
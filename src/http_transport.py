@@ -0,0 +1,208 @@
+"""Shared pooled HTTP transport with retry/backoff and per-host counters."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import (
+    RetryCallState,
+    Retrying,
+    retry_if_exception,
+    retry_if_result,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+from .cassette import Cassette, CassetteMiss
+from .instrumentation import span
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_HEADERS = {
+    "User-Agent": "MusiqueSolver/0.3 (Research Agent; contact: research@musique-solver.local)",
+    "Accept-Encoding": "gzip, deflate",
+}
+
+
+class HttpTransport:
+    """
+    One keep-alive connection pool for every search and fetch request.
+
+    Transient failures (connection errors, timeouts, 429 and 5xx responses) are retried
+    with jittered exponential backoff; a ``Retry-After`` header takes precedence over
+    the computed delay. Once retries are exhausted the last response is returned (so
+    callers keep their own status handling) or the last exception is raised.
+
+    Latency-bound callers can pass ``retry_timeouts=False`` (a backend that hung once
+    will likely hang again) and a monotonic ``deadline`` that caps each attempt's
+    timeout, the backoff sleeps and the number of attempts.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 16,
+        pool_maxsize: int = 64,
+        max_attempts: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 30.0,
+        timeout: float = 20.0,
+        cassette: Optional[Cassette] = None,
+    ) -> None:
+        self.max_attempts = max_attempts
+        # Optional: record final responses, or replay them without touching the network
+        self.cassette = cassette
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._jitter = wait_random_exponential(multiplier=backoff_base, max=backoff_max)
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def get(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+        retry_timeouts: bool = True,
+        deadline: Optional[float] = None,
+    ) -> requests.Response:
+        host = urlsplit(url).netloc
+        if self.cassette is not None and self.cassette.replaying:
+            return self._replay(host, url, params)
+        started = time.monotonic()
+        with span("http", host=host, retries=0) as attrs:
+
+            def before_sleep(state: RetryCallState) -> None:
+                attrs["retries"] += 1
+                self._count(host, "retries")
+
+            def retryable(exc: BaseException) -> bool:
+                if isinstance(exc, requests.Timeout):
+                    return retry_timeouts
+                return isinstance(exc, requests.ConnectionError)
+
+            def wait(state: RetryCallState) -> float:
+                delay = self._wait(state)
+                return delay if deadline is None else max(0.0, min(delay, deadline - time.monotonic()))
+
+            stop = stop_after_attempt(self.max_attempts)
+            if deadline is not None:
+                stop = stop | (lambda state: time.monotonic() >= deadline)
+            retrying = Retrying(
+                stop=stop,
+                wait=wait,
+                retry=(
+                    retry_if_exception(retryable)
+                    | retry_if_result(lambda resp: resp.status_code in RETRY_STATUSES)
+                ),
+                before_sleep=before_sleep,
+                retry_error_callback=lambda state: state.outcome.result(),
+            )
+            response = retrying(self._get_once, host, url, params, headers, timeout or self.timeout, deadline)
+            attrs["status"] = response.status_code
+            attrs["bytes"] = len(response.content)
+        if self.cassette is not None:
+            self.cassette.record("http", Cassette.http_key(url, params), Cassette.dump_response(response),
+                                 time.monotonic() - started)
+        return response
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Per-host request, error, retry, byte and latency counters."""
+        with self._lock:
+            result = {}
+            for host, counters in self._hosts.items():
+                data = dict(counters)
+                data["avg_latency"] = round(data["latency"] / data["requests"], 3) if data["requests"] else 0.0
+                data["latency"] = round(data["latency"], 3)
+                result[host] = data
+            return result
+
+    def close(self) -> None:
+        self.session.close()
+
+    def _replay(self, host: str, url: str, params: Optional[Dict[str, Any]]) -> requests.Response:
+        with span("http", host=host, retries=0, replayed=True) as attrs:
+            try:
+                response = Cassette.load_response(self.cassette.replay("http", Cassette.http_key(url, params)))
+            except CassetteMiss as exc:
+                # Callers already treat connection errors as a failed backend / fetch
+                raise requests.ConnectionError(str(exc)) from exc
+            attrs["status"] = response.status_code
+            attrs["bytes"] = len(response.content)
+        self._count(host, "errors" if response.status_code >= 400 else None, size=len(response.content))
+        return response
+
+    def _get_once(self, host, url, params, headers, timeout, deadline=None) -> requests.Response:
+        started = time.monotonic()
+        if deadline is not None:
+            timeout = max(0.1, min(timeout, deadline - started))
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+        except requests.RequestException:
+            self._count(host, "errors", latency=time.monotonic() - started)
+            raise
+        self._count(
+            host,
+            "errors" if response.status_code >= 400 else None,
+            latency=time.monotonic() - started,
+            size=len(response.content),
+        )
+        return response
+
+    def _wait(self, retry_state: RetryCallState) -> float:
+        outcome = retry_state.outcome
+        if outcome is not None and not outcome.failed:
+            retry_after = self._parse_retry_after(outcome.result().headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+        return self._jitter(retry_state)
+
+    def _parse_retry_after(self, value: Optional[str]) -> Optional[float]:
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _count(self, host: str, counter: Optional[str], latency: float = 0.0, size: int = 0) -> None:
+        with self._lock:
+            counters = self._hosts.setdefault(
+                host, {"requests": 0, "errors": 0, "retries": 0, "bytes": 0, "latency": 0.0}
+            )
+            if counter != "retries":
+                counters["requests"] += 1
+                counters["latency"] += latency
+                counters["bytes"] += size
+            if counter:
+                counters[counter] += 1
+
+
+_default_transport: Optional[HttpTransport] = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> HttpTransport:
+    """Process-wide transport shared by search and fetch clients that are not given one."""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = HttpTransport()
+        return _default_transport
@@ -0,0 +1,108 @@
+"""Lightweight timing spans attributed to the reasoning step that caused them."""
+
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Attributes summed per span kind in summaries
+SUMMED_ATTRS = (
+    "bytes", "retries", "prompt_tokens", "completion_tokens", "cached_prompt_tokens",
+    "html_bytes", "markdown_chars", "waited",
+)
+
+_recorder: ContextVar[Optional["SpanRecorder"]] = ContextVar("span_recorder", default=None)
+
+
+class SpanRecorder:
+    """
+    Collects finished spans from the current context (and threads started with
+    :func:`propagate`). Spans are plain dicts: ``kind``, ``duration`` in seconds,
+    ``start`` relative to the recorder's creation, plus kind-specific attributes.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._spans: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._order = itertools.count()  # start order; rounded start times can tie
+
+    def add(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Return and forget the spans recorded since the last drain."""
+        with self._lock:
+            spans, self._spans = self._spans, []
+        spans.sort(key=lambda s: s.pop("_order"))
+        return spans
+
+
+@contextmanager
+def recording(recorder: SpanRecorder) -> Iterator[SpanRecorder]:
+    """Route spans created in this context to ``recorder``."""
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextmanager
+def span(kind: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a block. The yielded dict can be filled with attributes (bytes, tokens,
+    cache_hit, ...) before the block ends. A no-op when nothing is recording.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        yield attrs
+        return
+    order = next(recorder._order)
+    started = time.perf_counter()
+    try:
+        yield attrs
+    except BaseException as exc:
+        attrs.setdefault("error", type(exc).__name__)
+        raise
+    finally:
+        finished = time.perf_counter()
+        recorder.add({
+            "_order": order,
+            "kind": kind,
+            "start": round(started - recorder._origin, 4),
+            "duration": round(finished - started, 4),
+            **attrs,
+        })
+
+
+def propagate(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Bind ``fn`` to a copy of the current context so spans from worker threads are kept."""
+    ctx = copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
+
+
+def summarize_spans(spans: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-kind count, total duration, cache hits and summed numeric attributes."""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for s in spans:
+        entry = summary.setdefault(s["kind"], {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += s["duration"]
+        if s.get("cache_hit"):
+            entry["cache_hits"] = entry.get("cache_hits", 0) + 1
+        if "error" in s:
+            entry["errors"] = entry.get("errors", 0) + 1
+        for attr in SUMMED_ATTRS:
+            if isinstance(s.get(attr), (int, float)):
+                entry[attr] = entry.get(attr, 0) + s[attr]
+    for entry in summary.values():
+        for key, value in entry.items():
+            if isinstance(value, float):
+                entry[key] = round(value, 4)
+    return summary
@@ -2,16 +2,49 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import List, Dict, Optional, Iterator
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, List, Dict, Optional, Iterator, Tuple
+
+from .cache import DiskCache, make_cache_key
+from .cassette import Cassette
+from .instrumentation import span
 
 try:
-    from openai import OpenAI
+    from openai import AsyncOpenAI, BadRequestError, OpenAI
 except ImportError:  # pragma: no cover - optional dependency for testing
+    AsyncOpenAI = None
     OpenAI = None
+    BadRequestError = Exception
 
 logger = logging.getLogger(__name__)
 
+# Token usage of the most recent completion in the current thread / task
+_last_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("llm_last_usage", default=None)
+
+
+def extract_usage(usage: Any) -> Optional[Dict[str, int]]:
+    """
+    Normalise a response ``usage`` object to prompt/completion/cached token counts.
+
+    Servers report prompt-cache hits differently: OpenAI and vLLM use
+    ``prompt_tokens_details.cached_tokens``, DeepSeek uses ``prompt_cache_hit_tokens``.
+    """
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+        "cached_prompt_tokens": cached or 0,
+    }
+
 
 class LLMClient:
     """Thin wrapper around the OpenAI client for chat completions."""
@@ -25,8 +58,13 @@ class LLMClient:
         max_tokens: int = 2048,
         system_prompt: Optional[str] = None,
         streaming: bool = False,
+        stream_usage: bool = True,
+        max_concurrency: int = 32,
+        cache: Optional[DiskCache] = None,
+        cassette: Optional[Cassette] = None,
     ) -> None:
-        if not api_key:
+        replaying = cassette is not None and cassette.replaying
+        if not api_key and not replaying:
             raise ValueError("OPENAI_API_KEY is required to initialize LLMClient")
         if OpenAI is None:
             raise ImportError("openai package is required. Install with `pip install openai`." )
@@ -38,8 +76,28 @@ class LLMClient:
         self.max_tokens = max_tokens
         self.system_prompt = system_prompt or "You are a helpful AI assistant."
         self.streaming = streaming
+        # Ask for usage on streamed responses; turned off automatically when the server
+        # rejects ``stream_options``
+        self.stream_usage = stream_usage
+        self.max_concurrency = max(1, max_concurrency)
+        # Opt-in response cache. Only temperature-0 calls are cached, since those are
+        # the only ones a rerun is expected to reproduce.
+        self.cache = cache
+        # Optional: record every exchange, or serve them back without any network
+        self.cassette = cassette
+
+        self.client = OpenAI(api_key=self.api_key or "replay", base_url=self.base_url)
 
-        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # Cumulative token usage across all threads, for prompt-cache hit reporting
+        self._usage_lock = threading.Lock()
+        self._usage_totals = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0}
+
+        # Async client and in-flight cap are created lazily, one pair per event loop
+        # (connections and semaphores cannot be shared across loops). A single
+        # AsyncOpenAI instance owns one pooled HTTP client, so every coroutine on a
+        # loop reuses the same keep-alive connections.
+        self._async_lock = threading.Lock()
+        self._async_clients: Dict[asyncio.AbstractEventLoop, Tuple[Any, asyncio.Semaphore]] = {}
 
     def chat(
         self,
@@ -54,11 +112,108 @@ class LLMClient:
         tokens = max_tokens if max_tokens is not None else self.max_tokens
         sys_prompt = system_prompt or self.system_prompt
         use_stream = stream if stream is not None else self.streaming
+        _last_usage.set(None)
+
+        with span("llm", model=self.model, cache_hit=False) as attrs:
+            if self.cassette is not None and self.cassette.replaying:
+                recorded = self.cassette.replay("llm", self._cassette_key(messages, sys_prompt, temp, tokens))
+                return self._replayed(recorded, attrs)
+
+            started = time.monotonic()
+            cache_key = self._cache_key(messages, sys_prompt, temp, tokens)
+            content = self.cache.get(cache_key) if cache_key is not None else None
+            attrs["cache_hit"] = content is not None
+            if content is None:
+                if use_stream:
+                    content = self._chat_streaming(messages, sys_prompt, temp, tokens)
+                else:
+                    content = self._chat_regular(messages, sys_prompt, temp, tokens)
+                attrs.update(_last_usage.get() or {})
+                if cache_key is not None:
+                    self.cache.set(cache_key, content)
+            self._record_exchange(messages, sys_prompt, temp, tokens, content, started)
+        return content
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Hit/miss counters of the response cache, or None when caching is off."""
+        return self.cache.stats() if self.cache is not None else None
+
+    def last_usage(self) -> Optional[Dict[str, int]]:
+        """Token usage of the latest call made from this thread; None for cache hits or unreported usage."""
+        return _last_usage.get()
+
+    def usage_stats(self) -> Dict[str, Any]:
+        """Cumulative token usage, including how much of the prompt the server served from its cache."""
+        with self._usage_lock:
+            totals = dict(self._usage_totals)
+        prompt = totals["prompt_tokens"]
+        totals["cached_prompt_ratio"] = round(totals["cached_prompt_tokens"] / prompt, 3) if prompt else 0.0
+        return totals
+
+    def _cassette_key(self, messages: List[Dict[str, str]], sys_prompt: str, temp: float, tokens: int) -> str:
+        return Cassette.llm_key(self.model, sys_prompt, messages, temp, tokens)
+
+    def _record_exchange(
+        self,
+        messages: List[Dict[str, str]],
+        sys_prompt: str,
+        temp: float,
+        tokens: int,
+        content: str,
+        started: float,
+    ) -> None:
+        if self.cassette is None:
+            return
+        self.cassette.record(
+            "llm",
+            self._cassette_key(messages, sys_prompt, temp, tokens),
+            {"content": content, "usage": _last_usage.get()},
+            time.monotonic() - started,
+        )
+
+    def _replayed(self, recorded: Dict[str, Any], attrs: Dict[str, Any]) -> str:
+        """Restore usage accounting for a replayed exchange and return its content."""
+        usage = recorded.get("usage")
+        self._add_usage(usage)
+        attrs["replayed"] = True
+        attrs.update(usage or {})
+        return recorded["content"]
 
-        if use_stream:
-            return self._chat_streaming(messages, sys_prompt, temp, tokens)
-        else:
-            return self._chat_regular(messages, sys_prompt, temp, tokens)
+    def _record_usage(self, usage: Any) -> None:
+        self._add_usage(extract_usage(usage))
+
+    def _add_usage(self, data: Optional[Dict[str, int]]) -> None:
+        _last_usage.set(data)
+        if data is None:
+            return
+        with self._usage_lock:
+            self._usage_totals["requests"] += 1
+            for key, value in data.items():
+                self._usage_totals[key] += value
+
+    def _disable_stream_usage(self, exc: Exception) -> None:
+        """Stop sending ``stream_options`` if that is what the server rejected; re-raise otherwise."""
+        if "stream_options" not in str(exc) and "include_usage" not in str(exc):
+            raise exc
+        logger.warning(f"Server rejected stream_options, streaming without usage reporting: {exc}")
+        self.stream_usage = False
+
+    def _cache_key(
+        self,
+        messages: List[Dict[str, str]],
+        sys_prompt: str,
+        temp: float,
+        tokens: int,
+    ) -> Optional[str]:
+        if self.cache is None or temp != 0.0:
+            return None
+        return make_cache_key({
+            "model": self.model,
+            "system": sys_prompt,
+            "messages": messages,
+            "temperature": temp,
+            "max_tokens": tokens,
+        })
 
     def _chat_regular(
         self,
@@ -75,6 +230,7 @@ class LLMClient:
             messages=[{"role": "system", "content": sys_prompt}] + messages,
             stream=False,
         )
+        self._record_usage(getattr(response, "usage", None))
 
         content = response.choices[0].message.content
         if content is None:
@@ -89,19 +245,166 @@ class LLMClient:
         tokens: int,
     ) -> str:
         """Streaming chat completion - collects all chunks and returns full response."""
-        response_stream = self.client.chat.completions.create(
+        request = dict(
             model=self.model,
             temperature=temp,
             max_tokens=tokens,
             messages=[{"role": "system", "content": sys_prompt}] + messages,
             stream=True,
         )
+        response_stream = None
+        if self.stream_usage:
+            try:
+                response_stream = self.client.chat.completions.create(
+                    stream_options={"include_usage": True}, **request
+                )
+            except BadRequestError as exc:
+                self._disable_stream_usage(exc)
+        if response_stream is None:
+            response_stream = self.client.chat.completions.create(**request)
 
         full_response = ""
+        usage = None
         for chunk in response_stream:
+            # With include_usage the final chunk carries usage and no choices
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            content = chunk.choices[0].delta.content
+            if content:
+                full_response += content
+        self._record_usage(usage)
+
+        if not full_response:
+            raise ValueError("LLM streaming response was empty")
+        return full_response.strip()
+
+    # ------------------------------------------------------------------
+    # Async API
+    # ------------------------------------------------------------------
+    async def achat(
+        self,
+        messages: List[Dict[str, str]],
+        system_prompt: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        stream: Optional[bool] = None,
+    ) -> str:
+        """Async counterpart of :meth:`chat` with the same arguments and return contract.
+
+        At most ``max_concurrency`` requests are in flight at once per event loop;
+        further callers wait on the semaphore instead of opening new connections.
+        """
+        temp = temperature if temperature is not None else self.temperature
+        tokens = max_tokens if max_tokens is not None else self.max_tokens
+        sys_prompt = system_prompt or self.system_prompt
+        use_stream = stream if stream is not None else self.streaming
+        _last_usage.set(None)
+
+        with span("llm", model=self.model, cache_hit=False) as attrs:
+            if self.cassette is not None and self.cassette.replaying:
+                recorded = await self.cassette.areplay("llm", self._cassette_key(messages, sys_prompt, temp, tokens))
+                return self._replayed(recorded, attrs)
+
+            started = time.monotonic()
+            cache_key = self._cache_key(messages, sys_prompt, temp, tokens)
+            # DiskCache is synchronous SQLite (with a busy timeout); keep it off the loop
+            content = await asyncio.to_thread(self.cache.get, cache_key) if cache_key is not None else None
+            attrs["cache_hit"] = content is not None
+            if content is None:
+                client, semaphore = self._get_async_client()
+                async with semaphore:
+                    if use_stream:
+                        content = await self._achat_streaming(client, messages, sys_prompt, temp, tokens)
+                    else:
+                        content = await self._achat_regular(client, messages, sys_prompt, temp, tokens)
+                attrs.update(_last_usage.get() or {})
+                if cache_key is not None:
+                    await asyncio.to_thread(self.cache.set, cache_key, content)
+            self._record_exchange(messages, sys_prompt, temp, tokens, content, started)
+        return content
+
+    async def aclose(self) -> None:
+        """Close the pooled async HTTP connections of the running loop."""
+        with self._async_lock:
+            entry = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[0].close()
+
+    def _get_async_client(self):
+        if AsyncOpenAI is None:
+            raise ImportError("openai package is required. Install with `pip install openai`.")
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            # Clients of loops that have been closed can no longer be closed cleanly;
+            # dropping them lets their connections be released
+            for stale in [other for other in self._async_clients if other.is_closed()]:
+                del self._async_clients[stale]
+            if loop not in self._async_clients:
+                client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+                self._async_clients[loop] = (client, asyncio.Semaphore(self.max_concurrency))
+            return self._async_clients[loop]
+
+    async def _achat_regular(
+        self,
+        client,
+        messages: List[Dict[str, str]],
+        sys_prompt: str,
+        temp: float,
+        tokens: int,
+    ) -> str:
+        """Non-streaming async chat completion."""
+        response = await client.chat.completions.create(
+            model=self.model,
+            temperature=temp,
+            max_tokens=tokens,
+            messages=[{"role": "system", "content": sys_prompt}] + messages,
+            stream=False,
+        )
+        self._record_usage(getattr(response, "usage", None))
+
+        content = response.choices[0].message.content
+        if content is None:
+            raise ValueError("LLM response was empty")
+        return content.strip()
+
+    async def _achat_streaming(
+        self,
+        client,
+        messages: List[Dict[str, str]],
+        sys_prompt: str,
+        temp: float,
+        tokens: int,
+    ) -> str:
+        """Streaming async chat completion - collects all chunks and returns full response."""
+        request = dict(
+            model=self.model,
+            temperature=temp,
+            max_tokens=tokens,
+            messages=[{"role": "system", "content": sys_prompt}] + messages,
+            stream=True,
+        )
+        response_stream = None
+        if self.stream_usage:
+            try:
+                response_stream = await client.chat.completions.create(
+                    stream_options={"include_usage": True}, **request
+                )
+            except BadRequestError as exc:
+                self._disable_stream_usage(exc)
+        if response_stream is None:
+            response_stream = await client.chat.completions.create(**request)
+
+        full_response = ""
+        usage = None
+        async for chunk in response_stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
             content = chunk.choices[0].delta.content
             if content:
                 full_response += content
+        self._record_usage(usage)
 
         if not full_response:
             raise ValueError("LLM streaming response was empty")
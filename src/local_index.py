@@ -0,0 +1,201 @@
+"""Offline BM25 search over a local SQLite FTS5 index of Wikipedia paragraphs."""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import urllib.parse
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from .utils import STOPWORDS, WORD_RE, ensure_directory
+from .web_search import SearchResult
+from .wiki_fetcher import ArticleStructure, SectionNotFoundError
+
+logger = logging.getLogger(__name__)
+
+
+def iter_benchmark_paragraphs(benchmark_file: Union[str, Path]) -> Iterator[Tuple[str, str]]:
+    """Yield (title, text) for every supporting and distractor paragraph in a MuSiQue file."""
+    with open(str(benchmark_file), "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    for question in questions:
+        paragraphs = question.get("paragraphs") or []
+        if isinstance(paragraphs, str):  # some exports store the list as a JSON string
+            paragraphs = json.loads(paragraphs)
+        for para in paragraphs:
+            title = (para.get("title") or "").strip()
+            text = (para.get("paragraph_text") or "").strip()
+            if title and text:
+                yield title, text
+
+
+def iter_abstract_dump(dump_file: Union[str, Path]) -> Iterator[Tuple[str, str]]:
+    """Yield (title, abstract) from a Wikipedia ``*-abstract.xml`` dump, streaming."""
+    for _, elem in ET.iterparse(str(dump_file), events=("end",)):
+        if elem.tag != "doc":
+            continue
+        title = (elem.findtext("title") or "").strip()
+        if title.startswith("Wikipedia: "):
+            title = title[len("Wikipedia: "):]
+        abstract = (elem.findtext("abstract") or "").strip()
+        if title and abstract:
+            yield title, abstract
+        elem.clear()
+
+
+def build_local_index(
+    db_path: Union[str, Path],
+    benchmark_files: Iterable[Union[str, Path]] = (),
+    abstract_dump: Optional[Union[str, Path]] = None,
+) -> int:
+    """
+    (Re)build the FTS5 index at ``db_path`` and return the number of indexed passages.
+
+    Duplicate (title, text) pairs are indexed once; MuSiQue repeats the same
+    paragraphs across many questions.
+    """
+    db_path = Path(db_path)
+    ensure_directory(db_path.parent)
+    conn = sqlite3.connect(str(db_path))
+    conn.execute("DROP TABLE IF EXISTS passages")
+    conn.execute(
+        "CREATE VIRTUAL TABLE passages USING fts5(title, text, tokenize='porter unicode61')"
+    )
+
+    sources: List[Iterable[Tuple[str, str]]] = [iter_benchmark_paragraphs(f) for f in benchmark_files]
+    if abstract_dump:
+        sources.append(iter_abstract_dump(abstract_dump))
+
+    seen = set()
+    batch: List[Tuple[str, str]] = []
+    count = 0
+    for source in sources:
+        for title, text in source:
+            fingerprint = hash((title, text))
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            batch.append((title, text))
+            if len(batch) >= 5000:
+                conn.executemany("INSERT INTO passages (title, text) VALUES (?, ?)", batch)
+                count += len(batch)
+                batch = []
+    if batch:
+        conn.executemany("INSERT INTO passages (title, text) VALUES (?, ?)", batch)
+        count += len(batch)
+
+    conn.execute("INSERT INTO passages(passages) VALUES ('optimize')")
+    conn.commit()
+    conn.close()
+    logger.info(f"Indexed {count} passages into {db_path}")
+    return count
+
+
+class LocalIndexSearch:
+    """BM25 search over an index built by :func:`build_local_index`. No network, no rate limit."""
+
+    def __init__(self, db_path: Union[str, Path], title_weight: float = 5.0) -> None:
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"Local search index not found at {self.db_path}")
+        self.title_weight = title_weight
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False)
+
+    def search(self, query: str, max_results: int = 5) -> List[SearchResult]:
+        """Return at most one result per article title, best BM25 score first."""
+        match = self._to_match_expression(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, text FROM passages WHERE passages MATCH ? "
+                "ORDER BY bm25(passages, ?, 1.0) LIMIT ?",
+                (match, self.title_weight, max_results * 4),
+            ).fetchall()
+
+        results: List[SearchResult] = []
+        seen_titles = set()
+        for title, text in rows:
+            if title in seen_titles:
+                continue
+            seen_titles.add(title)
+            slug = urllib.parse.quote(title.replace(" ", "_"))
+            results.append(SearchResult(title=title, url=f"https://en.wikipedia.org/wiki/{slug}", snippet=text))
+            if len(results) >= max_results:
+                break
+        return results
+
+    def get_passages(self, title: str) -> List[str]:
+        """Return every indexed paragraph of the article titled ``title``, in index order."""
+        tokens = WORD_RE.findall(title.lower())
+        if not tokens:
+            return []
+        match = "title : (" + " ".join(f'"{t}"' for t in tokens) + ")"
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT title, text FROM passages WHERE passages MATCH ? ORDER BY rowid",
+                (match,),
+            ).fetchall()
+        wanted = _normalize_title(title)
+        return [text for row_title, text in rows if _normalize_title(row_title) == wanted]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _to_match_expression(self, query: str) -> str:
+        """OR together quoted query terms so punctuation never breaks FTS5 syntax."""
+        query = query.replace("site:wikipedia.org", " ")
+        tokens = [t for t in WORD_RE.findall(query.lower()) if t not in STOPWORDS]
+        return " OR ".join(f'"{t}"' for t in dict.fromkeys(tokens))
+
+
+class LocalArticleFetcher:
+    """
+    Article fetcher over the local index, used when ``SEARCH_OFFLINE`` is set.
+
+    The index only holds paragraphs, not whole pages, so an article's lead is its
+    indexed paragraphs and it has no further sections. Exposes the same methods
+    the engine and prefetcher use on :class:`WikipediaArticleFetcher`.
+    """
+
+    def __init__(self, index: LocalIndexSearch) -> None:
+        self.index = index
+
+    def get_article_structure(self, url: str) -> ArticleStructure:
+        title = self.canonical_title(url)
+        passages = self.index.get_passages(title)
+        if not passages:
+            message = f"Article '{title}' is not in the offline index."
+            return ArticleStructure(url, title, message, [], error=message)
+        return ArticleStructure(url=url, title=title, summary="\n\n".join(passages), sections=[])
+
+    def get_section_content(self, url: str, section_name: str, raise_errors: bool = False) -> str:
+        if section_name.lower().strip() in ["", "lead", "introduction", "summary", "intro", "0"]:
+            return self.get_article_structure(url).summary
+        message = (f"Section '{section_name}' not found. The offline index only holds each "
+                   f"article's lead paragraphs; read the 'lead' section instead.")
+        if raise_errors:
+            raise SectionNotFoundError(message)
+        return message
+
+    def cache_stats(self) -> dict:
+        return {}
+
+    def close(self) -> None:
+        """Nothing to release: the index is owned by the search client."""
+
+    def canonical_title(self, url: str) -> str:
+        slug = url.split("/wiki/")[-1] if "/wiki/" in url else url
+        return _normalize_title(urllib.parse.unquote(slug))
+
+
+def _normalize_title(title: str) -> str:
+    """MediaWiki titles ignore underscores vs spaces and the case of the first letter."""
+    title = title.replace("_", " ").strip()
+    return title[:1].upper() + title[1:]
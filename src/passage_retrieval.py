@@ -0,0 +1,83 @@
+"""Question-aware BM25 passage selection for long section reads."""
+
+from __future__ import annotations
+
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from .utils import chunk_text, content_terms
+
+
+@dataclass
+class Passage:
+    index: int  # position of the chunk in the section
+    start: int  # character offsets into the section text
+    end: int
+    score: float
+    text: str
+
+
+class PassageRetriever:
+    """
+    Splits a section with :func:`chunk_text` and ranks the chunks against a query
+    (question plus current sub-goal) with Okapi BM25, vectorized with NumPy.
+
+    Sections that already fit in ``top_k`` chunks are not worth retrieving from.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = 800,
+        overlap: int = 100,
+        top_k: int = 3,
+        k1: float = 1.5,
+        b: float = 0.75,
+    ) -> None:
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.top_k = top_k
+        self.k1 = k1
+        self.b = b
+
+    def needs_retrieval(self, text: str) -> bool:
+        return len(text) > self.chunk_size * self.top_k
+
+    def split(self, text: str) -> List[Passage]:
+        step = self.chunk_size - self.overlap
+        return [
+            Passage(index=i, start=i * step, end=i * step + len(chunk), score=0.0, text=chunk)
+            for i, chunk in enumerate(chunk_text(text, chunk_size=self.chunk_size, overlap=self.overlap))
+        ]
+
+    def retrieve(self, text: str, query: str) -> List[Passage]:
+        """Top ``top_k`` passages in document order; ties (and no overlap at all) favour earlier ones."""
+        passages = self.split(text)
+        if not passages:
+            return []
+        scores = self.score(query, [p.text for p in passages])
+        for passage, score in zip(passages, scores):
+            passage.score = round(score, 3)
+        best = sorted(passages, key=lambda p: (-p.score, p.index))[:self.top_k]
+        return sorted(best, key=lambda p: p.index)
+
+    def score(self, query: str, documents: List[str]) -> List[float]:
+        terms = sorted(set(content_terms(query)))
+        if not terms or not documents:
+            return [0.0] * len(documents)
+        counts = [Counter(content_terms(doc)) for doc in documents]
+        lengths = [sum(c.values()) for c in counts]
+        tf = [[c[t] for t in terms] for c in counts]
+        n = len(documents)
+        df = [sum(1 for row in tf if row[j]) for j in range(len(terms))]
+        idf = [math.log(1 + (n - d + 0.5) / (d + 0.5)) for d in df]
+        tf = np.asarray(tf, dtype=float)
+        lengths = np.asarray(lengths, dtype=float)
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        weights = tf * (self.k1 + 1) / (tf + norm[:, None])
+        return (weights @ np.asarray(idf, dtype=float)).tolist()
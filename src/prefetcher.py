@@ -0,0 +1,110 @@
+"""Speculative background prefetch of article structures for fresh search results."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from .wiki_fetcher import WikipediaArticleFetcher
+
+logger = logging.getLogger(__name__)
+
+
+class SearchPrefetcher:
+    """
+    Warms the fetcher cache with the top-k search results while the LLM is deciding.
+
+    After a search the agent almost always inspects one of the first results, so their
+    structures (ToC + lead) are fetched on a small thread pool in the meantime. When the
+    agent then inspects a URL, :meth:`claim` waits for the in-flight fetch instead of
+    starting a second one. Prefetches that ran but were never claimed before the next
+    search (or the end of the question) count as wasted; ones cancelled before they
+    started cost nothing and are only counted as cancelled. Once ``max_wasted`` is
+    reached prefetching is switched off for the rest of the question.
+    """
+
+    def __init__(
+        self,
+        fetcher: WikipediaArticleFetcher,
+        top_k: int = 2,
+        max_workers: int = 2,
+        max_wasted: int = 10,
+        claim_timeout: float = 30.0,
+    ) -> None:
+        self.fetcher = fetcher
+        self.top_k = top_k
+        self.max_wasted = max_wasted
+        self.claim_timeout = claim_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self.reset()
+
+    def reset(self) -> None:
+        """Start a new question: forget pending prefetches and zero the counters."""
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending = {}
+            self.issued = 0
+            self.hits = 0
+            self.misses = 0
+            self.wasted = 0
+            self.cancelled = 0
+
+    def schedule(self, urls: List[str]) -> None:
+        """Settle the previous batch and prefetch the first ``top_k`` URLs."""
+        self.settle()
+        with self._lock:
+            for url in urls[: self.top_k]:
+                if self.wasted >= self.max_wasted:
+                    logger.debug("Prefetch waste budget exhausted; skipping")
+                    return
+                if url in self._pending:
+                    continue
+                self._pending[url] = self._executor.submit(self._warm, url)
+                self.issued += 1
+
+    def claim(self, url: str) -> bool:
+        """Mark ``url`` as used, waiting for its prefetch if one is in flight."""
+        with self._lock:
+            future = self._pending.pop(url, None)
+            if future is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+        try:
+            future.result(timeout=self.claim_timeout)
+        except Exception as exc:
+            # The caller fetches the article itself; the prefetch only warms the cache
+            logger.debug(f"Prefetch of {url} did not complete: {exc}")
+        return True
+
+    def settle(self) -> None:
+        """Cancel unclaimed prefetches not yet started; the ones that already ran are wasted."""
+        with self._lock:
+            for future in self._pending.values():
+                if future.cancel():
+                    self.cancelled += 1
+                else:
+                    self.wasted += 1
+            self._pending = {}
+
+    def stats(self) -> Dict[str, Any]:
+        inspects = self.hits + self.misses
+        return {
+            "issued": self.issued,
+            "hits": self.hits,
+            "misses": self.misses,
+            "wasted": self.wasted,
+            "cancelled": self.cancelled,
+            "hit_rate": round(self.hits / inspects, 3) if inspects else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _warm(self, url: str) -> None:
+        self.fetcher.get_article_structure(url)
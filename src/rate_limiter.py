@@ -0,0 +1,172 @@
+"""Token-bucket rate limiting shared by search backends, the fetcher and eval workers."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+try:  # POSIX only; cross-process coordination is unavailable without it
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+from .instrumentation import span
+from .utils import ensure_directory
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Classic token bucket: ``rate`` tokens per second, holding at most ``burst`` tokens.
+
+    Safe to share between threads and asyncio tasks (the lock is only held while the
+    bucket is refilled, never while waiting). With ``state_file`` the bucket state lives
+    in a file guarded by ``flock`` so every process on the host draws from one bucket.
+    """
+
+    def __init__(self, rate: float, burst: int = 1, state_file: Optional[Union[str, Path]] = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.state_file = Path(state_file) if state_file and fcntl is not None else None
+        if state_file and fcntl is None:
+            logger.warning("fcntl unavailable; rate limiter state will not be shared across processes")
+        if self.state_file is not None:
+            ensure_directory(self.state_file.parent)
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated = time.time()
+        self.acquired = 0
+        self.waited = 0.0
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take ``tokens`` if available and return 0, otherwise return seconds to wait."""
+        with self._lock:
+            if self.state_file is None:
+                return self._take(tokens)
+            with open(self.state_file, "a+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    raw = f.read()
+                    if raw:
+                        state = json.loads(raw)
+                        self._tokens, self._updated = state["tokens"], state["updated"]
+                    else:
+                        self._tokens, self._updated = float(self.burst), time.time()
+                    wait = self._take(tokens)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps({"tokens": self._tokens, "updated": self._updated}))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            return wait
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until ``tokens`` are available; returns the time spent waiting."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                break
+            time.sleep(wait)
+        return self._record_wait(time.monotonic() - started)
+
+    async def aacquire(self, tokens: float = 1.0) -> float:
+        """Async variant of :meth:`acquire` that yields to the event loop while waiting."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        return self._record_wait(time.monotonic() - started)
+
+    def _take(self, tokens: float) -> float:
+        now = time.time()
+        self._tokens = min(self.burst, self._tokens + max(0.0, now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def _record_wait(self, waited: float) -> float:
+        with self._lock:
+            self.acquired += 1
+            self.waited += waited
+        return waited
+
+
+class RateLimiter:
+    """
+    One token bucket per backend, created on first use.
+
+    Rates are (requests per second, burst). Backends with generous quotas (the
+    Wikipedia APIs) get fast buckets, while scraping and paid APIs are kept slow.
+    Unknown names fall back to ``default``.
+    """
+
+    DEFAULT_RATES: Dict[str, Tuple[float, int]] = {
+        "google_cse": (1.0, 3),
+        "serpapi": (1.0, 3),
+        "wikipedia_rest": (5.0, 10),
+        "wikipedia_api": (5.0, 10),
+        "google_html": (0.5, 1),
+        "fetcher": (10.0, 20),
+    }
+
+    def __init__(
+        self,
+        rates: Optional[Dict[str, Tuple[float, int]]] = None,
+        default: Tuple[float, int] = (1.0, 1),
+        state_dir: Optional[Union[str, Path]] = None,
+    ) -> None:
+        self.rates = dict(self.DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self.default = default
+        self.state_dir = Path(state_dir) if state_dir else None
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    @classmethod
+    def parse_spec(cls, spec: str) -> Dict[str, Tuple[float, int]]:
+        """Parse ``"wikipedia_rest=5:10,fetcher=20"`` into ``{name: (rate, burst)}``."""
+        rates: Dict[str, Tuple[float, int]] = {}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            name, _, value = item.partition("=")
+            rate, _, burst = value.partition(":")
+            rates[name.strip()] = (float(rate), int(burst) if burst else 1)
+        return rates
+
+    def bucket(self, name: str) -> TokenBucket:
+        with self._lock:
+            if name not in self._buckets:
+                rate, burst = self.rates.get(name, self.default)
+                state_file = self.state_dir / f"{name}.bucket" if self.state_dir else None
+                self._buckets[name] = TokenBucket(rate, burst, state_file=state_file)
+            return self._buckets[name]
+
+    def acquire(self, name: str) -> float:
+        with span("rate_limit", bucket=name) as attrs:
+            attrs["waited"] = round(self.bucket(name).acquire(), 4)
+        return attrs["waited"]
+
+    async def aacquire(self, name: str) -> float:
+        return await self.bucket(name).aacquire()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = dict(self._buckets)
+        return {
+            name: {"acquired": b.acquired, "waited_seconds": round(b.waited, 3), "rate": b.rate, "burst": b.burst}
+            for name, b in buckets.items()
+        }
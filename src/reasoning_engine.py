@@ -3,26 +3,91 @@ from __future__ import annotations
 import logging
 import json
 import re
+import threading
 import time
 from typing import Dict, Any, List, Optional, Set
 
+from .cassette import CassetteMiss
 from .llm_client import LLMClient
 from .web_search import WikipediaSearchClient
-from .wiki_fetcher import WikipediaArticleFetcher
+from .wiki_fetcher import ArticleFetchError, SectionNotFoundError, WikipediaArticleFetcher
 from .research_tree import ResearchTree
 from .todo_manager import ResearchTodoManager
+from .prefetcher import SearchPrefetcher
+from .context_builder import ContextBuilder
+from .passage_retrieval import PassageRetriever
+from .history_digest import HistoryDigest
+from .instrumentation import SpanRecorder, recording, span, summarize_spans
 
 logger = logging.getLogger(__name__)
 
+# "classic": one user message per step, volatile plan/tree before the history.
+# "prefix_stable": goal and instructions, then the append-only action history as
+# assistant/user turns, with plan/tree last, so consecutive steps share a long prompt
+# prefix that servers with prefix caching (vLLM, DeepSeek, OpenAI) can reuse.
+PROMPT_LAYOUTS = ("classic", "prefix_stable")
+
+# Read-only tools whose observations are memoized per question; the others change state
+MEMOIZED_TOOLS = ("search_google", "inspect_article_structure", "read_section")
+LEAD_ALIASES = ("", "lead", "summary", "intro", "introduction", "lead section", "overview", "0")
+
+STEP_INSTRUCTIONS = """INSTRUCTIONS:
+1. REVIEW the "KNOWLEDGE GATHERED". If you already have the answer to a sub-question there, DO NOT SEARCH AGAIN.
+2. If the summary says a search failed, try a completely different query.
+3. If you inspect an article and the section you want isn't there, READ THE LEAD SECTION AGAIN or search for a new article.
+4. DO NOT LOOP. If you just did an action and it didn't help, trying it again won't help. Change strategy."""
+
 class ReasoningEngine:
-    def __init__(self, llm: LLMClient, searcher: WikipediaSearchClient, fetcher: WikipediaArticleFetcher):
+    def __init__(
+        self,
+        llm: LLMClient,
+        searcher: WikipediaSearchClient,
+        fetcher: WikipediaArticleFetcher,
+        prefetcher: Optional[SearchPrefetcher] = None,
+        prompt_layout: str = "classic",
+        context_builder: Optional[ContextBuilder] = None,
+        max_steps: int = 40,
+        max_tokens: int = 0,
+        max_seconds: float = 0.0,
+        memoize_tools: bool = True,
+        passage_retriever: Optional[PassageRetriever] = None,
+        toc_max_level: int = 2,
+        toc_max_entries: int = 60,
+        history_recent_steps: int = 6,
+    ):
+        if prompt_layout not in PROMPT_LAYOUTS:
+            raise ValueError(f"prompt_layout must be one of {PROMPT_LAYOUTS}, got {prompt_layout!r}")
         self.llm = llm
         self.searcher = searcher
         self.fetcher = fetcher
+        # Optional: warms article structures of top search results during the next LLM call
+        self.prefetcher = prefetcher
+        self.prompt_layout = prompt_layout
+        # Optional: fits plan, tree and history into a per-step token budget
+        self.context_builder = context_builder
         self.memory = ResearchTree()
         self.todo = ResearchTodoManager()
-        self.max_steps = 40
+        # Per-question budgets; once one runs out the engine synthesizes a final answer
+        # from what it has gathered. 0 disables the token / wall-clock budget.
+        self.max_steps = max_steps
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
         self.history_window = 15
+        # When > 0, replaces the fixed window: only the latest steps are sent in full and
+        # older ones are folded into a rolling digest (queries, articles, dead ends).
+        # Steps are folded in batches of this size so the prompt prefix stays put in between.
+        self.history_recent_steps = history_recent_steps
+        self.history_digest = HistoryDigest()
+        # Repeated searches / inspections / section reads are answered from a per-question
+        # memo (no network) with a note telling the model it already saw that observation
+        self.memoize_tools = memoize_tools
+        # Optional: long sections come back as the passages most relevant to the question
+        # and current sub-goal; read_section(full=true) still returns everything
+        self.passage_retriever = passage_retriever
+        # inspect shows the ToC down to this level (0 = all) and at most this many lines;
+        # deeper entries are collapsed into counts and opened with inspect(expand=...)
+        self.toc_max_level = toc_max_level
+        self.toc_max_entries = toc_max_entries
         
         # Session state
         self.current_question: str = ""
@@ -36,12 +101,22 @@ class ReasoningEngine:
         }
         self.last_search_results = []
         self.last_inspected_url = ""
+        self.final_answer: Optional[str] = None
         
         # State tracking for Anti-Looping
         self.last_action_hash = None
         self.loop_counter = 0
+        self.tool_memo: Dict[str, Dict[str, Any]] = {}
+        self.article_structures: Dict[str, Any] = {}
+        self.memo_stats: Dict[str, Any] = {}
 
-    def solve(self, question: str) -> Dict[str, Any]:
+    def solve(self, question: str, cancel_event: Optional[threading.Event] = None) -> Dict[str, Any]:
+        """Run the research loop for one question.
+
+        ``cancel_event`` allows a caller (e.g. the parallel evaluator) to stop the loop
+        cooperatively: it is checked before every step, so an in-flight LLM or tool call
+        finishes but no new step is started once the event is set.
+        """
         # Reset per-question state
         self.memory = ResearchTree()
         self.todo = ResearchTodoManager()
@@ -49,8 +124,15 @@ class ReasoningEngine:
         self.last_inspected_url = ""
         self.last_action_hash = None
         self.loop_counter = 0
+        self.tool_memo = {}
+        self.article_structures = {}
+        self.memo_stats = {"hits": 0, "saved_calls": {}}
+        self.history_digest = HistoryDigest()
+        self.final_answer = None
         self.current_question = question
         self.followup_flags = set()
+        if self.prefetcher is not None:
+            self.prefetcher.reset()
         
         self.memory.add_node("root", "Goal", question)
         self.todo.add_task(f"Decompose and answer: {question}", priority=10)
@@ -65,30 +147,86 @@ class ReasoningEngine:
         reasoning_trace = []
         current_step = 0
         final_answer = None
+        cancelled = False
+        stop_reason = None
+        llm_usage = {"prompt_tokens": 0, "completion_tokens": 0, "cached_prompt_tokens": 0}
+        tokens_used = 0
+        started = time.monotonic()
+        # Spans of LLM calls, tools, HTTP requests and conversions, drained into each step
+        recorder = SpanRecorder()
+        all_spans: List[Dict[str, Any]] = []
 
         print(f"\n{'='*60}")
         print(f"🚀 STARTING QUESTION: {question}")
         print(f"{'='*60}")
 
         while current_step < self.max_steps:
+            if cancel_event is not None and cancel_event.is_set():
+                print(f"\033[91m⏹ CANCELLED after {current_step} steps.\033[0m")
+                cancelled = True
+                stop_reason = "cancelled"
+                break
+            if self.max_tokens and tokens_used >= self.max_tokens:
+                stop_reason = "token_budget"
+                break
+            if self.max_seconds and time.monotonic() - started >= self.max_seconds:
+                stop_reason = "time_budget"
+                break
             current_step += 1
+            step_started = time.monotonic()
             
-            tree_snapshot = self.memory.get_tree_view(include_content=True)
             plan_snapshot = self.todo.get_plan_view()
+            if self.history_recent_steps:
+                self._fold_history(reasoning_trace)
+                history = reasoning_trace[self.history_digest.steps:]
+            # prefix_stable drops the oldest steps a whole window at a time, so the history
+            # grows at the end and its start only moves every ``history_window`` steps
+            elif self.prompt_layout == "prefix_stable":
+                window = self.history_window
+                history = reasoning_trace[max(0, (len(reasoning_trace) // window - 1) * window):]
+            else:
+                history = reasoning_trace[-self.history_window:]
+            digest = self.history_digest.render()
+            context_report = None
+            if self.context_builder is not None:
+                context = self.context_builder.build(
+                    question,
+                    plan_snapshot,
+                    self.memory,
+                    history,
+                    overhead_tokens=self._prompt_overhead_tokens(question),
+                    pending_tasks=[t.description for t in self.todo.tasks if t.status == "pending"],
+                    render_step=self._render_history_step,
+                )
+                tree_snapshot, plan_snapshot, history = context.tree, context.plan, context.history
+                context_report = context.report
+            else:
+                tree_snapshot = self.memory.get_tree_view(include_content=True)
             
-            prompt = self._build_step_prompt(
-                question, 
-                tree_snapshot, 
-                plan_snapshot, 
-                reasoning_trace[-self.history_window:]
-            )
+            if self.prompt_layout == "prefix_stable":
+                messages = self._build_step_messages(question, tree_snapshot, plan_snapshot, history, digest)
+            else:
+                prompt = self._build_step_prompt(
+                    question, 
+                    tree_snapshot, 
+                    plan_snapshot, 
+                    history,
+                    digest,
+                )
+                messages = [{"role": "user", "content": prompt}]
             
             # --- LLM CALL WITH RETRY ---
             response_text = ""
+            step_usage = None
             for attempt in range(3):
                 try:
-                    response_text = self.llm.chat([{"role": "user", "content": prompt}], temperature=0.0)
+                    with recording(recorder):
+                        response_text = self.llm.chat(messages, temperature=0.0)
+                    step_usage = self.llm.last_usage()
+                    tokens_used += self._count_call_tokens(messages, response_text, step_usage)
                     break
+                except CassetteMiss:
+                    raise  # replaying a stale cassette: retrying or skipping the step cannot help
                 except Exception as e:
                     if "429" in str(e) or "Rate limit" in str(e):
                         wait = 5 * (attempt + 1)
@@ -100,6 +238,7 @@ class ReasoningEngine:
                         break
             
             if not response_text:
+                all_spans.extend(recorder.drain())
                 continue
 
             action_data = self._parse_json_response(response_text)
@@ -120,15 +259,25 @@ class ReasoningEngine:
                 self.loop_counter = 0
                 self.last_action_hash = current_action_hash
 
-            # Si intenta lo mismo 2 veces seguidas, bloqueamos
-            if self.loop_counter >= 1:
+            # Read-only tools repeated anywhere in the question are served from the memo;
+            # any other action repeated twice in a row is blocked
+            memo_key = self._memo_key(tool, args) if self.memoize_tools else None
+            memo_entry = self.tool_memo.get(memo_key) if memo_key else None
+            if memo_entry is not None:
+                print(f"\033[93m♻️ REPEATED ACTION (step {memo_entry['step']}). Serving memoized result.\033[0m")
+                with recording(recorder), span("tool", tool=tool, cache_hit=True):
+                    tool_output = self._replay_memo(tool, memo_entry)
+            elif self.loop_counter >= 1:
                 print(f"\033[91m⛔ LOOP DETECTED ({self.loop_counter}). FORCING STOP.\033[0m")
                 tool_output = "SYSTEM ERROR: You are stuck in a loop repeating the EXACT same action. STOP. Do not inspect the same article again. Do not search the same query again. Try reading a specific section or searching for something else."
             
             else:
                 # --- TOOL EXECUTION ---
                 try:
-                    tool_output = self._execute_tool(tool, args)
+                    with recording(recorder), span("tool", tool=tool):
+                        tool_output = self._execute_tool(tool, args)
+                    if memo_key:
+                        self._remember(memo_key, tool, tool_output, current_step)
                 except Exception as e:
                     tool_output = f"❌ Execution Error: {e}"
                     logger.error(f"Tool error: {e}", exc_info=True)
@@ -142,26 +291,65 @@ class ReasoningEngine:
                 clean_out = tool_output.replace('\n', ' ')
                 print(f"Result: \033[92m{clean_out[:300]}\033[0m" + ("..." if len(clean_out)>300 else ""))
 
-            reasoning_trace.append({
+            step_record = {
                 "step": current_step, 
                 "thought": thought,
                 "tool": tool, 
                 "args": args,
                 "result": tool_output
-            })
+            }
+            spans = recorder.drain()
+            all_spans.extend(spans)
+            step_record["duration"] = round(time.monotonic() - step_started, 3)
+            step_record["timing"] = summarize_spans(spans)
+            step_record["spans"] = spans
+            if context_report is not None:
+                step_record["context"] = context_report
+            if step_usage:
+                step_record["usage"] = step_usage
+                for key in llm_usage:
+                    llm_usage[key] += step_usage.get(key, 0)
+            reasoning_trace.append(step_record)
 
-        return {
+            if tool == "answer_question" and self.final_answer:
+                final_answer = self.final_answer
+                stop_reason = "answered"
+                print(f"\033[92m🏁 ANSWERED after {current_step} steps: {final_answer}\033[0m")
+                break
+
+        if final_answer is None and not cancelled:
+            stop_reason = stop_reason or "step_budget"
+            print(f"\033[93m⌛ BUDGET EXHAUSTED ({stop_reason}). Synthesizing final answer.\033[0m")
+            with recording(recorder):
+                final_answer = self._synthesize_final_answer(question, reasoning_trace, stop_reason, current_step + 1)
+            all_spans.extend(recorder.drain())
+
+        result = {
             "final_answer": final_answer, 
+            "cancelled": cancelled,
+            "stop_reason": stop_reason,
+            "elapsed_seconds": round(time.monotonic() - started, 3),
             "trace": reasoning_trace,
             "tree_state": self.memory.to_json(),
-            "plan_state": self.todo.get_plan_view()
+            "plan_state": self.todo.get_plan_view(),
+            "llm_usage": llm_usage,
+            "timing_summary": summarize_spans(all_spans),
+            "memo_stats": self._memo_summary(),
         }
+        if self.history_recent_steps:
+            result["history_digest"] = self.history_digest.to_dict()
+        if self.prefetcher is not None:
+            self.prefetcher.settle()
+            result["prefetch_stats"] = self.prefetcher.stats()
+        return result
 
     def _execute_tool(self, tool, args) -> str:
         """Helper to keep main loop clean."""
         if tool == "search_google":
             results = self.searcher.search(args.get("query", ""))
             self.last_search_results = results
+            if self.prefetcher is not None:
+                self.prefetcher.schedule([r.url for r in results])
             if results:
                 formatted = ["SEARCH RESULTS (Metadata Only):"]
                 for i, r in enumerate(results, 1):
@@ -189,10 +377,20 @@ class ReasoningEngine:
             if not target_url: return "❌ Must provide either 'url' or 'result_id'"
             
             self.last_inspected_url = target_url
-            struct = self.fetcher.get_article_structure(target_url)
+            if self.prefetcher is not None:
+                self.prefetcher.claim(target_url)
+            struct = self._get_structure(target_url)
+            if struct.error:
+                return f"❌ Could not load article '{struct.title}': {struct.error}"
             
             formatted = [f"📄 ARTICLE: {struct.title}"]
             formatted.append(f"    URL: {target_url}")
+
+            # Infobox facts often answer a hop (born, founder, spouse...) without a section read
+            if struct.infobox:
+                formatted.append(f"\n🗂️ INFOBOX (Key Facts):")
+                for label, value in struct.infobox.items():
+                    formatted.append(f"  {label}: {value}")
             
             # Resumen con límite amplio
             summary_text = struct.summary
@@ -204,11 +402,13 @@ class ReasoningEngine:
             formatted.append(f"\n📑 TABLE OF CONTENTS (Sections):")
             if not struct.sections:
                 formatted.append("  (No specific sections found via API. The Lead Section contains the content.)")
+            elif struct.toc:
+                formatted.extend(self._render_toc(struct.toc, args.get("expand"), args.get("page")))
             else:
                 for i, sec in enumerate(struct.sections, 1):
                     formatted.append(f"  [{i}] {sec}")
                     
-            formatted.append("\n⚠️ ACTION REQUIRED: Select a section to read (use read_section).")
+            formatted.append("\n⚠️ ACTION REQUIRED: Select a section to read (use read_section with its heading or [number]).")
             return "\n".join(formatted)
 
         elif tool == "read_section":
@@ -217,15 +417,24 @@ class ReasoningEngine:
             
             if not url: return "❌ No article inspected. You must Inspect first."
             
-            lead_aliases = ["", "lead", "summary", "intro", "introduction", "lead section", "overview", "0"]
-            
-            if section_name.lower() in lead_aliases:
-                struct = self.fetcher.get_article_structure(url)
+            if section_name.lower() in LEAD_ALIASES:
+                struct = self._get_structure(url)
+                if struct.error:
+                    return f"❌ Could not load article '{struct.title}': {struct.error}"
                 return f"📖 LEAD SECTION CONTENT:\n{struct.summary}"
             else:
-                content = self.fetcher.get_section_content(url, section_name)
-                if "not found" in content.lower():
-                        return f"❌ {content} -> Please check the ToC list again exactly."
+                try:
+                    content = self.fetcher.get_section_content(url, section_name, raise_errors=True)
+                except SectionNotFoundError as e:
+                    return f"❌ {e} -> Please check the ToC list again exactly."
+                except ArticleFetchError as e:
+                    return f"❌ {e}"
+                if (
+                    self.passage_retriever is not None
+                    and not self._wants_full(args)
+                    and self.passage_retriever.needs_retrieval(content)
+                ):
+                    return self._format_passages(section_name, content, self._retrieval_query(args))
                 return f"📖 SECTION CONTENT ({section_name}):\n{content}"
 
         elif tool == "add_to_memory":
@@ -252,32 +461,213 @@ class ReasoningEngine:
             return "❌ Unknown action"
 
         elif tool == "answer_question":
-            final_answer = args.get("answer")
-            self.todo.complete_all(final_answer or "Answered")
+            final_answer = str(args.get("answer") or "").strip()
+            if not final_answer:
+                return "❌ Must provide a non-empty 'answer'."
+            self.final_answer = final_answer
+            self.todo.complete_all(final_answer)
             return f"✅ Final answer recorded: {final_answer}"
 
         return f"❌ Unknown tool: {tool}"
 
-    def _build_step_prompt(self, q, tree, plan, history: List[Dict]):
+    def _render_toc(self, toc, expand=None, page=None) -> List[str]:
+        """
+        Collapsed ToC: entries down to ``toc_max_level``, each with its size and a count
+        of hidden subsections. ``expand`` (a ToC number or heading) also shows that
+        section's whole subtree and its ancestors. Beyond ``toc_max_entries`` the ToC
+        is split into pages, selected with the 1-based ``page``.
+        """
+        expanded = None
+        if expand:
+            target = str(expand).strip().lower()
+            expanded = next((e for e in toc if e.number == target), None) or next(
+                (e for e in toc if target in e.line.lower()), None
+            )
+
+        def forced(entry) -> bool:
+            if expanded is None:
+                return False
+            return (
+                entry.number == expanded.number
+                or entry.number.startswith(expanded.number + ".")
+                or expanded.number.startswith(entry.number + ".")
+            )
+
+        visible = {
+            e.number for e in toc
+            if not self.toc_max_level or e.level <= self.toc_max_level or forced(e)
+        }
+        # Forced entries are always listed; the rest are paged in ToC order
+        paged = [e.number for e in toc if e.number in visible and not forced(e)]
+        try:
+            page = max(1, int(page or 1))
+        except (TypeError, ValueError):
+            page = 1
+        per_page = self.toc_max_entries or len(paged) or 1
+        pages = max(1, -(-len(paged) // per_page))
+        page = min(page, pages)
+        shown = set(paged[(page - 1) * per_page:page * per_page])
+
+        lines: List[str] = []
+        if expand and expanded is None:
+            lines.append(f"  (No section matches '{expand}'; use a number from the list below.)")
+        if page > 1:
+            lines.append(f"  (Page {page} of {pages}; earlier sections are on previous pages.)")
+        for entry in toc:
+            if entry.number not in visible or not (entry.number in shown or forced(entry)):
+                continue
+            details = []
+            if entry.size is not None:
+                details.append(f"~{entry.size / 1024:.1f} kB" if entry.size >= 1024 else f"{entry.size} B")
+            hidden = sum(1 for e in toc if e.number.startswith(entry.number + ".") and e.number not in visible)
+            if hidden:
+                details.append(f"+{hidden} subsections")
+            suffix = f" ({', '.join(details)})" if details else ""
+            lines.append(f"  {'  ' * (entry.level - 1)}[{entry.number}] {entry.line}{suffix}")
+
+        remaining = len(paged) - page * per_page
+        if remaining > 0:
+            lines.append(
+                f"  ... {remaining} more sections not listed. "
+                f"Show them with inspect_article_structure(..., page={page + 1})."
+            )
+        collapsed = len(toc) - len(visible)
+        if collapsed:
+            lines.append(
+                f"  ({collapsed} subsections collapsed. "
+                "Show a section's subsections with inspect_article_structure(..., expand=\"<number>\").)"
+            )
+        return lines
+
+    def _wants_full(self, args) -> bool:
+        return str(args.get("full", "")).strip().lower() in ("true", "1", "yes")
+
+    def _retrieval_query(self, args) -> str:
+        """Question, highest-priority pending task and an optional ``query`` argument."""
+        parts = [self.current_question]
+        task = self.todo.get_next_task()
+        if task is not None:
+            parts.append(task.description)
+        if args.get("query"):
+            parts.append(str(args["query"]))
+        return " ".join(parts)
+
+    def _format_passages(self, section_name: str, content: str, query: str) -> str:
+        passages = self.passage_retriever.retrieve(content, query)
+        total = len(self.passage_retriever.split(content))
+        formatted = [
+            f"📖 SECTION CONTENT ({section_name}): {len(passages)} most relevant of {total} passages "
+            f"({len(content)} chars). Call read_section with full=true for the whole section."
+        ]
+        for p in passages:
+            formatted.append(f"\n[chars {p.start}-{p.end}]\n{p.text}")
+        return "\n".join(formatted)
+
+    # ------------------------------------------------------------------
+    # Per-question tool memo
+    # ------------------------------------------------------------------
+    def _memo_key(self, tool, args) -> Optional[str]:
+        """Normalized (tool, args) signature, or None for tools / args that are not memoized."""
+        if tool not in MEMOIZED_TOOLS or not isinstance(args, dict):
+            return None
+        if tool == "search_google":
+            return f"search:{self.searcher.normalize_query(str(args.get('query', '')))}"
+        if tool == "inspect_article_structure":
+            url = args.get("url")
+            if args.get("result_id") is not None:
+                try:
+                    idx = int(args["result_id"]) - 1
+                except (TypeError, ValueError):
+                    return None
+                if not 0 <= idx < len(self.last_search_results):
+                    return None
+                url = self.last_search_results[idx].url
+            if not url:
+                return None
+            expand = str(args.get("expand") or "").strip().lower()
+            page = str(args.get("page") or "").strip()
+            return (
+                f"inspect:{self._article_id(url)}"
+                + (f"|{expand}" if expand else "")
+                + (f"|page={page}" if page not in ("", "1") else "")
+            )
+        url = args.get("url") or self.last_inspected_url
+        if not url:
+            return None
+        section = re.sub(r"\s+", " ", str(args.get("section_name", "")).strip().lower())
+        if section in LEAD_ALIASES:
+            section = "lead"
+        key = f"read:{self._article_id(url)}#{section}"
+        if self.passage_retriever is not None and section != "lead":
+            # Selected passages depend on the full flag and the retrieval query
+            if self._wants_full(args):
+                key += "|full"
+            else:
+                key += f"|{self.searcher.normalize_query(self._retrieval_query(args))}"
+        return key
+
+    def _article_id(self, url: str) -> str:
+        return self.fetcher.canonical_title(url) if self.fetcher is not None else url
+
+    def _remember(self, key: str, tool: str, output: str, step: int) -> None:
+        # Failed calls (bad arguments, fetch and API errors) come back as "❌" observations
+        # and may be transient; only memoize real observations
+        if output.startswith("❌"):
+            return
+        entry = {"step": step, "output": output}
+        if tool == "search_google":
+            entry["search_results"] = list(self.last_search_results)
+        elif tool == "inspect_article_structure":
+            entry["inspected_url"] = self.last_inspected_url
+        self.tool_memo[key] = entry
+
+    def _replay_memo(self, tool: str, entry: Dict[str, Any]) -> str:
+        """Restore the state the original call left behind and return its observation with a note."""
+        if "search_results" in entry:
+            # result_id in a following inspect refers to these results again
+            self.last_search_results = list(entry["search_results"])
+        if "inspected_url" in entry:
+            self.last_inspected_url = entry["inspected_url"]
+        self.memo_stats["hits"] += 1
+        saved = self.memo_stats["saved_calls"]
+        saved[tool] = saved.get(tool, 0) + 1
+        note = (
+            f"♻️ REPEATED ACTION: identical to step {entry['step']}. Same observation as before, "
+            "so it adds no new information. Use it, or change strategy."
+        )
+        return f"{note}\n{entry['output']}"
+
+    def _get_structure(self, url: str):
+        """Article structure, fetched at most once per question (inspect and lead reads share it)."""
+        key = self._article_id(url)
+        struct = self.article_structures.get(key)
+        if struct is None:
+            struct = self.fetcher.get_article_structure(url)
+            if not struct.error:
+                self.article_structures[key] = struct
+        return struct
+
+    def _memo_summary(self) -> Dict[str, Any]:
+        return {
+            "hits": self.memo_stats.get("hits", 0),
+            "saved_calls": dict(self.memo_stats.get("saved_calls", {})),
+            "entries": len(self.tool_memo),
+        }
+
+    def _fold_history(self, reasoning_trace: List[Dict]) -> None:
+        """Fold the oldest steps into the digest once more than twice ``history_recent_steps`` are unfolded."""
+        recent = self.history_recent_steps
+        folded = self.history_digest.steps
+        if len(reasoning_trace) - folded <= 2 * recent:
+            return
+        for step in reasoning_trace[folded:len(reasoning_trace) - recent]:
+            self.history_digest.add(step)
+
+    def _build_step_prompt(self, q, tree, plan, history: List[Dict], digest: str = ""):
         # Convertir historial a narrativa de texto
-        history_text_list = []
-        for h in history:
-            entry = f"Step {h['step']}: {h['thought']}\n"
-            args_str = ", ".join([f"{k}='{v}'" for k, v in h['args'].items() if k != 'content']) 
-            entry += f"Action: {h['tool']}({args_str})\n"
-            
-            # Truncado inteligente para el prompt
-            result_preview = str(h.get('result', ''))
-            if len(result_preview) > 1200: # Un poco más de contexto para ToCs largos
-                result_preview = result_preview[:1200] + "... [Content truncated for memory]"
-            entry += f"Observation: {result_preview}"
-            history_text_list.append(entry)
-            
+        history_text_list = [self._history_entry(h) for h in history]
         history_text = "\n\n".join(history_text_list) if history_text_list else "(No actions taken yet)"
-        if tree.startswith("KNOWLEDGE TREE"):
-            tree_view = tree.split("\n", 1)[1] if "\n" in tree else ""
-        else:
-            tree_view = tree
+        earlier = f"EARLIER STEPS (digest):\n{digest}\n\n" if digest else ""
 
         return f"""
 GOAL: {q}
@@ -285,21 +675,129 @@ GOAL: {q}
 {plan}
 
 *** KNOWLEDGE GATHERED SO FAR (Research Tree) ***
-{tree_view}
+{self._tree_view(tree)}
 *************************************************
 
-PAST ACTIONS (Last {len(history)} steps):
+{earlier}PAST ACTIONS (Last {len(history)} steps):
 {history_text}
 
-INSTRUCTIONS:
-1. REVIEW the "KNOWLEDGE GATHERED". If you already have the answer to a sub-question there, DO NOT SEARCH AGAIN.
-2. If the summary says a search failed, try a completely different query.
-3. If you inspect an article and the section you want isn't there, READ THE LEAD SECTION AGAIN or search for a new article.
-4. DO NOT LOOP. If you just did an action and it didn't help, trying it again won't help. Change strategy.
+{STEP_INSTRUCTIONS}
 
 Respond ONLY with JSON containing 'thought', 'tool', and 'args'.
 """
 
+    def _build_step_messages(self, q, tree, plan, history: List[Dict], digest: str = "") -> List[Dict[str, str]]:
+        """Prefix-stable layout: everything but the final state block is identical to the previous step's prompt."""
+        messages = [{
+            "role": "user",
+            "content": (
+                f"GOAL: {q}\n\n{STEP_INSTRUCTIONS}\n\n"
+                "After each action you receive its observation followed by the CURRENT STATE "
+                "(plan and knowledge tree).\n"
+                "Respond ONLY with JSON containing 'thought', 'tool', and 'args'."
+            ),
+        }]
+        if digest:
+            # Only changes when a batch of steps is folded
+            messages[0]["content"] += f"\n\nEARLIER STEPS (digest):\n{digest}"
+        for h in history:
+            messages.extend(self._history_messages(h))
+
+        state = f"""*** CURRENT STATE ***
+{plan}
+
+*** KNOWLEDGE GATHERED SO FAR (Research Tree) ***
+{self._tree_view(tree)}
+*************************************************
+
+Respond ONLY with JSON containing 'thought', 'tool', and 'args'."""
+        messages[-1] = {"role": "user", "content": messages[-1]["content"] + "\n\n" + state}
+        return messages
+
+    def _synthesize_final_answer(
+        self, question: str, reasoning_trace: List[Dict], reason: str, step: int
+    ) -> Optional[str]:
+        """One last tool-less LLM call that answers from the knowledge gathered so far."""
+        recent = "\n\n".join(
+            f"Step {h['step']}: {h['tool']}\nObservation: {self._result_preview(h)}" for h in reasoning_trace[-3:]
+        )
+        prompt = f"""The research budget is exhausted ({reason}). No more tools can be called.
+
+GOAL: {question}
+
+*** KNOWLEDGE GATHERED SO FAR (Research Tree) ***
+{self._tree_view(self.memory.get_tree_view(include_content=True))}
+*************************************************
+
+LAST OBSERVATIONS:
+{recent or "(No actions taken)"}
+
+Give your best final answer to the GOAL using only the knowledge above. Return ONLY the answer, no explanation."""
+        try:
+            answer = self.llm.chat([{"role": "user", "content": prompt}], temperature=0.0).strip()
+        except CassetteMiss:
+            raise
+        except Exception as e:
+            logger.error(f"Final synthesis failed: {e}")
+            return None
+        reasoning_trace.append({
+            "step": step,
+            "thought": f"Budget exhausted ({reason}); answering from gathered knowledge.",
+            "tool": "final_synthesis",
+            "args": {},
+            "result": answer,
+        })
+        self.todo.complete_all(answer or "Answered")
+        return answer or None
+
+    def _count_call_tokens(self, messages: List[Dict[str, str]], response_text: str, usage: Optional[Dict]) -> int:
+        """Tokens billed for one call; estimated at 4 characters per token when the server reports no usage."""
+        if usage:
+            return usage.get("prompt_tokens", 0) + usage.get("completion_tokens", 0)
+        return (sum(len(m["content"]) for m in messages) + len(response_text)) // 4
+
+    def _history_entry(self, h: Dict) -> str:
+        """One history step in the classic prompt."""
+        args_str = ", ".join([f"{k}='{v}'" for k, v in h['args'].items() if k != 'content'])
+        return (f"Step {h['step']}: {h['thought']}\n"
+                f"Action: {h['tool']}({args_str})\n"
+                f"Observation: {self._result_preview(h)}")
+
+    def _history_messages(self, h: Dict) -> List[Dict[str, str]]:
+        """One history step as the assistant/observation turn pair of the prefix-stable layout."""
+        action = {"thought": h["thought"], "tool": h["tool"], "args": h["args"]}
+        return [
+            {"role": "assistant", "content": json.dumps(action, ensure_ascii=False)},
+            {"role": "user", "content": f"Observation (step {h['step']}): {self._result_preview(h)}"},
+        ]
+
+    def _render_history_step(self, h: Dict) -> str:
+        """A history step exactly as the current prompt layout renders it, for token budgeting."""
+        if self.prompt_layout == "prefix_stable":
+            return "\n".join(m["content"] for m in self._history_messages(h))
+        return self._history_entry(h)
+
+    def _prompt_overhead_tokens(self, q: str) -> int:
+        """Tokens the step prompt costs before any plan, tree or history is added."""
+        digest = self.history_digest.render()
+        if self.prompt_layout == "prefix_stable":
+            text = "\n".join(m["content"] for m in self._build_step_messages(q, "", "", [], digest))
+        else:
+            text = self._build_step_prompt(q, "", "", [], digest)
+        return self.context_builder.tokenizer.count(text)
+
+    def _result_preview(self, h: Dict) -> str:
+        # Truncado inteligente para el prompt
+        result_preview = str(h.get('result', ''))
+        if len(result_preview) > 1200: # Un poco más de contexto para ToCs largos
+            result_preview = result_preview[:1200] + "... [Content truncated for memory]"
+        return result_preview
+
+    def _tree_view(self, tree: str) -> str:
+        if tree.startswith("KNOWLEDGE TREE"):
+            return tree.split("\n", 1)[1] if "\n" in tree else ""
+        return tree
+
     def _parse_json_response(self, text: str) -> Dict[str, Any]:
         match = re.search(r'```json\s*(.*?)\s*```', text, re.DOTALL)
         clean_text = match.group(1) if match else text
@@ -7,7 +7,7 @@ from __future__ import annotations
 import json
 import re
 from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 from uuid import uuid4
 
 
@@ -68,21 +68,17 @@ class ResearchTree:
         depth: int = 0,
         include_content: bool = False,
         max_content_chars: int = 180,
+        node_ids: Optional[Set[str]] = None,
     ) -> str:
         """
         Returns a text representation of the tree. When include_content is True, each node
         also includes a short snippet of the stored fact so the agent can reuse it later.
+        ``node_ids`` restricts the view to those nodes (callers include their ancestors).
         """
         if node is None:
             node = self.root
 
-        line = "  " * depth + f"- [{node.id}] {node.topic}"
-        if include_content and node.content:
-            snippet = re.sub(r"\s+", " ", node.content.strip())
-            if len(snippet) > max_content_chars:
-                snippet = snippet[:max_content_chars].rstrip() + "..."
-            if snippet:
-                line += f" → {snippet}"
+        line = "  " * depth + self.get_node_line(node, include_content, max_content_chars)
 
         if depth == 0:
             header = "KNOWLEDGE TREE (facts with short summaries):"
@@ -91,10 +87,23 @@ class ResearchTree:
             output = line
 
         for child in node.children:
-            output += "\n" + self.get_tree_view(child, depth + 1, include_content, max_content_chars)
+            if node_ids is not None and child.id not in node_ids:
+                continue
+            output += "\n" + self.get_tree_view(child, depth + 1, include_content, max_content_chars, node_ids)
 
         return output
 
+    def get_node_line(self, node: KnowledgeNode, include_content: bool = False, max_content_chars: int = 180) -> str:
+        """One node as shown in the tree view, without indentation."""
+        line = f"- [{node.id}] {node.topic}"
+        if include_content and node.content:
+            snippet = re.sub(r"\s+", " ", node.content.strip())
+            if len(snippet) > max_content_chars:
+                snippet = snippet[:max_content_chars].rstrip() + "..."
+            if snippet:
+                line += f" → {snippet}"
+        return line
+
     def get_node_content(self, node_id: str) -> str:
         """Allows the agent to 'Zoom In' on a specific memory bucket."""
         if node_id not in self.node_map:
@@ -1,11 +1,45 @@
 """Utility functions for the musique-solver project."""
 
 import os
+import re
 import json
 from typing import List, Union
 from datetime import datetime
 from pathlib import Path
 
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "for", "from", "in", "is",
+    "it", "of", "on", "or", "that", "the", "to", "was", "what", "when", "where", "which",
+    "who", "whom", "whose", "with",
+})
+
+
+def content_terms(text: str) -> List[str]:
+    """Lower-cased word tokens of ``text`` without stopwords and single characters, in order."""
+    return [t for t in WORD_RE.findall(text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+_PROMPT_SECTION_RE = re.compile(r"\{\{#(\w+)\}\}(.*?)\{\{/\1\}\}", re.DOTALL)
+_PROMPT_VALUE_RE = re.compile(r"\{\{(\w+)\}\}")
+
+
+def render_prompt(template: str, **values) -> str:
+    """Fill a prompt template from ``values``.
+
+    ``{{#flag}}...{{/flag}}`` is kept only when ``values[flag]`` is truthy and
+    ``{{name}}`` is replaced by ``values[name]``; lines emptied by a dropped
+    section are removed.
+    """
+    lines = []
+    for line in template.splitlines(keepends=True):
+        rendered = _PROMPT_SECTION_RE.sub(lambda m: m.group(2) if values[m.group(1)] else "", line)
+        rendered = _PROMPT_VALUE_RE.sub(lambda m: str(values[m.group(1)]), rendered)
+        if rendered.strip() or not line.strip():
+            lines.append(rendered)
+    return "".join(lines)
+
+
 def ensure_directory(path: Union[str, Path]) -> None:
     """Ensure that a directory exists, creating it if necessary."""
     # Convert Path to str to be safe across all python versions/OS
@@ -7,17 +7,26 @@ import re
 import textwrap
 import time
 import urllib.parse
-from dataclasses import dataclass
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
 from html import unescape
-from typing import Callable, List, Optional
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
 
-import requests
+from .cache import TieredCache
+from .http_transport import HttpTransport, get_default_transport
+from .rate_limiter import RateLimiter
+from .backend_health import BackendHealthTracker
+from .instrumentation import propagate, span
 
 try:  # Optional dependency for HTML scraping fallback
     from googlesearch import search as google_search
 except ImportError:  # pragma: no cover - fallback not available during tests
     google_search = None
 
+if TYPE_CHECKING:  # pragma: no cover
+    from .local_index import LocalIndexSearch
+
 logger = logging.getLogger(__name__)
 
 WIKIPEDIA_API_URL = "https://en.wikipedia.org/w/api.php"
@@ -27,6 +36,13 @@ SERP_API_URL = "https://serpapi.com/search"
 DEFAULT_HEADERS = {
     "User-Agent": "MusiqueSolver/0.2 (+https://github.com/musique-solver; contact: research@musique-solver.local)",
 }
+REQUEST_TIMEOUT = 20.0  # seconds per backend HTTP request, before the search deadline caps it
+# Any spelling of a Wikipedia site filter: "site:wikipedia.org", "Site:en.wikipedia.org", ...
+SITE_FILTER_RE = re.compile(r"\bsite:\S*wikipedia\.org\b", re.IGNORECASE)
+
+# Monotonic deadline of the search call running in this context; hedged backend
+# threads inherit it through ``propagate``.
+_search_deadline: ContextVar[Optional[float]] = ContextVar("search_deadline", default=None)
 
 
 @dataclass
@@ -38,6 +54,18 @@ class SearchResult:
     snippet: Optional[str] = None
 
 
+@dataclass
+class PageMetadata:
+    """Canonical page information resolved by a batched action=query lookup."""
+
+    requested_title: str
+    title: str
+    pageid: Optional[int] = None
+    extract: str = ""
+    redirected_from: Optional[str] = None
+    missing: bool = False
+
+
 class SearchError(Exception):
     """Custom exception for search errors."""
 
@@ -45,18 +73,66 @@ class SearchError(Exception):
 class WikipediaSearchClient:
     """Search client that ONLY returns Wikipedia metadata (title/url/snippet)."""
 
+    LOCAL_BACKENDS = frozenset({"_search_local_index"})
+    METADATA_BATCH_SIZE = 20
+    BACKEND_BUCKETS = {
+        "_search_google_custom": "google_cse",
+        "_search_serpapi": "serpapi",
+        "_search_wikipedia_rest": "wikipedia_rest",
+        "_search_wikipedia_api": "wikipedia_api",
+        "_search_html": "google_html",
+    }
+
     def __init__(
         self,
         api_key: Optional[str] = None,
         cse_id: Optional[str] = None,
         serpapi_key: Optional[str] = None,
         rate_limit: float = 1.0,
+        local_index: Optional["LocalIndexSearch"] = None,
+        offline: bool = False,
+        cache: Optional[TieredCache] = None,
+        cache_ttl: Optional[float] = 24 * 3600,
+        rate_limiter: Optional[RateLimiter] = None,
+        health: Optional[BackendHealthTracker] = None,
+        hedge_delay: Optional[float] = None,
+        search_deadline: Optional[float] = None,
+        transport: Optional[HttpTransport] = None,
+        hedge_workers: int = 8,
     ) -> None:
         self.api_key = api_key
         self.cse_id = cse_id
         self.serpapi_key = serpapi_key
         self.rate_limit = rate_limit
-        self._last_call: float = 0.0
+        # Pooled keep-alive transport with retry/backoff, shared with the article fetcher
+        self.transport = transport or get_default_transport()
+        # Per-backend token buckets. ``rate_limit`` (seconds between calls) only applies
+        # to the google scraping fallback, which is the backend that gets blocked.
+        if rate_limiter is None:
+            scrape_rate = (1.0 / rate_limit, 1) if rate_limit > 0 else (1000.0, 1000)
+            rate_limiter = RateLimiter(rates={"google_html": scrape_rate})
+        self.rate_limiter = rate_limiter
+        # Latency/error statistics drive backend ordering and circuit breaking
+        self.health = health or BackendHealthTracker()
+        # Local FTS5 index: tried first, never rate limited. offline=True disables
+        # every network backend.
+        self.local_index = local_index
+        self.offline = offline
+        if offline and local_index is None:
+            raise ValueError("offline search requires a local_index")
+        # Optional result cache keyed on the normalized query; a hit skips the
+        # rate-limit sleep and every backend.
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        # Hedged mode: after ``hedge_delay`` seconds without an answer the next backend
+        # is started in parallel (None = strictly sequential). ``search_deadline`` caps
+        # the total wall-clock time of one search call in both modes: every backend
+        # request gets the remaining time as its timeout. The hedge pool is shared by
+        # all threads using this client, so size ``hedge_workers`` for the number of
+        # concurrent searches (abandoned backends hold a thread until they time out).
+        self.hedge_delay = hedge_delay
+        self.search_deadline = search_deadline
+        self._executor = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="search-hedge")
 
     # ------------------------------------------------------------------
     # Public API
@@ -66,34 +142,184 @@ class WikipediaSearchClient:
         if not query:
             raise SearchError("Empty query provided to WikipediaSearchClient")
 
+        cache_key = None
+        if self.cache is not None:
+            cache_key = f"search:{self.normalize_query(query)}|{max_results}"
+            cached = self.cache.get(cache_key, max_age=self.cache_ttl)
+            if cached is not None:
+                with span("search", cache_hit=True, results=len(cached)):
+                    return [SearchResult(**item) for item in cached]
+
         filtered_query = self._apply_site_filter(query)
-        self._respect_rate_limit()
+        backends = self._ordered_backends()
+        deadline = time.monotonic() + self.search_deadline if self.search_deadline else None
 
-        backends = self._get_backends()
-        errors = []
-        for backend in backends:
-            try:
-                results = backend(filtered_query, max_results)
-                if results:
-                    # Ensure snippets are at most two lines to avoid flooding
-                    for result in results:
-                        if result.snippet:
-                            result.snippet = self._format_snippet(result.snippet)
-                    return results[:max_results]
-            except Exception as exc:  # pragma: no cover - network dependent
-                logger.warning(f"Search backend {backend.__name__} failed: {exc}")
-                errors.append(str(exc))
+        errors: List[str] = []
+        token = _search_deadline.set(deadline)
+        try:
+            if self.hedge_delay is not None and len(backends) > 1:
+                results = self._search_hedged(backends, filtered_query, max_results, deadline, errors)
+            else:
+                results = []
+                for backend in backends:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        errors.append("search deadline exceeded")
+                        break
+                    try:
+                        results = self._run_backend(backend, filtered_query, max_results)
+                    except Exception as exc:  # pragma: no cover - network dependent
+                        errors.append(str(exc))
+                        continue
+                    if results:
+                        break
+        finally:
+            _search_deadline.reset(token)
+
+        if results:
+            if cache_key is not None:
+                self.cache.set(cache_key, [asdict(r) for r in results])
+            return results
 
         raise SearchError(
             "All configured search backends failed. "
             + ("; ".join(errors) if errors else "No backend available.")
         )
 
+    def fetch_page_metadata(self, titles: List[str]) -> Dict[str, "PageMetadata"]:
+        """
+        Resolve intro extracts, canonical titles, redirects and page ids for many titles.
+
+        Titles are sent ``METADATA_BATCH_SIZE`` at a time as ``titles=A|B|C`` in a single
+        action=query request (TextExtracts returns at most 20 intro extracts per
+        request). Results are keyed by the title as requested; failed batches are
+        skipped, so callers must tolerate missing keys. With a search cache configured,
+        previously resolved titles are served from it.
+        """
+        wanted = list(dict.fromkeys(t for t in titles if t))
+        found: Dict[str, PageMetadata] = {}
+        if self.cache is not None:
+            for title in wanted:
+                cached = self.cache.get(f"meta:{title}", max_age=self.cache_ttl)
+                if cached is not None:
+                    found[title] = PageMetadata(**cached)
+        missing = [t for t in wanted if t not in found]
+
+        for start in range(0, len(missing), self.METADATA_BATCH_SIZE):
+            batch = missing[start:start + self.METADATA_BATCH_SIZE]
+            try:
+                resolved = self._query_page_metadata(batch)
+            except Exception as exc:  # pragma: no cover - network dependent
+                logger.warning(f"Metadata lookup failed for {len(batch)} titles: {exc}")
+                continue
+            for title, meta in resolved.items():
+                found[title] = meta
+                if self.cache is not None:
+                    self.cache.set(f"meta:{title}", asdict(meta))
+        return found
+
+    def backend_stats(self) -> dict:
+        """Live per-backend health (latency EWMA, error rate, circuit state) for monitoring."""
+        return self.health.snapshot()
+
+    def close(self) -> None:
+        """Release the hedge pool; requests that lost a hedged race are abandoned."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ------------------------------------------------------------------
+    # Backend execution
+    # ------------------------------------------------------------------
+    def _run_backend(
+        self,
+        backend: Callable[[str, int], List[SearchResult]],
+        query: str,
+        max_results: int,
+    ) -> List[SearchResult]:
+        """Call one backend with rate limiting and health accounting; returns formatted results."""
+        if backend.__name__ not in self.LOCAL_BACKENDS:
+            self._respect_rate_limit(backend.__name__)
+        started = time.monotonic()
+        with span("search", backend=backend.__name__, cache_hit=False) as attrs:
+            try:
+                results = backend(query, max_results)
+            except Exception as exc:
+                self.health.record(backend.__name__, time.monotonic() - started, ok=False)
+                logger.warning(f"Search backend {backend.__name__} failed: {exc}")
+                raise
+            attrs["results"] = len(results)
+        self.health.record(backend.__name__, time.monotonic() - started, ok=True, empty=not results)
+        # Ensure snippets are at most two lines to avoid flooding
+        for result in results:
+            if result.snippet:
+                result.snippet = self._format_snippet(result.snippet)
+        return results[:max_results]
+
+    def _search_hedged(
+        self,
+        backends: List[Callable[[str, int], List[SearchResult]]],
+        query: str,
+        max_results: int,
+        deadline: Optional[float],
+        errors: List[str],
+    ) -> List[SearchResult]:
+        """
+        Start the best backend, then fire the next one every ``hedge_delay`` seconds
+        (or immediately when one fails) until some backend returns results.
+
+        The first non-empty answer wins; backends not yet started are cancelled and
+        those still running are abandoned (their results are ignored).
+        """
+        queue = list(backends)
+        pending: Dict[Future, str] = {}
+
+        def launch() -> None:
+            backend = queue.pop(0)
+            pending[self._executor.submit(propagate(self._run_backend), backend, query, max_results)] = backend.__name__
+
+        launch()
+        try:
+            while pending or queue:
+                if not pending:
+                    launch()
+                timeout = self.hedge_delay if queue else None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        errors.append("search deadline exceeded")
+                        return []
+                    timeout = remaining if timeout is None else min(timeout, remaining)
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    if queue and (deadline is None or time.monotonic() < deadline):
+                        launch()  # hedge: the current backends are slow
+                    continue
+                for future in done:
+                    pending.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as exc:  # pragma: no cover - network dependent
+                        errors.append(str(exc))
+                        continue
+                    if results:
+                        return results
+            return []
+        finally:
+            for future in pending:
+                future.cancel()
+
     # ------------------------------------------------------------------
     # Backend selection
     # ------------------------------------------------------------------
+    def _ordered_backends(self) -> List[Callable[[str, int], List[SearchResult]]]:
+        """Configured backends minus open circuits, fastest healthy backend first."""
+        backends = {b.__name__: b for b in self._get_backends()}
+        return [backends[name] for name in self.health.order(list(backends))]
+
     def _get_backends(self) -> List[Callable[[str, int], List[SearchResult]]]:
         backends: List[Callable[[str, int], List[SearchResult]]] = []
+        if self.local_index is not None:
+            backends.append(self._search_local_index)
+        if self.offline:
+            return backends
         if self.api_key and self.cse_id:
             backends.append(self._search_google_custom)
         if self.serpapi_key:
@@ -108,6 +334,10 @@ class WikipediaSearchClient:
     # ------------------------------------------------------------------
     # Backend implementations
     # ------------------------------------------------------------------
+    def _search_local_index(self, query: str, max_results: int) -> List[SearchResult]:
+        """Offline BM25 search over the local FTS5 paragraph index."""
+        return self.local_index.search(self._strip_site_filter(query), max_results)
+
     def _search_google_custom(self, query: str, max_results: int) -> List[SearchResult]:
         params = {
             "key": self.api_key,
@@ -115,7 +345,7 @@ class WikipediaSearchClient:
             "q": query,
             "num": min(max_results, 10),
         }
-        response = requests.get(GOOGLE_CSE_URL, params=params, headers=DEFAULT_HEADERS, timeout=20)
+        response = self._backend_get(GOOGLE_CSE_URL, params)
         response.raise_for_status()
         data = response.json()
 
@@ -139,7 +369,7 @@ class WikipediaSearchClient:
             "api_key": self.serpapi_key,
             "num": min(max_results, 10),
         }
-        response = requests.get(SERP_API_URL, params=params, headers=DEFAULT_HEADERS, timeout=20)
+        response = self._backend_get(SERP_API_URL, params)
         response.raise_for_status()
         data = response.json()
 
@@ -163,12 +393,7 @@ class WikipediaSearchClient:
         stripped_query = self._strip_site_filter(query)
         params = {"q": stripped_query, "limit": max_results}
         
-        response = requests.get(
-            WIKIPEDIA_REST_SEARCH_URL, 
-            params=params, 
-            headers=DEFAULT_HEADERS, 
-            timeout=20
-        )
+        response = self._backend_get(WIKIPEDIA_REST_SEARCH_URL, params)
         response.raise_for_status()
         data = response.json()
         
@@ -194,7 +419,7 @@ class WikipediaSearchClient:
             "srlimit": max_results,
             "origin": "*",  # Allow CORS
         }
-        response = requests.get(WIKIPEDIA_API_URL, params=params, headers=DEFAULT_HEADERS, timeout=20)
+        response = self._backend_get(WIKIPEDIA_API_URL, params)
         response.raise_for_status()
         data = response.json()
 
@@ -211,48 +436,74 @@ class WikipediaSearchClient:
         if google_search is None:
             return []
 
-        results: List[SearchResult] = []
+        # Scraping errors (blocks, CAPTCHA pages) are not caught here: they must reach
+        # _run_backend so the health tracker counts them as failures.
+        # Try different parameter names for different googlesearch versions
         try:
-            # Try different parameter names for different googlesearch versions
+            generator = google_search(query, num_results=max_results, pause=2.0)
+        except TypeError:
             try:
-                generator = google_search(query, num_results=max_results, pause=2.0)
+                generator = google_search(query, stop=max_results, pause=2.0)
             except TypeError:
-                try:
-                    generator = google_search(query, stop=max_results, pause=2.0)
-                except TypeError:
-                    # Fallback to simple call
-                    generator = google_search(query)
-            
-            for url in generator:
-                if "wikipedia.org" not in url:
-                    continue
-                title = self._extract_title_from_url(url)
-                snippet = self._fetch_extract(title)
-                results.append(SearchResult(title=title, url=url, snippet=snippet))
-                if len(results) >= max_results:
-                    break
-        except Exception as exc:
-            logger.warning(f"HTML search fallback failed: {exc}")
+                # Fallback to simple call
+                generator = google_search(query)
+        
+        urls: List[str] = []
+        for url in generator:
+            if "wikipedia.org" not in url:
+                continue
+            urls.append(url)
+            if len(urls) >= max_results:
+                break
+
+        # One batched action=query request for every snippet instead of one per result
+        titles = [self._extract_title_from_url(url) for url in urls]
+        metadata = self.fetch_page_metadata(titles)
+        results: List[SearchResult] = []
+        for url, title in zip(urls, titles):
+            meta = metadata.get(title)
+            results.append(SearchResult(
+                title=meta.title if meta and not meta.missing else title,
+                url=url,
+                snippet=self._format_snippet(meta.extract) if meta else "",
+            ))
         return results
 
     # ------------------------------------------------------------------
     # Helpers
     # ------------------------------------------------------------------
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        """Canonical form used as cache key: no site filter, case-folded, single-spaced.
+
+        Punctuation is kept: it can carry meaning ("C++" vs "C#", quoted phrases).
+        """
+        query = SITE_FILTER_RE.sub(" ", query)
+        return re.sub(r"\s+", " ", query.casefold()).strip()
+
     def _apply_site_filter(self, query: str) -> str:
         query = query.strip()
-        if "site:wikipedia.org" not in query:
+        if not SITE_FILTER_RE.search(query):
             query = f"site:wikipedia.org {query}"
         return query
 
     def _strip_site_filter(self, query: str) -> str:
-        return query.replace("site:wikipedia.org", "").strip()
+        return re.sub(r"\s+", " ", SITE_FILTER_RE.sub(" ", query)).strip()
+
+    def _backend_get(self, url: str, params: dict):
+        """
+        GET for a search backend, bounded by the current search call's deadline.
 
-    def _respect_rate_limit(self) -> None:
-        now = time.time()
-        elapsed = now - self._last_call
-        if elapsed < self.rate_limit:
-            time.sleep(self.rate_limit - elapsed)
-        self._last_call = time.time()
+        Timeouts are not retried: the next backend is a better bet than waiting on a
+        hung one again. Other retries stop at the deadline.
+        """
+        return self.transport.get(url, params=params, headers=DEFAULT_HEADERS, timeout=REQUEST_TIMEOUT,
+                                  retry_timeouts=False, deadline=_search_deadline.get())
+
+    def _respect_rate_limit(self, backend_name: str) -> None:
+        """Wait for a token from the bucket of the given backend."""
+        bucket = self.BACKEND_BUCKETS.get(backend_name, backend_name)
+        self.rate_limiter.acquire(bucket)
 
     def _build_wikipedia_url(self, title: str) -> str:
         slug = title.replace(" ", "_")
@@ -264,29 +515,52 @@ class WikipediaSearchClient:
             return urllib.parse.unquote(slug.replace("_", " "))
         return "Wikipedia Article"
 
-    def _fetch_extract(self, title: str) -> str:
-        if not title:
-            return ""
+    def _query_page_metadata(self, titles: List[str]) -> Dict[str, "PageMetadata"]:
         params = {
             "action": "query",
-            "prop": "extracts",
+            "prop": "extracts|info",
             "exintro": 1,
             "explaintext": 1,
-            "titles": title,
+            "exlimit": "max",
+            "redirects": 1,
+            "titles": "|".join(titles),
             "format": "json",
+            "formatversion": 2,
             "origin": "*",
         }
-        try:
-            response = requests.get(WIKIPEDIA_API_URL, params=params, headers=DEFAULT_HEADERS, timeout=20)
+        pages: Dict[str, dict] = {}
+        normalized: Dict[str, str] = {}
+        redirects: Dict[str, str] = {}
+        while True:  # follow "continue" in case extracts are split across responses
+            self._respect_rate_limit("_search_wikipedia_api")
+            response = self._backend_get(WIKIPEDIA_API_URL, params)
             response.raise_for_status()
             data = response.json()
-            pages = data.get("query", {}).get("pages", {})
-            if not pages:
-                return ""
-            extract = next(iter(pages.values())).get("extract", "")
-            return self._format_snippet(extract)
-        except Exception:
-            return ""
+            query = data.get("query", {})
+            normalized.update({n["from"]: n["to"] for n in query.get("normalized", [])})
+            redirects.update({r["from"]: r["to"] for r in query.get("redirects", [])})
+            for page in query.get("pages", []):
+                merged = pages.setdefault(page["title"], {})
+                merged.update({k: v for k, v in page.items() if v not in (None, "")})
+            if "continue" not in data:
+                break
+            params = {**params, **data["continue"]}
+
+        result: Dict[str, PageMetadata] = {}
+        for requested in titles:
+            title = normalized.get(requested, requested)
+            redirected_from = title if title in redirects else None
+            title = redirects.get(title, title)
+            page = pages.get(title, {})
+            result[requested] = PageMetadata(
+                requested_title=requested,
+                title=page.get("title", title),
+                pageid=page.get("pageid"),
+                extract=page.get("extract", ""),
+                redirected_from=redirected_from,
+                missing=bool(page.get("missing", not page)),
+            )
+        return result
 
     def _format_snippet(self, raw_text: str) -> str:
         if not raw_text:
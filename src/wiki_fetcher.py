@@ -3,111 +3,134 @@
 from __future__ import annotations
 
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional, Dict
+from urllib.parse import unquote
+from concurrent.futures import Executor
 import requests
-import html2text
+from bs4 import BeautifulSoup
+
+from .cache import TieredCache
+from .rate_limiter import RateLimiter
+from .http_transport import HttpTransport, get_default_transport
+from .html_markdown import CONVERTERS, convert_html, extract_infobox
+from .instrumentation import span
 
 logger = logging.getLogger(__name__)
 
+@dataclass
+class TocEntry:
+    line: str  # Section heading
+    number: str  # Hierarchical ToC number, e.g. "2.1"
+    level: int  # ToC depth: 1 for top-level sections
+    size: Optional[int] = None  # Wikitext bytes including subsections; None if unknown
+
 @dataclass
 class ArticleStructure:
     url: str
     title: str
     summary: str  # Lead section converted to Markdown
     sections: List[str]  # List of section headings (Table of Contents)
+    infobox: Dict[str, str] = field(default_factory=dict)  # Infobox label -> value
+    toc: List[TocEntry] = field(default_factory=list)  # sections with hierarchy and sizes
+    error: Optional[str] = None  # set (and echoed in summary) when the article could not be fetched
+
+class ArticleFetchError(Exception):
+    """Raised when the MediaWiki API cannot provide an article."""
+
+
+class SectionNotFoundError(ArticleFetchError):
+    """Raised (with ``raise_errors=True``) when no section of the article matches the request."""
+
 
 class WikipediaArticleFetcher:
     """Fetches Wikipedia articles using the stable MediaWiki API."""
 
-    def __init__(self, session: Optional[requests.Session] = None):
-        self.session = session or requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'MusiqueSolver/0.3 (Research Agent; contact: research@musique-solver.local)'
-        })
+    FETCH_MODES = ("section", "full")
+
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        cache: Optional[TieredCache] = None,
+        cache_ttl: Optional[float] = 7 * 24 * 3600,
+        fetch_mode: str = "section",
+        rate_limiter: Optional[RateLimiter] = None,
+        transport: Optional[HttpTransport] = None,
+        converter: str = "html2text",
+        conversion_pool: Optional[Executor] = None,
+    ):
+        if fetch_mode not in self.FETCH_MODES:
+            raise ValueError(f"fetch_mode must be one of {self.FETCH_MODES}, got {fetch_mode!r}")
+        if converter not in CONVERTERS:
+            raise ValueError(f"converter must be one of {CONVERTERS}, got {converter!r}")
+        # Requests go through the shared pooled transport (keep-alive, retries, per-host
+        # counters) unless an explicit session is injected.
+        self.session = session
+        if self.session is not None:
+            self.session.headers.update({
+                'User-Agent': 'MusiqueSolver/0.3 (Research Agent; contact: research@musique-solver.local)'
+            })
+        self.transport = transport or get_default_transport()
+        # "html2text" converts the raw parser output; "lxml" strips references, navboxes,
+        # hatnotes and edit links first and is several times faster. An optional
+        # (process) pool moves conversion off the calling thread.
+        self.converter = converter
+        self.conversion_pool = conversion_pool
         self.api_url = "https://en.wikipedia.org/w/api.php"
-        self._cache: Dict[str, dict] = {} # Simple cache for section maps
+        # Two-tier cache (memory LRU + optional disk). Article and section entries are
+        # keyed by canonical title and revision id, so they never go stale; only the
+        # title -> revision alias expires after ``cache_ttl`` seconds (None = pin forever).
+        self.cache = cache or TieredCache()
+        self.cache_ttl = cache_ttl
+        # "section": ToC + lead up front, one request per section read afterwards.
+        # "full": a single request for the whole parsed article, split locally so every
+        # later get_section_content call is served from the cache.
+        self.fetch_mode = fetch_mode
+        # Optional shared limiter; every API request takes a token from its "fetcher" bucket
+        self.rate_limiter = rate_limiter
 
     def get_article_structure(self, url: str) -> ArticleStructure:
         """
         Returns the 'Skeleton' of the article: Title, Summary (Lead), and TOC.
-        Uses action=parse&prop=sections|text&section=0
+        Uses action=parse&prop=sections|revid, then prop=text&section=0 for the lead.
         """
         title_slug = self._extract_title_slug(url)
         
         try:
-            # 1. Fetch Sections (ToC)
-            # We use prop=sections despite deprecation warning because it returns 
-            # a flat list with indexes, which is perfect for programmatic access.
-            params = {
-                "action": "parse",
-                "page": title_slug,
-                "prop": "sections",
-                "format": "json",
-                "redirects": 1,
-                "origin": "*"
-            }
-            resp = self.session.get(self.api_url, params=params, timeout=10)
-            
-            # Handle graceful failures if API fails
-            if resp.status_code != 200:
-                logger.error(f"API returned {resp.status_code}")
-                return ArticleStructure(url, title_slug, "Error fetching article structure.", [])
-
-            data = resp.json()
-            
-            if "error" in data:
-                logger.error(f"API Error for {url}: {data['error']}")
-                return ArticleStructure(url, title_slug, f"API Error: {data['error'].get('info', 'Unknown')}", [])
-
-            parse_data = data.get("parse", {})
-            real_title = parse_data.get("title", title_slug.replace("_", " "))
-            
-            # Extract section names
-            sections_data = parse_data.get("sections", [])
-            sections = [s['line'] for s in sections_data]
-            
-            # Cache the section map for later use in get_section_content
-            self._cache[url] = sections_data
-
-            # 2. Fetch Lead Section (Section 0)
-            params_lead = {
-                "action": "parse",
-                "page": title_slug,
-                "prop": "text",
-                "section": 0,
-                "format": "json",
-                "redirects": 1,
-                "origin": "*"
-            }
-            resp_lead = self.session.get(self.api_url, params=params_lead, timeout=10)
-            lead_html = resp_lead.json().get("parse", {}).get("text", {}).get("*", "")
-            
-            summary_text = self._html_to_markdown(lead_html)
-
-            return ArticleStructure(
-                url=url, 
-                title=real_title, 
-                summary=summary_text, 
-                sections=sections
-            )
-
+            record = self._get_article_record(title_slug)
+        except ArticleFetchError as e:
+            return ArticleStructure(url, title_slug, str(e), [], error=str(e))
         except Exception as e:
             logger.error(f"Failed to fetch structure for {url}: {e}")
-            return ArticleStructure(url, title_slug, f"Error: {str(e)}", [])
+            return ArticleStructure(url, title_slug, f"Error: {str(e)}", [], error=str(e))
 
-    def get_section_content(self, url: str, section_name: str) -> str:
+        return ArticleStructure(
+            url=url, 
+            title=record["title"], 
+            summary=record["summary"], 
+            sections=[s['line'] for s in record["sections"]],
+            infobox=record.get("infobox", {}),  # records cached before infoboxes were kept lack it
+            toc=self._toc_entries(record["sections"]),
+        )
+
+    def get_section_content(self, url: str, section_name: str, raise_errors: bool = False) -> str:
         """
         Returns the full text of a specific section by mapping name to index.
+
+        Failures come back as a message string, or with ``raise_errors=True`` as
+        :class:`ArticleFetchError` (:class:`SectionNotFoundError` for an unknown section).
         """
         title_slug = self._extract_title_slug(url)
         
-        # Ensure we have the section map
-        if url not in self._cache:
-            # Refresh structure to populate cache
-            self.get_article_structure(url)
+        try:
+            record = self._get_article_record(title_slug)
+        except Exception as e:
+            logger.error(f"Failed to fetch structure for {url}: {e}")
+            if raise_errors:
+                raise ArticleFetchError(f"Error fetching article: {e}") from e
+            record = {"title": title_slug, "revid": 0, "sections": [], "summary": ""}
             
-        sections_data = self._cache.get(url, [])
+        sections_data = record["sections"]
         
         # Fuzzy match for section index
         target_index = None
@@ -115,10 +138,13 @@ class WikipediaArticleFetcher:
         
         # 1. Check for Lead/Intro requests
         if normalized_target in ["", "lead", "introduction", "summary", "intro", "0"]:
-            target_index = 0
+            return record["summary"]
         else:
-            # 2. Match against TOC
-            for sec in sections_data:
+            # 2. Exact ToC number ("2.1"), as shown by the hierarchical ToC
+            numbered = {sec.get("number"): sec['index'] for sec in sections_data if sec.get("number")}
+            target_index = numbered.get(normalized_target)
+            # 3. Match against TOC
+            for sec in sections_data if target_index is None else []:
                 # Clean HTML tags from section line just in case (API usually sends clean text in 'line')
                 sec_line = sec['line'].lower()
                 # Remove common HTML entities if present
@@ -130,29 +156,238 @@ class WikipediaArticleFetcher:
         
         if target_index is None:
             available = [s['line'] for s in sections_data[:5]] # Show first 5 suggestions
-            return f"Section '{section_name}' not found. Available sections: {available}..."
+            message = f"Section '{section_name}' not found. Available sections: {available}..."
+            if raise_errors:
+                raise SectionNotFoundError(message)
+            return message
 
-        try:
-            params = {
-                "action": "parse",
-                "page": title_slug,
-                "prop": "text",
-                "section": target_index,
-                "format": "json",
-                "redirects": 1,
-                "origin": "*"
-            }
-            resp = self.session.get(self.api_url, params=params, timeout=10)
-            html_content = resp.json().get("parse", {}).get("text", {}).get("*", "")
-            
-            if not html_content:
-                return f"Section '{section_name}' returned empty content."
+        section_key = f"section:{record['title']}@{record['revid']}:{target_index}"
+        with span("section", title=record["title"], index=target_index) as attrs:
+            cached = self.cache.get(section_key)
+            attrs["cache_hit"] = cached is not None
+            if cached is not None:
+                return cached
+
+            try:
+                html_content = self._fetch_section_html(title_slug, record["revid"], target_index)
                 
-            return self._html_to_markdown(html_content)
-            
-        except Exception as e:
-            logger.error(f"Failed to fetch section {section_name}: {e}")
-            return f"Error fetching section: {e}"
+                if not html_content:
+                    raise ArticleFetchError(f"Section '{section_name}' returned empty content.")
+                    
+                markdown = self._html_to_markdown(html_content)
+                self.cache.set(section_key, markdown)
+                return markdown
+                
+            except ArticleFetchError as e:
+                if raise_errors:
+                    raise
+                return str(e)
+            except Exception as e:
+                logger.error(f"Failed to fetch section {section_name}: {e}")
+                if raise_errors:
+                    raise ArticleFetchError(f"Error fetching section: {e}") from e
+                return f"Error fetching section: {e}"
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
+
+    def close(self) -> None:
+        """Shut down the HTML conversion pool, if any."""
+        if self.conversion_pool is not None:
+            self.conversion_pool.shutdown(wait=True, cancel_futures=True)
+
+    def canonical_title(self, url: str) -> str:
+        """Title used to recognise two URLs (or slugs) for the same article."""
+        return self._normalize_title(self._extract_title_slug(url))
+
+    # ------------------------------------------------------------------
+    # Cached article records
+    # ------------------------------------------------------------------
+    def _get_article_record(self, title_slug: str) -> dict:
+        """Return {title, revid, sections, summary, infobox} for a page, from cache when possible."""
+        alias_key = f"alias:{self._normalize_title(title_slug)}"
+        with span("article", title=title_slug) as attrs:
+            alias = self.cache.get(alias_key, max_age=self.cache_ttl)
+            if alias is not None:
+                record = self.cache.get(self._article_key(alias["title"], alias["revid"]))
+                if record is not None:
+                    attrs["cache_hit"] = True
+                    return record
+            attrs["cache_hit"] = False
+            record = self._fetch_article_record(title_slug)
+        self.cache.set(self._article_key(record["title"], record["revid"]), record)
+        pointer = {"title": record["title"], "revid": record["revid"]}
+        self.cache.set(alias_key, pointer)
+        # Redirect targets share the same record
+        self.cache.set(f"alias:{self._normalize_title(record['title'])}", pointer)
+        return record
+
+    def _fetch_article_record(self, title_slug: str) -> dict:
+        if self.fetch_mode == "full":
+            return self._fetch_full_article_record(title_slug)
+
+        # 1. Fetch Sections (ToC)
+        # We use prop=sections despite deprecation warning because it returns 
+        # a flat list with indexes, which is perfect for programmatic access.
+        params = {
+            "action": "parse",
+            "page": title_slug,
+            "prop": "sections|revid",
+            "format": "json",
+            "redirects": 1,
+            "origin": "*"
+        }
+        parse_data = self._request_parse(title_slug, params)
+        real_title = parse_data.get("title", title_slug.replace("_", " "))
+        revid = parse_data.get("revid", 0)
+        sections_data = parse_data.get("sections", [])
+
+        # 2. Fetch Lead Section (Section 0), pinned to the same revision as the ToC
+        lead_html = self._fetch_section_html(title_slug, revid, 0)
+
+        return {
+            "title": real_title,
+            "revid": revid,
+            "sections": sections_data,
+            "summary": self._html_to_markdown(lead_html),
+            "infobox": extract_infobox(lead_html),
+        }
+
+    def _fetch_full_article_record(self, title_slug: str) -> dict:
+        """Download the whole parsed article once and cache every section's markdown."""
+        params = {
+            "action": "parse",
+            "page": title_slug,
+            "prop": "text|sections|revid",
+            "format": "json",
+            "redirects": 1,
+            "origin": "*"
+        }
+        parse_data = self._request_parse(title_slug, params)
+        real_title = parse_data.get("title", title_slug.replace("_", " "))
+        revid = parse_data.get("revid", 0)
+        sections_data = parse_data.get("sections", [])
+        full_html = parse_data.get("text", {}).get("*", "")
+
+        lead_html, section_html = self._split_sections(full_html, sections_data)
+        for index, html in section_html.items():
+            self.cache.set(f"section:{real_title}@{revid}:{index}", self._html_to_markdown(html))
+
+        return {
+            "title": real_title,
+            "revid": revid,
+            "sections": sections_data,
+            "summary": self._html_to_markdown(lead_html),
+            "infobox": extract_infobox(lead_html),
+        }
+
+    def _toc_entries(self, sections_data: List[dict]) -> List[TocEntry]:
+        """
+        ToC hierarchy from the ``sections`` payload. A section's size runs from its
+        ``byteoffset`` to the next section at the same or a higher level, so it includes
+        its subsections; the last ones (and transcluded sections) have no known end.
+        """
+        entries = []
+        for i, sec in enumerate(sections_data):
+            number = str(sec.get("number") or i + 1)
+            level = int(sec.get("toclevel") or number.count(".") + 1)
+            size = None
+            start = sec.get("byteoffset")
+            if start is not None:
+                for later in sections_data[i + 1:]:
+                    later_number = str(later.get("number") or "")
+                    if not later_number.startswith(number + "."):
+                        if later.get("byteoffset") is not None:
+                            size = later["byteoffset"] - start
+                        break
+            entries.append(TocEntry(line=sec["line"], number=number, level=level, size=size))
+        return entries
+
+    def _split_sections(self, full_html: str, sections_data: List[dict]):
+        """
+        Split parser output into the lead and one HTML fragment per ToC entry.
+
+        Mirrors ``action=parse&section=N``: a section runs from its heading up to the
+        next heading of the same or a higher level, so it includes its subsections.
+        Headings are matched to the ToC by position; if the counts disagree the page
+        uses markup we do not understand and only the lead is returned (the remaining
+        sections then fall back to per-section requests).
+        """
+        soup = BeautifulSoup(full_html, "lxml")
+        root = soup.find("div", class_="mw-parser-output") or soup.body or soup
+        lead_parts: List[str] = []
+        chunks: List[List[str]] = []
+        for node in root.children:
+            if self._is_heading(node):
+                chunks.append([])
+            (chunks[-1] if chunks else lead_parts).append(str(node))
+
+        lead_html = "".join(lead_parts)
+        if len(chunks) != len(sections_data):
+            logger.debug(f"Heading count {len(chunks)} != ToC size {len(sections_data)}; not splitting")
+            return lead_html, {}
+
+        levels = [int(sec.get("level", 2)) for sec in sections_data]
+        section_html: Dict[str, str] = {}
+        for i, sec in enumerate(sections_data):
+            end = i + 1
+            while end < len(chunks) and levels[end] > levels[i]:
+                end += 1
+            section_html[str(sec["index"])] = "".join("".join(chunk) for chunk in chunks[i:end])
+        return lead_html, section_html
+
+    def _is_heading(self, node) -> bool:
+        name = getattr(node, "name", None)
+        if name in ("h2", "h3", "h4", "h5", "h6"):
+            return True
+        return name == "div" and "mw-heading" in (node.get("class") or [])
+
+    def _request_parse(self, title_slug: str, params: dict) -> dict:
+        resp = self._api_get(params)
+        
+        # Handle graceful failures if API fails
+        if resp.status_code != 200:
+            logger.error(f"API returned {resp.status_code}")
+            raise ArticleFetchError("Error fetching article structure.")
+
+        data = resp.json()
+        
+        if "error" in data:
+            logger.error(f"API Error for {title_slug}: {data['error']}")
+            raise ArticleFetchError(f"API Error: {data['error'].get('info', 'Unknown')}")
+
+        return data.get("parse", {})
+
+    def _fetch_section_html(self, title_slug: str, revid: int, index) -> str:
+        params = {
+            "action": "parse",
+            "prop": "text",
+            "section": index,
+            "format": "json",
+            "origin": "*"
+        }
+        if revid:
+            params["oldid"] = revid
+        else:
+            params["page"] = title_slug
+            params["redirects"] = 1
+        resp = self._api_get(params)
+        return resp.json().get("parse", {}).get("text", {}).get("*", "")
+
+    def _api_get(self, params: dict):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire("fetcher")
+        if self.session is not None:
+            return self.session.get(self.api_url, params=params, timeout=10)
+        return self.transport.get(self.api_url, params=params, timeout=10)
+
+    def _article_key(self, title: str, revid: int) -> str:
+        return f"article:{title}@{revid}"
+
+    def _normalize_title(self, title_slug: str) -> str:
+        """MediaWiki titles ignore underscores vs spaces and the case of the first letter."""
+        title = unquote(title_slug).replace("_", " ").strip()
+        return title[:1].upper() + title[1:]
 
     def _extract_title_slug(self, url: str) -> str:
         """Extracts 'Mankatha_(soundtrack)' from url."""
@@ -165,15 +400,11 @@ class WikipediaArticleFetcher:
     def _html_to_markdown(self, html: str) -> str:
         if not html:
             return ""
-        h = html2text.HTML2Text()
-        h.ignore_links = False 
-        h.ignore_images = True
-        h.body_width = 0
-        h.unicode_snob = True
-        h.decode_errors = 'ignore'
-        result = h.handle(html).strip()
-        
-        # Remove excessive newlines
-        import re
-        result = re.sub(r'\n{3,}', '\n\n', result)
-        return result
\ No newline at end of file
+        with span("convert", converter=self.converter, html_bytes=len(html)) as attrs:
+            if self.conversion_pool is not None:
+                # Run in a worker process so heavy conversions do not hold this process's GIL
+                markdown = self.conversion_pool.submit(convert_html, html, self.converter).result()
+            else:
+                markdown = convert_html(html, self.converter)
+            attrs["markdown_chars"] = len(markdown)
+        return markdown
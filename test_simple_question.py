@@ -11,11 +11,17 @@ from src.web_search import WikipediaSearchClient
 from src.wiki_fetcher import WikipediaArticleFetcher
 from src.llm_client import LLMClient
 from src.reasoning_engine import ReasoningEngine
+from src.utils import render_prompt
 
 def load_system_prompt():
     path = Path(config.PROMPTS_DIR) / "agent_system_prompt.txt"
     with open(path, 'r', encoding='utf-8') as f:
-        return f.read()
+        return render_prompt(
+            f.read(),
+            passage_retrieval=False,
+            toc_max_level=config.TOC_MAX_LEVEL,
+            toc_max_entries=config.TOC_MAX_ENTRIES,
+        )
 
 def main():
     print("=" * 70)
@@ -39,7 +45,10 @@ def main():
     
     searcher = WikipediaSearchClient(rate_limit=config.SEARCH_DELAY)
     fetcher = WikipediaArticleFetcher()
-    engine = ReasoningEngine(llm, searcher, fetcher)
+    engine = ReasoningEngine(
+        llm, searcher, fetcher,
+        toc_max_level=config.TOC_MAX_LEVEL, toc_max_entries=config.TOC_MAX_ENTRIES,
+    )
     
     print("✓ Components initialized\n")
     print("-" * 70)
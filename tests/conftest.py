@@ -0,0 +1,75 @@
+"""Shared test doubles for the LLM and the MediaWiki API."""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+
+class ScriptedLLM:
+    """LLM stand-in that replies with scripted JSON actions, then ``final`` once they run out."""
+
+    def __init__(self, actions=(), final="unknown", usage=None, on_request=None):
+        self.actions = list(actions)
+        self.final = final
+        self.usage = usage
+        self.on_request = on_request
+        self.requests = []
+
+    @property
+    def calls(self) -> int:
+        return len(self.requests)
+
+    def chat(self, messages, **kwargs):
+        self.requests.append(messages)
+        if self.on_request is not None:
+            self.on_request(self.calls)
+        if self.actions:
+            return json.dumps(self.actions.pop(0))
+        return self.final
+
+    def last_usage(self):
+        return dict(self.usage) if self.usage else None
+
+
+class FakeMediaWikiSession:
+    """Minimal stand-in for requests.Session serving canned action=parse payloads.
+
+    ``sections`` is the ``prop=sections`` list and ``texts`` maps a section index
+    to its HTML; other sections render as "Section <index> text".
+    """
+
+    DEFAULT_SECTIONS = [
+        {"line": "Early life", "index": "1", "level": "2", "number": "1"},
+        {"line": "Legacy", "index": "2", "level": "2", "number": "2"},
+    ]
+
+    def __init__(self, title="Ada Lovelace", revid=42, sections=None, texts=None):
+        self.headers = {}
+        self.calls = []
+        self.title = title
+        self.revid = revid
+        self.sections = self.DEFAULT_SECTIONS if sections is None else sections
+        self.texts = texts or {}
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(dict(params))
+        if "sections" in params.get("prop", ""):
+            payload = {"parse": {"title": self.title, "revid": self.revid, "sections": self.sections}}
+        else:
+            section = params["section"]
+            html = self.texts.get(section, f"<p>Section {section} text</p>")
+            payload = {"parse": {"text": {"*": html}}}
+        return SimpleNamespace(status_code=200, json=lambda: payload)
+
+
+@pytest.fixture
+def scripted_llm():
+    """Factory for :class:`ScriptedLLM`."""
+    return ScriptedLLM
+
+
+@pytest.fixture
+def mediawiki_session():
+    """Factory for :class:`FakeMediaWikiSession`."""
+    return FakeMediaWikiSession
@@ -1,11 +1,13 @@
 import json
+import threading
 from pathlib import Path
 
 import pytest
 
-from src.utils import chunk_text
+from src.utils import chunk_text, render_prompt
 from src.memory_store import MemoryStore
 from src.web_search import WikipediaSearchClient
+from src.reasoning_engine import ReasoningEngine
 
 
 def test_chunk_text_splits_with_overlap():
@@ -17,6 +19,25 @@ def test_chunk_text_splits_with_overlap():
     assert chunks[0][-10:] == chunks[1][:10]
 
 
+def test_system_prompt_describes_passage_arguments_only_when_enabled():
+    template = (Path(__file__).parent.parent / "prompts" / "agent_system_prompt.txt").read_text(encoding="utf-8")
+    enabled = render_prompt(template, passage_retrieval=True, toc_max_level=2, toc_max_entries=60)
+    disabled = render_prompt(template, passage_retrieval=False, toc_max_level=2, toc_max_entries=60)
+    assert "{{" not in enabled and "{{" not in disabled
+    assert "full?: bool, query?: str" in enabled and "full=true" in enabled
+    assert "full?: bool" not in disabled and "full=true" not in disabled
+    # The dropped note leaves no blank line behind
+    assert len(disabled.splitlines()) == len(enabled.splitlines()) - 1
+
+
+def test_system_prompt_describes_configured_toc():
+    template = (Path(__file__).parent.parent / "prompts" / "agent_system_prompt.txt").read_text(encoding="utf-8")
+    collapsed = render_prompt(template, passage_retrieval=False, toc_max_level=3, toc_max_entries=40)
+    assert "collapsed below level 3" in collapsed and "40 sections at a time" in collapsed
+    full = render_prompt(template, passage_retrieval=False, toc_max_level=0, toc_max_entries=0)
+    assert "The ToC is numbered." in full and "collapsed" not in full and "page=2" not in full
+
+
 def test_memory_store_round_trip(tmp_path: Path):
     store_path = tmp_path / "memory.json"
     store = MemoryStore(store_path)
@@ -39,3 +60,1108 @@ def test_wikipedia_search_client_site_filter():
     already_filtered = "site:wikipedia.org Nikola Tesla"
     filtered2 = client._apply_site_filter(already_filtered)
     assert filtered2 == already_filtered
+
+
+def test_reasoning_engine_honours_cancel_event():
+    class FailingLLM:
+        def chat(self, *args, **kwargs):
+            raise AssertionError("LLM must not be called once cancelled")
+
+    engine = ReasoningEngine(FailingLLM(), WikipediaSearchClient(), None)
+    cancel_event = threading.Event()
+    cancel_event.set()
+    result = engine.solve("Who wrote Hamlet?", cancel_event=cancel_event)
+    assert result["cancelled"] is True
+    assert result["trace"] == []
+
+
+def test_llm_client_achat_respects_concurrency_cap(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+
+    import src.llm_client as llm_module
+
+    state = {"in_flight": 0, "peak": 0}
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            state["in_flight"] += 1
+            state["peak"] = max(state["peak"], state["in_flight"])
+            await asyncio.sleep(0.01)
+            state["in_flight"] -= 1
+            message = SimpleNamespace(content=" ok ")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    class FakeAsyncOpenAI:
+        def __init__(self, **kwargs):
+            self.chat = SimpleNamespace(completions=FakeCompletions())
+
+        async def close(self):
+            pass
+
+    monkeypatch.setattr(llm_module, "AsyncOpenAI", FakeAsyncOpenAI)
+    client = llm_module.LLMClient(api_key="test", model="m", max_concurrency=2)
+
+    async def run():
+        answers = await asyncio.gather(
+            *[client.achat([{"role": "user", "content": "hi"}], stream=False) for _ in range(8)]
+        )
+        await client.aclose()
+        return answers
+
+    assert asyncio.run(run()) == ["ok"] * 8
+    assert state["peak"] == 2
+
+
+def test_llm_client_achat_keeps_cache_off_the_loop_and_one_client_per_loop(monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+
+    import src.llm_client as llm_module
+
+    created, closed = [], []
+
+    class FakeCompletions:
+        async def create(self, **kwargs):
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="ok"))])
+
+    class FakeAsyncOpenAI:
+        def __init__(self, **kwargs):
+            self.chat = SimpleNamespace(completions=FakeCompletions())
+            created.append(self)
+
+        async def close(self):
+            closed.append(self)
+
+    class ThreadRecordingCache:
+        def __init__(self):
+            self.threads = []
+            self.entries = {}
+
+        def get(self, key):
+            self.threads.append(threading.get_ident())
+            return self.entries.get(key)
+
+        def set(self, key, value):
+            self.threads.append(threading.get_ident())
+            self.entries[key] = value
+
+    monkeypatch.setattr(llm_module, "AsyncOpenAI", FakeAsyncOpenAI)
+    cache = ThreadRecordingCache()
+    client = llm_module.LLMClient(api_key="test", model="m", temperature=0.0, cache=cache)
+
+    async def ask(question, close=False):
+        answer = await client.achat([{"role": "user", "content": question}], stream=False)
+        if close:
+            await client.aclose()
+        return answer
+
+    assert asyncio.run(ask("first")) == "ok"
+    assert asyncio.run(ask("second", close=True)) == "ok"
+    assert len(cache.threads) == 4 and threading.get_ident() not in cache.threads
+    # The second loop got its own client; the first loop's client was dropped once its loop closed
+    assert len(created) == 2 and closed == [created[1]]
+    assert client._async_clients == {}
+
+
+def test_llm_client_streams_without_usage_when_server_rejects_stream_options(monkeypatch):
+    from types import SimpleNamespace
+
+    import src.llm_client as llm_module
+
+    class BadRequestError(Exception):
+        pass
+
+    calls = []
+
+    class FakeCompletions:
+        def create(self, **kwargs):
+            calls.append("stream_options" in kwargs)
+            if "stream_options" in kwargs:
+                raise BadRequestError("Error code: 400 - Unrecognized request argument: stream_options")
+            delta = SimpleNamespace(content="ok")
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)])
+
+    class FakeOpenAI:
+        def __init__(self, **kwargs):
+            self.chat = SimpleNamespace(completions=FakeCompletions())
+
+    monkeypatch.setattr(llm_module, "OpenAI", FakeOpenAI)
+    monkeypatch.setattr(llm_module, "BadRequestError", BadRequestError)
+    client = llm_module.LLMClient(api_key="test", model="m", streaming=True)
+    assert client.chat([{"role": "user", "content": "hi"}]) == "ok"
+    assert client.chat([{"role": "user", "content": "hi"}]) == "ok"
+    assert calls == [True, False, False]  # rejected once, then never sent again
+    assert not llm_module.LLMClient(api_key="test", model="m", stream_usage=False).stream_usage
+
+
+def test_disk_cache_evicts_least_recently_used(tmp_path: Path):
+    from src.cache import DiskCache, make_cache_key
+
+    cache = DiskCache(tmp_path / "cache.sqlite", max_bytes=300)
+    cache.set("a", "x" * 100)
+    cache.set("b", "y" * 100)
+    assert cache.get("a") == "x" * 100  # touch "a" so "b" is the eviction candidate
+    cache.set("c", "z" * 100)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1 and stats["misses"] == 1
+    assert make_cache_key({"a": 1, "b": 2}) == make_cache_key({"b": 2, "a": 1})
+
+
+def test_disk_cache_delete_rolls_back_a_failed_transaction(tmp_path: Path, monkeypatch):
+    from src.cache import DiskCache
+
+    cache = DiskCache(tmp_path / "c.sqlite")
+    cache.set("a", "x" * 10)
+
+    def fail(delta):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(cache, "_add_bytes", fail)
+    with pytest.raises(OSError):
+        cache.delete("a")
+    monkeypatch.undo()
+    assert cache.get("a") == "x" * 10  # the DELETE was rolled back
+    cache.set("b", "y")  # and the connection can start a new transaction
+    cache.delete("a")
+    assert cache.get("a") is None and cache.get("b") == "y"
+
+
+def test_disk_cache_size_limit_is_shared_across_processes_and_reads_do_not_write(tmp_path: Path):
+    from src.cache import DiskCache
+
+    first = DiskCache(tmp_path / "cache.sqlite", max_bytes=300)
+    second = DiskCache(tmp_path / "cache.sqlite", max_bytes=300)
+    first.set("a", "x" * 100)
+    second.set("b", "y" * 100)
+    changes = first._conn.total_changes
+    assert first.get("b") == "y" * 100
+    assert first._conn.total_changes == changes  # access time buffered, nothing committed
+    first.set("c", "z" * 100)  # over the limit only when counting the other process's entry
+    assert first.stats()["evictions"] == 1
+    assert len(second) == 2 and second.get("a") is None
+    assert second.stats()["bytes"] == first.stats()["bytes"] <= 300
+
+
+def test_wiki_fetcher_tiered_cache_survives_process(tmp_path: Path, mediawiki_session):
+    from src.cache import DiskCache, TieredCache
+    from src.wiki_fetcher import WikipediaArticleFetcher
+
+    url = "https://en.wikipedia.org/wiki/Ada_Lovelace"
+    session = mediawiki_session()
+    fetcher = WikipediaArticleFetcher(session=session, cache=TieredCache(disk=DiskCache(tmp_path / "a.sqlite")))
+    struct = fetcher.get_article_structure(url)
+    assert struct.sections == ["Early life", "Legacy"]
+    assert "Section 1 text" in fetcher.get_section_content(url, "Early life")
+    assert all(call.get("oldid") == 42 for call in session.calls if call["prop"] == "text")
+
+    fresh_session = mediawiki_session()
+    warm = WikipediaArticleFetcher(session=fresh_session, cache=TieredCache(disk=DiskCache(tmp_path / "a.sqlite")))
+    assert warm.get_article_structure("https://en.wikipedia.org/wiki/ada_Lovelace").title == "Ada Lovelace"
+    assert "Section 1 text" in warm.get_section_content(url, "early life")
+    assert fresh_session.calls == []
+
+
+INFOBOX_LEAD = (
+    '<div class="mw-parser-output"><table class="infobox vcard"><tbody>'
+    '<tr><th colspan="2" class="infobox-above">Ada Lovelace</th></tr>'
+    '<tr><th scope="row" class="infobox-label">Born</th><td class="infobox-data">Augusta Ada Byron<br />'
+    '<span style="display:none">(1815-12-10)</span>10 December 1815<sup class="reference">[1]</sup><br />'
+    '<div class="birthplace">London, England</div></td></tr>'
+    '<tr><th scope="row" class="infobox-label">Children</th><td class="infobox-data">'
+    '<div class="plainlist"><ul><li>Byron</li><li>Anne</li></ul></div></td></tr>'
+    '</tbody></table><p>Ada was a mathematician.</p></div>'
+)
+
+
+def test_wiki_fetcher_extracts_infobox_into_record(tmp_path: Path, mediawiki_session):
+    from src.cache import DiskCache, TieredCache
+    from src.wiki_fetcher import WikipediaArticleFetcher
+
+    url = "https://en.wikipedia.org/wiki/Ada_Lovelace"
+    cache_path = tmp_path / "a.sqlite"
+    session = mediawiki_session(texts={0: INFOBOX_LEAD})
+    fetcher = WikipediaArticleFetcher(session=session, cache=TieredCache(disk=DiskCache(cache_path)))
+    expected = {"Born": "Augusta Ada Byron; 10 December 1815; London, England", "Children": "Byron; Anne"}
+    assert fetcher.get_article_structure(url).infobox == expected
+
+    warm_session = mediawiki_session(texts={0: INFOBOX_LEAD})
+    warm = WikipediaArticleFetcher(session=warm_session, cache=TieredCache(disk=DiskCache(cache_path)))
+    assert warm.get_article_structure(url).infobox == expected
+    assert warm_session.calls == []
+
+
+def test_inspect_shows_infobox_before_toc(mediawiki_session):
+    from src.wiki_fetcher import WikipediaArticleFetcher
+
+    fetcher = WikipediaArticleFetcher(session=mediawiki_session(texts={0: INFOBOX_LEAD}))
+    engine = ReasoningEngine(None, WikipediaSearchClient(), fetcher)
+    output = engine._execute_tool("inspect_article_structure", {"url": "https://en.wikipedia.org/wiki/Ada_Lovelace"})
+    assert "INFOBOX" in output and "Born: Augusta Ada Byron; 10 December 1815; London, England" in output
+    assert output.index("INFOBOX") < output.index("TABLE OF CONTENTS")
+
+
+def _big_article_fetcher(mediawiki_session):
+    from src.wiki_fetcher import WikipediaArticleFetcher
+
+    numbers = ["1", "2", "2.1", "2.1.1", "2.2", "3"]
+    sections = [
+        {"line": f"Part {n}", "number": n, "toclevel": n.count(".") + 1, "level": str(n.count(".") + 2),
+         "index": str(i + 1), "byteoffset": 1000 + 2048 * i}
+        for i, n in enumerate(numbers)
+    ]
+    return WikipediaArticleFetcher(session=mediawiki_session(title="Big Article", revid=1, sections=sections))
+
+
+def test_wiki_fetcher_builds_numbered_toc_with_sizes(mediawiki_session):
+    fetcher = _big_article_fetcher(mediawiki_session)
+    url = "https://en.wikipedia.org/wiki/Big_Article"
+    toc = fetcher.get_article_structure(url).toc
+    assert [(e.number, e.level, e.size) for e in toc] == [
+        ("1", 1, 2048), ("2", 1, 4 * 2048), ("2.1", 2, 2 * 2048), ("2.1.1", 3, 2048), ("2.2", 2, 2048), ("3", 1, None),
+    ]
+    assert "Section 4 text" in fetcher.get_section_content(url, "2.1.1")
+
+
+def test_inspect_collapses_toc_and_expands_on_request(mediawiki_session):
+    url = "https://en.wikipedia.org/wiki/Big_Article"
+    engine = ReasoningEngine(None, WikipediaSearchClient(), _big_article_fetcher(mediawiki_session), toc_max_level=2)
+    collapsed = engine._execute_tool("inspect_article_structure", {"url": url})
+    assert "    [2.1] Part 2.1 (~4.0 kB, +1 subsections)" in collapsed
+    assert "Part 2.1.1" not in collapsed and "1 subsections collapsed" in collapsed
+
+    expanded = engine._execute_tool("inspect_article_structure", {"url": url, "expand": "2.1"})
+    assert "      [2.1.1] Part 2.1.1 (~2.0 kB)" in expanded and "collapsed" not in expanded
+    assert engine._memo_key("inspect_article_structure", {"url": url, "expand": "2.1"}) != engine._memo_key(
+        "inspect_article_structure", {"url": url}
+    )
+
+
+def _long_toc():
+    from src.wiki_fetcher import TocEntry
+
+    toc = [TocEntry(line=f"Part {n}", number=str(n), level=1) for n in range(1, 8)]
+    toc.insert(2, TocEntry(line="Part 2.1", number="2.1", level=2))
+    return toc
+
+
+def test_inspect_pages_through_long_toc():
+    engine = ReasoningEngine(None, WikipediaSearchClient(), None, toc_max_level=1, toc_max_entries=3)
+    toc = _long_toc()
+
+    first = "\n".join(engine._render_toc(toc))
+    assert "[3] Part 3" in first and "[4] Part 4" not in first
+    assert "4 more sections not listed" in first and "page=2" in first
+
+    second = "\n".join(engine._render_toc(toc, page="2"))
+    assert "Page 2 of 3" in second and "[4] Part 4" in second and "[6] Part 6" in second
+    assert "[3] Part 3" not in second and "page=3" in second
+
+    last = "\n".join(engine._render_toc(toc, page=9))
+    assert "[7] Part 7" in last and "more sections" not in last
+
+
+def test_inspect_lists_expanded_section_on_every_page():
+    engine = ReasoningEngine(None, WikipediaSearchClient(), None, toc_max_level=1, toc_max_entries=3)
+    expanded = "\n".join(engine._render_toc(_long_toc(), expand="2.1", page=3))
+    assert "[2.1] Part 2.1" in expanded and "[7] Part 7" in expanded
+
+
+def test_inspect_reports_expand_that_matches_no_section():
+    engine = ReasoningEngine(None, WikipediaSearchClient(), None, toc_max_level=1, toc_max_entries=3)
+    lines = engine._render_toc(_long_toc(), expand="9.9")
+    assert lines[0] == "  (No section matches '9.9'; use a number from the list below.)"
+    assert "[1] Part 1" in "\n".join(lines)
+    assert "No section matches" not in "\n".join(engine._render_toc(_long_toc(), expand="2.1"))
+
+
+def test_inspect_memo_key_includes_toc_page():
+    engine = ReasoningEngine(None, WikipediaSearchClient(), None)
+    url = "https://en.wikipedia.org/wiki/Big_Article"
+    key = lambda **args: engine._memo_key("inspect_article_structure", dict(args, url=url))
+    assert key(page=2) != key()
+    assert key(page=1) == key()
+
+
+def test_wiki_fetcher_close_shuts_down_conversion_pool(mediawiki_session):
+    from concurrent.futures import ThreadPoolExecutor
+    from src.wiki_fetcher import WikipediaArticleFetcher
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    fetcher = WikipediaArticleFetcher(session=mediawiki_session(), conversion_pool=pool)
+    assert "Section 1 text" in fetcher.get_section_content("https://en.wikipedia.org/wiki/Ada_Lovelace", "Early life")
+    fetcher.close()
+    with pytest.raises(RuntimeError):
+        pool.submit(print)
+
+
+def test_wiki_fetcher_full_mode_splits_sections_locally():
+    from types import SimpleNamespace
+    from src.wiki_fetcher import WikipediaArticleFetcher
+
+    html = (
+        '<div class="mw-parser-output"><p>Lead text.</p>'
+        '<div class="mw-heading mw-heading2"><h2 id="Career">Career</h2></div><p>Career intro.</p>'
+        '<div class="mw-heading mw-heading3"><h3 id="Films">Films</h3></div><p>Film list.</p>'
+        '<h2>Personal life</h2><p>Married twice.</p></div>'
+    )
+    payload = {"parse": {"title": "Jane Doe", "revid": 7, "text": {"*": html}, "sections": [
+        {"line": "Career", "index": "1", "level": "2"},
+        {"line": "Films", "index": "2", "level": "3"},
+        {"line": "Personal life", "index": "3", "level": "2"},
+    ]}}
+    session = SimpleNamespace(headers={}, calls=0)
+
+    def get(url, params=None, timeout=None):
+        session.calls += 1
+        return SimpleNamespace(status_code=200, json=lambda: payload)
+
+    session.get = get
+    fetcher = WikipediaArticleFetcher(session=session, fetch_mode="full")
+    url = "https://en.wikipedia.org/wiki/Jane_Doe"
+    assert fetcher.get_article_structure(url).summary == "Lead text."
+    career = fetcher.get_section_content(url, "Career")
+    assert "Career intro." in career and "Film list." in career and "Married" not in career
+    assert "Married twice." in fetcher.get_section_content(url, "Personal life")
+    assert session.calls == 1
+
+
+def test_search_prefetcher_tracks_hits_and_waste():
+    from src.prefetcher import SearchPrefetcher
+
+    class CountingFetcher:
+        def __init__(self):
+            self.fetched = []
+            self.done = threading.Event()
+
+        def get_article_structure(self, url):
+            self.fetched.append(url)
+            if len(self.fetched) == 2:
+                self.done.set()
+
+    fetcher = CountingFetcher()
+    prefetcher = SearchPrefetcher(fetcher, top_k=2, max_wasted=1)
+    prefetcher.schedule(["u1", "u2", "u3"])
+    assert prefetcher.claim("u1") is True
+    assert prefetcher.claim("u9") is False
+    fetcher.done.wait(5)  # u2 ran, so it is wasted rather than cancelled
+    prefetcher.schedule(["u4", "u5"])  # u2 was never used -> waste budget exhausted
+    prefetcher.settle()
+    prefetcher.shutdown()
+    stats = prefetcher.stats()
+    assert stats["issued"] == 2 and stats["hits"] == 1 and stats["wasted"] == 1
+    assert "u3" not in fetcher.fetched and "u4" not in fetcher.fetched
+
+
+def test_search_prefetcher_does_not_count_cancelled_prefetches_as_wasted():
+    from src.prefetcher import SearchPrefetcher
+
+    started, release = threading.Event(), threading.Event()
+
+    class BlockingFetcher:
+        def get_article_structure(self, url):
+            started.set()
+            release.wait(5)
+
+    prefetcher = SearchPrefetcher(BlockingFetcher(), top_k=2, max_workers=1)
+    prefetcher.schedule(["u1", "u2"])
+    started.wait(5)  # u1 is running, u2 is still queued
+    prefetcher.settle()
+    release.set()
+    prefetcher.shutdown()
+    stats = prefetcher.stats()
+    assert stats["wasted"] == 1 and stats["cancelled"] == 1
+
+
+def test_local_index_search_is_offline_and_ranked(tmp_path: Path):
+    from src.local_index import LocalIndexSearch, build_local_index
+
+    bench = tmp_path / "bench.json"
+    paragraphs = [
+        {"idx": 0, "title": "Sony Music", "paragraph_text": "Sony Music is headquartered in New York City."},
+        {"idx": 1, "title": "Santa Monica", "paragraph_text": "Universal Music Group is based in Santa Monica."},
+    ]
+    bench.write_text(json.dumps([
+        {"id": "q1", "paragraphs": json.dumps(paragraphs)},
+        {"id": "q2", "paragraphs": paragraphs},
+    ]), encoding="utf-8")
+    assert build_local_index(tmp_path / "index.sqlite", [bench]) == 2
+
+    client = WikipediaSearchClient(local_index=LocalIndexSearch(tmp_path / "index.sqlite"), offline=True)
+    results = client.search("site:wikipedia.org Where is Universal Music's HQ?")
+    assert results[0].title == "Santa Monica"
+    assert results[0].url == "https://en.wikipedia.org/wiki/Santa_Monica"
+    assert client.rate_limiter.stats() == {}  # the local backend never takes a token
+
+
+def test_local_article_fetcher_serves_articles_offline(tmp_path: Path):
+    from src.local_index import LocalArticleFetcher, LocalIndexSearch, build_local_index
+
+    bench = tmp_path / "bench.json"
+    bench.write_text(json.dumps([{"id": "q1", "paragraphs": [
+        {"title": "Santa Monica", "paragraph_text": "Santa Monica is a city in Los Angeles County."},
+        {"title": "Santa Monica Pier", "paragraph_text": "The pier is at the foot of Colorado Avenue."},
+        {"title": "Santa Monica", "paragraph_text": "Universal Music Group is based in Santa Monica."},
+    ]}]), encoding="utf-8")
+    build_local_index(tmp_path / "index.sqlite", [bench])
+    fetcher = LocalArticleFetcher(LocalIndexSearch(tmp_path / "index.sqlite"))
+
+    struct = fetcher.get_article_structure("https://en.wikipedia.org/wiki/santa_Monica")
+    assert struct.title == "Santa Monica" and struct.sections == []
+    assert "Los Angeles County" in struct.summary and "Universal Music" in struct.summary
+    assert "pier" not in struct.summary
+    assert fetcher.get_section_content("https://en.wikipedia.org/wiki/Santa_Monica", "lead") == struct.summary
+    assert "not found" in fetcher.get_section_content("https://en.wikipedia.org/wiki/Santa_Monica", "History")
+    assert "not in the offline index" in fetcher.get_article_structure("Nowhere").summary
+
+
+def test_search_cache_normalizes_queries_and_skips_backends():
+    from src.cache import TieredCache
+    from src.rate_limiter import RateLimiter
+    from src.web_search import SearchResult
+
+    client = WikipediaSearchClient(cache=TieredCache(), rate_limiter=RateLimiter(default=(1000.0, 10)))
+    calls = []
+
+    def fake_backend(query, max_results):
+        calls.append(query)
+        return [SearchResult(title="Inception", url="https://en.wikipedia.org/wiki/Inception", snippet="A film")]
+
+    fake_backend.__name__ = "fake_backend"
+    client._get_backends = lambda: [fake_backend]
+    first = client.search("Inception  (film) director")
+    second = client.search("site:wikipedia.org inception (film)\tDIRECTOR")
+    assert len(calls) == 1
+    assert [r.title for r in second] == [r.title for r in first]
+    client.search("Inception (film) director", max_results=3)
+    assert len(calls) == 2
+    assert len({client.normalize_query(q) for q in ("C++ creator", "C# creator", "C creator")}) == 3
+
+
+def test_normalize_query_strips_any_wikipedia_site_filter():
+    variants = ("Site:Wikipedia.org foo", "site:en.wikipedia.org foo", "foo SITE:wikipedia.org", "foo")
+    assert {WikipediaSearchClient.normalize_query(q) for q in variants} == {"foo"}
+    client = WikipediaSearchClient()
+    assert client._strip_site_filter("site:en.wikipedia.org  Ada Lovelace") == "Ada Lovelace"
+    assert client._apply_site_filter("Site:en.wikipedia.org Ada") == "Site:en.wikipedia.org Ada"
+
+
+def test_token_bucket_allows_burst_then_throttles(tmp_path: Path):
+    from src.rate_limiter import RateLimiter, TokenBucket
+
+    bucket = TokenBucket(rate=1000.0, burst=3)
+    assert [bucket.try_acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_acquire() > 0
+
+    shared_a = TokenBucket(rate=0.001, burst=2, state_file=tmp_path / "wiki.bucket")
+    shared_b = TokenBucket(rate=0.001, burst=2, state_file=tmp_path / "wiki.bucket")
+    assert shared_a.try_acquire() == 0.0 and shared_b.try_acquire() == 0.0
+    assert shared_a.try_acquire() > 0  # the second "process" consumed the last token
+
+    assert RateLimiter.parse_spec("wikipedia_rest=5:10, fetcher=20") == {
+        "wikipedia_rest": (5.0, 10), "fetcher": (20.0, 1)
+    }
+
+
+def test_backend_health_circuit_breaker_and_ordering():
+    from src.backend_health import BackendHealthTracker
+
+    health = BackendHealthTracker(failure_threshold=2, cooldown=60)
+    names = ["cse", "rest", "api"]
+    assert health.order(names) == names
+    health.record("api", 0.1, ok=True)
+    health.record("rest", 0.5, ok=True)
+    assert health.order(names) == ["api", "rest", "cse"]
+    health.record("cse", 20.0, ok=False)
+    health.record("cse", 20.0, ok=False)
+    assert not health.is_available("cse")
+    assert "cse" not in health.order(names)
+    assert health.snapshot()["cse"]["circuit_open"] is True
+
+
+def test_backend_health_ranks_failing_backend_behind_untried_one():
+    from src.backend_health import BackendHealthTracker
+
+    health = BackendHealthTracker(failure_threshold=3, prior_latency=1.0)
+    health.record("rest", 20.0, ok=False)  # timed out once; circuit still closed
+    assert health.order(["rest", "api"]) == ["api", "rest"]
+    health.record("api", 0.2, ok=True)
+    assert health.order(["cse", "rest", "api"]) == ["api", "cse", "rest"]
+
+
+def test_hedged_search_returns_first_answer_within_deadline():
+    import time as _time
+    from src.rate_limiter import RateLimiter
+    from src.web_search import SearchResult
+
+    client = WikipediaSearchClient(
+        rate_limiter=RateLimiter(default=(1000.0, 10)), hedge_delay=0.05, search_deadline=1.0
+    )
+
+    def _search_slow(query, max_results):
+        _time.sleep(0.5)
+        return [SearchResult(title="Slow", url="https://en.wikipedia.org/wiki/Slow")]
+
+    def _search_fast(query, max_results):
+        return [SearchResult(title="Fast", url="https://en.wikipedia.org/wiki/Fast")]
+
+    client._get_backends = lambda: [_search_slow, _search_fast]
+    started = _time.monotonic()
+    results = client.search("anything")
+    assert [r.title for r in results] == ["Fast"]
+    assert _time.monotonic() - started < 0.4
+
+    client.close()
+    with pytest.raises(RuntimeError):
+        client.search("another query")
+
+
+def test_search_deadline_caps_each_backend_request_timeout():
+    from types import SimpleNamespace
+    from src.http_transport import HttpTransport
+    from src.rate_limiter import RateLimiter
+
+    transport = HttpTransport()
+    client = WikipediaSearchClient(rate_limiter=RateLimiter(default=(1000.0, 10)), search_deadline=2.0,
+                                   transport=transport)
+    timeouts = []
+
+    def fake_get(url, params=None, headers=None, timeout=None):
+        timeouts.append(timeout)
+        return SimpleNamespace(status_code=200, headers={}, content=b"", raise_for_status=lambda: None,
+                               json=lambda: {"query": {"search": [{"title": "Inception", "snippet": "A film"}]}})
+
+    transport.session.get = fake_get
+    client._get_backends = lambda: [client._search_wikipedia_api]
+    client.search("inception")
+    assert 0 < timeouts[0] <= 2.0
+    client._backend_get("https://en.wikipedia.org/w/api.php", {})  # outside a search call
+    assert timeouts[1] == 20.0
+
+
+def test_http_transport_retries_and_honours_retry_after():
+    from types import SimpleNamespace
+    from src.http_transport import HttpTransport
+
+    transport = HttpTransport(max_attempts=3, backoff_base=0.01)
+    responses = [
+        SimpleNamespace(status_code=429, headers={"Retry-After": "0"}, content=b""),
+        SimpleNamespace(status_code=200, headers={}, content=b'{"ok": true}'),
+    ]
+    transport.session.get = lambda url, **kwargs: responses.pop(0)
+    response = transport.get("https://en.wikipedia.org/w/api.php", params={"action": "query"})
+    assert response.status_code == 200
+    stats = transport.stats()["en.wikipedia.org"]
+    assert stats["requests"] == 2 and stats["retries"] == 1 and stats["errors"] == 1
+
+
+def test_http_transport_can_skip_timeout_retries_and_stops_at_deadline():
+    import time as _time
+    import requests
+    from src.http_transport import HttpTransport
+
+    transport = HttpTransport(max_attempts=4, backoff_base=0.01)
+    calls = []
+
+    def hanging_get(url, **kwargs):
+        calls.append(kwargs["timeout"])
+        raise requests.ReadTimeout("read timed out")
+
+    transport.session.get = hanging_get
+    with pytest.raises(requests.Timeout):
+        transport.get("https://en.wikipedia.org/w/api.php", retry_timeouts=False)
+    assert len(calls) == 1
+
+    def resetting_get(url, **kwargs):
+        calls.append(kwargs["timeout"])
+        _time.sleep(0.15)
+        raise requests.ConnectionError("connection reset")
+
+    calls.clear()
+    transport.session.get = resetting_get
+    with pytest.raises(requests.ConnectionError):
+        transport.get("https://en.wikipedia.org/w/api.php", deadline=_time.monotonic() + 0.25)
+    assert len(calls) == 2 and all(t <= 0.25 for t in calls)
+
+
+def test_fetch_page_metadata_batches_titles_and_resolves_redirects():
+    from types import SimpleNamespace
+
+    client = WikipediaSearchClient()
+    requests_made = []
+    payload = {"batchcomplete": True, "query": {
+        "normalized": [{"from": "sony_music", "to": "Sony music"}],
+        "redirects": [{"from": "Sony music", "to": "Sony Music"}],
+        "pages": [
+            {"pageid": 1, "title": "Sony Music", "extract": "Sony Music is a label."},
+            {"pageid": 2, "title": "Santa Monica", "extract": "A city."},
+        ],
+    }}
+
+    def fake_get(url, params=None, headers=None, **kwargs):
+        requests_made.append(params["titles"])
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: payload)
+
+    client.transport = SimpleNamespace(get=fake_get)
+    meta = client.fetch_page_metadata(["sony_music", "Santa Monica"])
+    assert requests_made == ["sony_music|Santa Monica"]
+    assert meta["sony_music"].title == "Sony Music" and meta["sony_music"].redirected_from == "Sony music"
+    assert meta["Santa Monica"].pageid == 2 and meta["Santa Monica"].extract == "A city."
+
+
+def test_fast_html_converter_strips_wikipedia_boilerplate():
+    from src.html_markdown import html_to_markdown_fast
+
+    html = (
+        '<div class="mw-parser-output">'
+        '<div class="mw-heading"><h2>Career</h2><span class="mw-editsection">[edit]</span></div>'
+        '<div role="note" class="hatnote">Main article: Foo</div>'
+        '<table class="infobox"><tr><th>Born</th><td>1970<br/>Paris</td></tr></table>'
+        '<p>She joined <a href="/wiki/Epic_Records">Epic Records</a> in 1990.'
+        '<sup class="reference"><a href="#cite_note-1">[1]</a></sup> Later<!-- hidden --> years.</p>'
+        '<ul><li>First album<ul><li>Deluxe</li></ul></li></ul>'
+        '<div class="navbox"><ul><li>Unrelated</li></ul></div>'
+        '<ol class="references"><li>Citation text</li></ol>'
+        '</div>'
+    )
+    markdown = html_to_markdown_fast(html)
+    assert "## Career" in markdown
+    assert "| Born | 1970; Paris |" in markdown
+    assert "She joined Epic Records in 1990. Later years." in markdown
+    assert "- First album\n  - Deluxe" in markdown
+    for noise in ("[edit]", "Main article", "[1]", "Unrelated", "Citation text"):
+        assert noise not in markdown
+
+
+def _add_task_actions(count):
+    return [{"thought": f"step {i}", "tool": "manage_tasks", "args": {"action": "add", "description": f"task {i}"}}
+            for i in range(1, count + 1)]
+
+
+def test_prefix_stable_layout_keeps_previous_prompt_as_prefix(scripted_llm):
+    cancel_event = threading.Event()
+    llm = scripted_llm(
+        _add_task_actions(3),
+        usage={"prompt_tokens": 100, "completion_tokens": 10, "cached_prompt_tokens": 80},
+        on_request=lambda n: n == 3 and cancel_event.set(),
+    )
+    engine = ReasoningEngine(llm, WikipediaSearchClient(), None, prompt_layout="prefix_stable")
+    result = engine.solve("Who wrote Hamlet?", cancel_event=cancel_event)
+
+    first, second, third = llm.requests
+    # Only the trailing state block changes; earlier turns are byte-identical
+    assert second[0]["content"].startswith("GOAL: Who wrote Hamlet?")
+    assert third[:2] == second[:2]
+    assert third[2]["content"].startswith(second[2]["content"].split("\n\n*** CURRENT STATE")[0])
+    assert "task 2" in third[-1]["content"] and "task 2" not in second[-1]["content"]
+    assert result["trace"][0]["usage"]["cached_prompt_tokens"] == 80
+    assert result["llm_usage"] == {"prompt_tokens": 300, "completion_tokens": 30, "cached_prompt_tokens": 240}
+
+
+def test_extract_usage_reads_openai_and_deepseek_cache_fields():
+    from types import SimpleNamespace
+    from src.llm_client import extract_usage
+
+    openai_usage = SimpleNamespace(prompt_tokens=50, completion_tokens=5,
+                                   prompt_tokens_details=SimpleNamespace(cached_tokens=32))
+    deepseek_usage = SimpleNamespace(prompt_tokens=50, completion_tokens=5, prompt_cache_hit_tokens=40)
+    assert extract_usage(openai_usage)["cached_prompt_tokens"] == 32
+    assert extract_usage(deepseek_usage)["cached_prompt_tokens"] == 40
+
+
+def test_prefix_stable_history_is_bounded_and_drops_whole_windows(scripted_llm):
+    cancel_event = threading.Event()
+    llm = scripted_llm(_add_task_actions(7), on_request=lambda n: n == 7 and cancel_event.set())
+    engine = ReasoningEngine(llm, WikipediaSearchClient(), None, prompt_layout="prefix_stable", history_recent_steps=0)
+    engine.history_window = 2
+    engine.solve("Who wrote Hamlet?", cancel_event=cancel_event)
+
+    turns = [sum(m["role"] == "assistant" for m in request) for request in llm.requests]
+    assert turns == [0, 1, 2, 3, 2, 3, 2]
+    # Between two drops the earlier turns are unchanged, so the prefix can be cached
+    assert llm.requests[5][:3] == llm.requests[4][:3]
+
+
+def test_context_builder_fills_budget_by_priority():
+    from src.context_builder import ContextBuilder, HeuristicTokenizer
+    from src.research_tree import ResearchTree
+
+    tree = ResearchTree()
+    relevant = tree.add_node("root", "Hamlet authorship", "Hamlet was written by William Shakespeare.")
+    for i in range(30):
+        tree.add_node("root", f"Unrelated {i}", "Filler fact about something else entirely. " * 3)
+    history = [
+        {"step": i, "thought": "t", "tool": "read_section", "args": {"section_name": "x"}, "result": "word " * 500}
+        for i in range(1, 11)
+    ]
+
+    builder = ContextBuilder(budget_tokens=900, tokenizer=HeuristicTokenizer(), observation_tokens=100)
+    context = builder.build("Who wrote Hamlet?", "## PLAN\n- [ ] find author", tree, history, overhead_tokens=200)
+    report = context.report
+
+    assert report["used"] <= report["budget"]
+    assert f"[{relevant}] Hamlet authorship" in context.tree
+    assert report["tree_nodes"] < report["tree_nodes_total"]
+    # Newest observations are kept (in order), each capped
+    assert 0 < report["history_steps"] < len(history)
+    assert context.history[-1]["step"] == 10
+    assert [h["step"] for h in context.history] == sorted(h["step"] for h in context.history)
+    assert all(len(h["result"]) < 500 for h in context.history)
+
+
+def test_context_builder_measures_the_rendered_layout_and_truncation_suffix():
+    from src.context_builder import ContextBuilder, HeuristicTokenizer
+    from src.research_tree import ResearchTree
+
+    history = [
+        {"step": i, "thought": "t" * 200, "tool": "read_section", "args": {"section_name": "x"},
+         "result": "word " * 500}
+        for i in range(1, 11)
+    ]
+    engine = ReasoningEngine(None, WikipediaSearchClient(), None, prompt_layout="prefix_stable")
+    tokenizer = HeuristicTokenizer()
+    builder = ContextBuilder(budget_tokens=900, tokenizer=tokenizer, observation_tokens=100)
+    context = builder.build("Who wrote Hamlet?", "## PLAN", ResearchTree(), history, overhead_tokens=200,
+                            render_step=engine._render_history_step)
+
+    rendered = sum(tokenizer.count(engine._render_history_step(h)) for h in context.history)
+    assert context.report["history"] == rendered
+    assert context.report["used"] <= context.report["budget"]
+    assert all(tokenizer.count(h["result"]) <= 100 for h in context.history)
+
+    plan = builder.build("Q", "- [ ] task\n" * 1000, ResearchTree(), [], overhead_tokens=200)
+    assert plan.plan.endswith("[plan truncated]") and plan.report["plan"] <= 900 - 200
+
+
+PLAN_ACTION = {"thought": "plan", "tool": "manage_tasks", "args": {"action": "add", "description": "find author"}}
+STEP_USAGE = {"prompt_tokens": 1000, "completion_tokens": 20, "cached_prompt_tokens": 0}
+
+
+def test_reasoning_engine_stops_on_answer(scripted_llm):
+    answer = {"thought": "done", "tool": "answer_question", "args": {"answer": "Shakespeare"}}
+    llm = scripted_llm([PLAN_ACTION, answer, PLAN_ACTION], usage=STEP_USAGE)
+    result = ReasoningEngine(llm, WikipediaSearchClient(), None).solve("Who wrote Hamlet?")
+    assert result["final_answer"] == "Shakespeare"
+    assert result["stop_reason"] == "answered"
+    assert llm.calls == 2
+
+
+def test_reasoning_engine_synthesizes_when_token_budget_runs_out(scripted_llm):
+    actions = [dict(PLAN_ACTION, args={"action": "add", "description": f"t{i}"}) for i in range(3)]
+    llm = scripted_llm(actions, final="William Shakespeare", usage=STEP_USAGE)
+    engine = ReasoningEngine(llm, WikipediaSearchClient(), None, max_tokens=2500)
+    result = engine.solve("Who wrote Hamlet?")
+    assert result["stop_reason"] == "token_budget"
+    assert len(result["trace"]) == 4  # three steps, then the synthesis record
+    assert result["trace"][-1]["tool"] == "final_synthesis"
+    assert result["final_answer"] == "William Shakespeare"
+
+
+def test_reasoning_engine_attaches_spans_to_steps(scripted_llm, mediawiki_session):
+    from src.wiki_fetcher import WikipediaArticleFetcher
+
+    url = "https://en.wikipedia.org/wiki/Ada_Lovelace"
+    actions = [
+        {"thought": "look", "tool": "read_section", "args": {"url": url, "section_name": "Legacy"}},
+        {"thought": "again", "tool": "read_section", "args": {"url": url, "section_name": "Early life"}},
+        {"thought": "done", "tool": "answer_question", "args": {"answer": "Ada"}},
+    ]
+
+    fetcher = WikipediaArticleFetcher(session=mediawiki_session())
+    result = ReasoningEngine(scripted_llm(actions), WikipediaSearchClient(), fetcher).solve("Who was Ada Lovelace?")
+
+    first, second = result["trace"][0], result["trace"][1]
+    assert [s["kind"] for s in first["spans"]] == ["tool", "article", "convert", "section", "convert"]
+    assert "cache_hits" not in first["timing"]["article"]
+    assert second["timing"]["article"]["cache_hits"] == 1
+    assert second["timing"]["convert"]["html_bytes"] > 0
+    assert result["timing_summary"]["tool"]["count"] == 3
+    assert result["timing_summary"]["section"]["count"] == 2
+
+
+def test_reasoning_engine_memoizes_repeated_tool_calls(scripted_llm, mediawiki_session):
+    from src.web_search import SearchResult
+    from src.wiki_fetcher import ArticleStructure, WikipediaArticleFetcher
+
+    ada = "https://en.wikipedia.org/wiki/Ada_Lovelace"
+    babbage = "https://en.wikipedia.org/wiki/Charles_Babbage"
+    actions = [
+        {"thought": "s", "tool": "search_google", "args": {"query": "Ada Lovelace"}},
+        {"thought": "i", "tool": "inspect_article_structure", "args": {"result_id": 1}},
+        {"thought": "l", "tool": "read_section", "args": {"section_name": "Lead"}},
+        {"thought": "s2", "tool": "search_google", "args": {"query": "Charles Babbage"}},
+        {"thought": "s3", "tool": "search_google", "args": {"query": "ada  Lovelace"}},
+        {"thought": "i2", "tool": "inspect_article_structure", "args": {"result_id": 1}},
+        {"thought": "r", "tool": "read_section", "args": {"url": "https://en.wikipedia.org/wiki/ada_Lovelace", "section_name": "intro"}},
+        {"thought": "done", "tool": "answer_question", "args": {"answer": "Ada"}},
+    ]
+
+    class CountingFetcher(WikipediaArticleFetcher):
+        def __init__(self):
+            super().__init__(session=mediawiki_session())
+            self.structures = 0
+
+        def get_article_structure(self, url):
+            self.structures += 1
+            return ArticleStructure(url, self.canonical_title(url), "Lead text.", ["Early life"])
+
+    searches = []
+    searcher = WikipediaSearchClient()
+
+    def search(query):
+        searches.append(query)
+        url = ada if "ada" in query.lower() else babbage
+        return [SearchResult(title=query, url=url, snippet="")]
+
+    searcher.search = search
+    fetcher = CountingFetcher()
+    result = ReasoningEngine(scripted_llm(actions), searcher, fetcher).solve("Who was Ada Lovelace?")
+
+    trace = result["trace"]
+    assert searches == ["Ada Lovelace", "Charles Babbage"]
+    assert fetcher.structures == 1
+    assert "identical to step 1" in trace[4]["result"]
+    # result_id 1 refers to the Ada results again after the memoized search
+    assert "identical to step 2" in trace[5]["result"] and "Ada Lovelace" in trace[5]["result"]
+    assert "identical to step 3" in trace[6]["result"]
+    assert result["final_answer"] == "Ada"
+    assert result["memo_stats"]["hits"] == 3
+    assert result["memo_stats"]["saved_calls"] == {
+        "search_google": 1, "inspect_article_structure": 1, "read_section": 1,
+    }
+    assert result["timing_summary"]["tool"]["cache_hits"] == 3
+
+
+def test_reasoning_engine_does_not_memoize_fetch_errors(scripted_llm):
+    from src.wiki_fetcher import ArticleFetchError, ArticleStructure
+
+    url = "https://en.wikipedia.org/wiki/Ada_Lovelace"
+    inspect = {"thought": "i", "tool": "inspect_article_structure", "args": {"url": url}}
+    read = {"thought": "r", "tool": "read_section", "args": {"url": url, "section_name": "Career"}}
+    other = {"thought": "x", "tool": "manage_tasks", "args": {"action": "add", "description": "retry"}}
+    actions = [inspect, other, inspect, read, other, read, other, read]
+
+    class FlakyFetcher:
+        def __init__(self):
+            self.structures = self.sections = 0
+
+        def canonical_title(self, url):
+            return url
+
+        def get_article_structure(self, url):
+            self.structures += 1
+            if self.structures == 1:
+                return ArticleStructure(url, "Ada_Lovelace", "API Error: ratelimited", [], error="API Error: ratelimited")
+            return ArticleStructure(url, "Ada Lovelace", "Lead text.", ["Career"])
+
+        def get_section_content(self, url, section_name, raise_errors=False):
+            self.sections += 1
+            if self.sections == 1:
+                raise ArticleFetchError("Error fetching section: read timed out")
+            return "The engine design was not found in her papers until 1953."
+
+    fetcher = FlakyFetcher()
+    trace = ReasoningEngine(scripted_llm(actions), WikipediaSearchClient(), fetcher, max_steps=8).solve("Who?")["trace"]
+    assert trace[0]["result"].startswith("❌ Could not load article") and "Lead text." in trace[2]["result"]
+    assert trace[3]["result"] == "❌ Error fetching section: read timed out"
+    # Content that merely mentions "not found" is an observation, and is memoized
+    assert trace[5]["result"].startswith("📖 SECTION CONTENT") and "identical to step 6" in trace[7]["result"]
+    assert fetcher.structures == 2 and fetcher.sections == 2
+
+
+BAND_FILLER = "The band toured widely across Europe and played many festivals that year. " * 4
+BAND_SECTION = (
+    BAND_FILLER * 3 + "In 1998 the album was released by Virgin Records, founded by Richard Branson. " + BAND_FILLER * 3
+)
+
+
+def test_passage_retriever_ranks_chunks():
+    from src.passage_retrieval import PassageRetriever
+
+    retriever = PassageRetriever(chunk_size=200, overlap=20, top_k=2)
+    passages = retriever.retrieve(BAND_SECTION, "Who founded the label that released the album in 1998?")
+    assert len(passages) == 2
+    assert any("Richard Branson" in p.text for p in passages)
+    assert all(BAND_SECTION[p.start:p.end] == p.text for p in passages)
+    assert [p.index for p in passages] == sorted(p.index for p in passages)
+
+
+def test_read_section_returns_top_passages_unless_full(scripted_llm):
+    from src.passage_retrieval import PassageRetriever
+
+    url = "https://en.wikipedia.org/wiki/Some_Band"
+    actions = [
+        {"thought": "r", "tool": "read_section", "args": {"url": url, "section_name": "History"}},
+        {"thought": "f", "tool": "read_section", "args": {"url": url, "section_name": "History", "full": True}},
+        {"thought": "done", "tool": "answer_question", "args": {"answer": "Richard Branson"}},
+    ]
+
+    class SectionFetcher:
+        def canonical_title(self, url):
+            return url
+
+        def get_section_content(self, url, section_name, raise_errors=False):
+            return BAND_SECTION
+
+    retriever = PassageRetriever(chunk_size=200, overlap=20, top_k=2)
+    engine = ReasoningEngine(scripted_llm(actions), WikipediaSearchClient(), SectionFetcher(), passage_retriever=retriever)
+    trace = engine.solve("Who founded the label that released the album in 1998?")["trace"]
+    assert "2 most relevant of" in trace[0]["result"] and "Richard Branson" in trace[0]["result"]
+    assert len(trace[0]["result"]) < len(BAND_SECTION)
+    assert trace[1]["result"].endswith(BAND_SECTION)
+
+
+def test_history_digest_folds_old_steps_into_the_prompt(scripted_llm):
+    from src.web_search import SearchResult
+
+    actions = [{"thought": "s", "tool": "search_google", "args": {"query": f"query {i}"}} for i in range(20)]
+    actions[3] = {"thought": "s", "tool": "search_google", "args": {"query": "nothing here"}}
+    llm = scripted_llm(actions)
+    searcher = WikipediaSearchClient()
+    searcher.search = lambda q: [] if q == "nothing here" else [SearchResult(f"Page for {q}", f"https://x/{q}")]
+    engine = ReasoningEngine(llm, searcher, None, max_steps=20, history_recent_steps=4)
+    result = engine.solve("Where was the founder born?")
+
+    # Folds happen before steps 10, 15 and 20, leaving 4-8 recent steps in every prompt
+    digest = result["history_digest"]
+    assert digest["steps"] == 15
+    assert [q["query"] for q in digest["queries"]][:4] == ["query 0", "query 1", "query 2", "nothing here"]
+    assert any("nothing here" in d for d in digest["dead_ends"])
+    prompts = [request[-1]["content"] for request in llm.requests]
+    last_prompt = prompts[-2]  # final step prompt (the last call is the synthesis)
+    assert "EARLIER STEPS (digest):\nSteps 1-15" in last_prompt
+    assert "Queries tried: (3 earlier not shown)" in last_prompt
+    assert "'query 14' (1 results): Page for query 14" in last_prompt
+    assert "PAST ACTIONS (Last 4 steps)" in last_prompt
+    assert len(prompts[-2]) < 2 * len(prompts[10])
+
+
+def test_history_digest_caps_listed_items_and_caches_render():
+    from src.history_digest import HistoryDigest
+
+    small = HistoryDigest(max_items=2)
+    for i in range(5):
+        small.add({"step": i + 1, "tool": "read_section", "args": {"url": f"u{i}", "section_name": "Career"},
+                   "result": "❌ Section 'Career' not found."})
+    rendered = small.render()
+    assert "(3 earlier not shown)" in rendered and rendered.count("not found") == 2
+    assert small.render() is rendered
+
+
+def test_cassette_replays_llm_and_http_without_network(tmp_path: Path):
+    import requests
+    from src.cassette import Cassette
+    from src.http_transport import HttpTransport
+    from src.llm_client import LLMClient
+
+    path = tmp_path / "run.jsonl"
+    recording = Cassette(path, mode="record")
+    llm = LLMClient(api_key="test", model="m", cassette=recording)
+    answers = iter(["first", "second"])
+    llm._chat_regular = lambda *args: next(answers)
+    assert llm.chat([{"role": "user", "content": "hi"}], temperature=0.0) == "first"
+    assert llm.chat([{"role": "user", "content": "hi"}], temperature=0.0) == "second"
+
+    transport = HttpTransport(cassette=recording)
+    live = requests.Response()
+    live.status_code, live._content, live.headers["Content-Type"] = 200, b'{"pages": []}', "application/json"
+    transport.session.get = lambda url, **kwargs: live
+    transport.get("https://en.wikipedia.org/w/api.php", params={"action": "query", "titles": "Ada"})
+    recording.close()
+
+    replay = Cassette(path, mode="replay")
+    llm = LLMClient(api_key="", model="m", cassette=replay)
+    llm._chat_regular = None  # any live call would fail
+    # Identical requests come back in recorded order, then the last one repeats
+    assert [llm.chat([{"role": "user", "content": "hi"}], temperature=0.0) for _ in range(3)] == [
+        "first", "second", "second"
+    ]
+
+    transport = HttpTransport(cassette=replay)
+    transport.session.get = None
+    response = transport.get("https://en.wikipedia.org/w/api.php", params={"titles": "Ada", "action": "query"})
+    assert response.json() == {"pages": []} and response.headers["content-type"] == "application/json"
+    with pytest.raises(requests.ConnectionError):
+        transport.get("https://en.wikipedia.org/w/api.php", params={"titles": "Babbage"})
+    assert replay.stats() == {"recorded": 0, "replayed": 4, "misses": 1}
+
+
+def test_stale_cassette_stops_the_engine_instead_of_skipping_steps(tmp_path: Path):
+    from src.cassette import Cassette, CassetteMiss
+    from src.llm_client import LLMClient
+
+    path = tmp_path / "run.jsonl"
+    Cassette(path, mode="record").close()
+    llm = LLMClient(api_key="", model="m", cassette=Cassette(path, mode="replay"))
+    engine = ReasoningEngine(llm, WikipediaSearchClient(), None)
+    with pytest.raises(CassetteMiss):
+        engine.solve("Who wrote Hamlet?")
+    assert llm.cassette.stats()["misses"] == 1
+
+
+@pytest.fixture
+def run_eval(monkeypatch, tmp_path: Path):
+    # Importing the script opens evaluation.log in the working directory
+    monkeypatch.chdir(tmp_path)
+    from evaluation import run_eval
+
+    monkeypatch.setattr(run_eval, "log_run_stats", lambda *clients: None)
+    return run_eval
+
+
+class StubEngine:
+    """Engine stand-in whose question text is a number of seconds to wait (or ``wait`` for the cancel event)."""
+
+    prefetcher = None
+
+    def __init__(self, finished):
+        self.finished = finished
+
+    def solve(self, question, cancel_event=None):
+        if question == "wait":
+            cancelled = cancel_event.wait(5)
+        else:
+            cancelled = cancel_event.wait(float(question))
+        self.finished.append(question)
+        return {"final_answer": question, "trace": [], "cancelled": cancelled}
+
+
+def test_run_parallel_writes_results_in_sample_order(run_eval, monkeypatch, tmp_path: Path):
+    from types import SimpleNamespace
+
+    finished = []
+    fetcher = SimpleNamespace(closed=False)
+    fetcher.close = lambda: setattr(fetcher, "closed", True)
+    searcher = SimpleNamespace(close=lambda: None)
+    monkeypatch.setattr(run_eval, "initialize_clients", lambda *args: (None, searcher, fetcher))
+    monkeypatch.setattr(run_eval, "build_engine", lambda *clients: StubEngine(finished))
+    questions = [{"id": f"q{i}", "question": delay, "answer": ""} for i, delay in enumerate(["0.3", "0.15", "0"])]
+
+    results = run_eval.run_parallel(questions, tmp_path / "responses.json", workers=3, timeout=None)
+    assert finished == ["0", "0.15", "0.3"]
+    assert [r["question_id"] for r in results] == ["q0", "q1", "q2"]
+    saved = json.loads((tmp_path / "responses.json").read_text())
+    assert [r["question_id"] for r in saved] == ["q0", "q1", "q2"]
+    assert fetcher.closed
+
+
+def test_run_parallel_timeout_cancels_the_engine(run_eval, monkeypatch, tmp_path: Path):
+    from types import SimpleNamespace
+
+    clients = (None, SimpleNamespace(close=lambda: None), SimpleNamespace(close=lambda: None))
+    monkeypatch.setattr(run_eval, "initialize_clients", lambda *args: clients)
+    monkeypatch.setattr(run_eval, "build_engine", lambda *clients: StubEngine([]))
+    questions = [{"id": "slow", "question": "wait", "answer": ""}, {"id": "fast", "question": "0", "answer": ""}]
+
+    slow, fast = run_eval.run_parallel(questions, tmp_path / "responses.json", workers=2, timeout=0.2)
+    assert slow["cancelled"] and slow["timed_out"] and slow["elapsed_seconds"] < 2
+    assert "cancelled" not in fast
+
+
+def test_benchmark_cases_run():
+    from benchmarks.run_benchmarks import build_cases
+
+    for name, case in build_cases().items():
+        case()